@@ -1,131 +1,339 @@
 import os
-from dotenv import load_dotenv, find_dotenv
 from pathlib import Path
-from flask import Flask, jsonify
-from flask_debugtoolbar import DebugToolbarExtension
+from typing import Any, Callable, Optional
+
+from flask import Flask
 from flask_login import LoginManager
-from flask_cors import CORS
-from flask_migrate import Migrate
-from sqlalchemy import text
 
 from .models import db, connect_db, bcrypt
+from .db_routing import REPLICA_BIND, recent_writers
+from .auth import principal_cache, token_generations
+from .category_registry import category_registry
+from .leaderboards import leaderboards
+from .passwords import password_hasher
+from .ratelimit import limiter
+from .webhooks import webhook_queue
 
 
-# Load env from backend/.env first (works regardless of CWD),
-# then also load a repo-level .env if present.
-_backend_dir = Path(__file__).resolve().parent
-load_dotenv(_backend_dir / ".env")
-load_dotenv(find_dotenv())
-app = Flask(__name__)
+login_manager = LoginManager()
 
-# Database configuration
-db_url = os.getenv('DATABASE_URL')
-if not db_url:
-    raise RuntimeError(
-        "DATABASE_URL is not set. Create a .env from .env.example and set DATABASE_URL"
-    )
-if db_url.startswith('postgres://'):
-    db_url = db_url.replace('postgres://', 'postgresql+psycopg://', 1)
-elif db_url.startswith('postgresql://') and '+psycopg' not in db_url:
-    db_url = db_url.replace('postgresql://', 'postgresql+psycopg://', 1)
-app.config['SQLALCHEMY_DATABASE_URI'] = db_url
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ECHO'] = False
-app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = True
-
-# Secrets
-secret_key = os.getenv('SECRET_KEY')
-if not secret_key:
-    raise RuntimeError(
-        "SECRET_KEY is not set. Create a .env from .env.example and set SECRET_KEY"
-    )
-app.config['SECRET_KEY'] = secret_key
-
-# Optional OAuth provider config passthrough
-app.config['OAUTH2_PROVIDERS'] = {
-    'google': {
-        'client_id': os.environ.get('GOOGLE_CLIENT_ID'),
-        'client_secret': os.environ.get('GOOGLE_CLIENT_SECRET'),
-        'authorize_url': 'https://accounts.google.com/o/oauth2/auth',
-        'token_url': 'https://accounts.google.com/o/oauth2/token',
-        'userinfo': {
-            'url': 'https://www.googleapis.com/oauth2/v3/userinfo',
-            'email': lambda json: json['email'],
-        },
-        'scopes': ['https://www.googleapis.com/auth/userinfo.email'],
+PROFILES = ('development', 'production', 'testing')
+
+# Per-profile defaults; environment variables of the same name override them
+PROFILE_DEFAULTS = {
+    'development': {
+        'DEBUG_TOOLBAR': True,
+        'PASSWORD_POOL_WORKERS': 2,
     },
-    'github': {
-        'client_id': os.environ.get('GITHUB_CLIENT_ID'),
-        'client_secret': os.environ.get('GITHUB_CLIENT_SECRET'),
-        'authorize_url': 'https://github.com/login/oauth/authorize',
-        'token_url': 'https://github.com/login/oauth/access_token',
-        'userinfo': {
-            'url': 'https://api.github.com/user/emails',
-            'email': lambda json: json[0]['email'],
-        },
-        'scopes': ['user:email'],
+    'production': {
+        'DEBUG_TOOLBAR': False,
+        'PASSWORD_POOL_WORKERS': 2,
+        'METRICS_REQUIRE_TOKEN': True,
     },
-    'strava': {
-        'client_id': os.environ.get('STRAVA_CLIENT_ID'),
-        'client_secret': os.environ.get('STRAVA_CLIENT_SECRET'),
-        'authorize_url': 'https://www.strava.com/oauth/authorize',
-        'token_url': 'https://www.strava.com/oauth/token',
-        'userinfo': {
-            'url': 'https://www.strava.com/api/v3/athlete',
-            'email': lambda json: json['email'],
-        },
-        'scopes': ['view_private'],
+    'testing': {
+        'TESTING': True,
+        'DEBUG_TOOLBAR': False,
+        'PASSWORD_POOL_WORKERS': 0,
+        'BCRYPT_LOG_ROUNDS': 4,
+        'RATELIMIT_ENABLED': False,
+        'METRICS_ENABLED': False,
     },
 }
 
-# Extensions
-toolbar = DebugToolbarExtension(app)
-login_manager = LoginManager()
-connect_db(app)
-bcrypt.init_app(app)
-CORS(
-    app,
-    resources={r"/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"]}},
-    expose_headers=["Content-Type", "Authorization"],
-    supports_credentials=False,
-)
-Migrate(app, db)
-
-
-# Root routes
-@app.get('/hello')
-def say_hello():
-    html = "<html><body><h1>Hello</h1></body></html>"
-    return html
-
-
-@app.get('/health')
-def health():
-    try:
-        db.session.execute(text("SELECT 1"))
-        db_ok = True
-    except Exception:
-        db_ok = False
-    status_code = 200 if db_ok else 503
-    return jsonify(status="ok" if db_ok else "degraded", db="ok" if db_ok else "unavailable"), status_code
-
-
-# Register blueprints
-from .routes.auth_routes import bp as auth_bp
-from .routes.users import bp as users_bp
-from .routes.activities import bp as activities_bp
-from .routes.categories import bp as categories_bp
-
-app.register_blueprint(auth_bp)
-app.register_blueprint(users_bp)
-app.register_blueprint(activities_bp)
-app.register_blueprint(categories_bp)
-
-
-# Error handlers and CLI
-from .errors import register_error_handlers
-from .cli import register_cli
-
-register_error_handlers(app)
-register_cli(app)
 
+def _load_env() -> None:
+    # Load env from backend/.env first (works regardless of CWD),
+    # then also load a repo-level .env if present.
+    from dotenv import load_dotenv, find_dotenv
+
+    _backend_dir = Path(__file__).resolve().parent
+    load_dotenv(_backend_dir / ".env")
+    load_dotenv(find_dotenv())
+
+
+def _normalize_db_url(url):
+    if url.startswith('postgres://'):
+        return url.replace('postgres://', 'postgresql+psycopg://', 1)
+    if url.startswith('postgresql://') and '+psycopg' not in url:
+        return url.replace('postgresql://', 'postgresql+psycopg://', 1)
+    return url
+
+
+def _as_bool(value) -> bool:
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def oauth2_providers():
+    """Optional OAuth provider config passthrough."""
+    return {
+        'google': {
+            'client_id': os.environ.get('GOOGLE_CLIENT_ID'),
+            'client_secret': os.environ.get('GOOGLE_CLIENT_SECRET'),
+            'authorize_url': 'https://accounts.google.com/o/oauth2/auth',
+            'token_url': 'https://accounts.google.com/o/oauth2/token',
+            'userinfo': {
+                'url': 'https://www.googleapis.com/oauth2/v3/userinfo',
+                'email': lambda json: json['email'],
+            },
+            'scopes': ['https://www.googleapis.com/auth/userinfo.email'],
+        },
+        'github': {
+            'client_id': os.environ.get('GITHUB_CLIENT_ID'),
+            'client_secret': os.environ.get('GITHUB_CLIENT_SECRET'),
+            'authorize_url': 'https://github.com/login/oauth/authorize',
+            'token_url': 'https://github.com/login/oauth/access_token',
+            'userinfo': {
+                'url': 'https://api.github.com/user/emails',
+                'email': lambda json: json[0]['email'],
+            },
+            'scopes': ['user:email'],
+        },
+        'strava': {
+            'client_id': os.environ.get('STRAVA_CLIENT_ID'),
+            'client_secret': os.environ.get('STRAVA_CLIENT_SECRET'),
+            'authorize_url': 'https://www.strava.com/oauth/authorize',
+            'token_url': 'https://www.strava.com/oauth/token',
+            'userinfo': {
+                'url': 'https://www.strava.com/api/v3/athlete',
+                'email': lambda json: json['email'],
+            },
+            'scopes': ['view_private'],
+        },
+    }
+
+
+def _configure(app: Flask, profile: str, overrides: dict) -> None:
+    defaults = PROFILE_DEFAULTS[profile]
+
+    def setting(name: str, default: Any, cast: Callable = str):
+        if name in overrides:
+            return overrides[name]
+        raw = os.getenv(name)
+        if raw is not None:
+            return cast(raw)
+        return defaults.get(name, default)
+
+    app.config['PROFILE'] = profile
+    app.config['TESTING'] = setting('TESTING', False, _as_bool)
+
+    # Database configuration
+    db_url = setting('DATABASE_URL', None)
+    if not db_url:
+        raise RuntimeError(
+            "DATABASE_URL is not set. Create a .env from .env.example and set DATABASE_URL"
+        )
+    app.config['SQLALCHEMY_DATABASE_URI'] = _normalize_db_url(db_url)
+
+    # Optional read replica; read-only views route to it (see db_routing.py)
+    db_read_url = setting('DATABASE_READ_URL', None)
+    if db_read_url:
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: _normalize_db_url(db_read_url)}
+    app.config['REPLICA_STICKY_SECONDS'] = setting('REPLICA_STICKY_SECONDS', 5.0, float)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ECHO'] = False
+    app.config['DEBUG_TOOLBAR'] = setting('DEBUG_TOOLBAR', False, _as_bool)
+    app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = True
+
+    # Secrets
+    secret_key = setting('SECRET_KEY', None)
+    if not secret_key:
+        raise RuntimeError(
+            "SECRET_KEY is not set. Create a .env from .env.example and set SECRET_KEY"
+        )
+    app.config['SECRET_KEY'] = secret_key
+
+    # Token lifetimes in seconds; legacy {"email": ...} tokens stay valid while JWT_ACCEPT_V1 is on
+    app.config['JWT_ACCESS_TTL'] = setting('JWT_ACCESS_TTL', 3600, int)
+    app.config['JWT_REFRESH_TTL'] = setting('JWT_REFRESH_TTL', 30 * 24 * 3600, int)
+    app.config['JWT_ACCEPT_V1'] = setting('JWT_ACCEPT_V1', True, _as_bool)
+
+    # Principal cache used by auth.jwt_required (size 0 disables it)
+    app.config['PRINCIPAL_CACHE_SIZE'] = setting('PRINCIPAL_CACHE_SIZE', 1024, int)
+    app.config['PRINCIPAL_CACHE_TTL'] = setting('PRINCIPAL_CACHE_TTL', 60.0, float)
+
+    # In-process category registry used by activity write paths
+    app.config['CATEGORY_REGISTRY_TTL'] = setting('CATEGORY_REGISTRY_TTL', 300.0, float)
+
+    # Ranked weekly boards cached per process; other processes' writes show up after the TTL
+    app.config['LEADERBOARD_TTL'] = setting('LEADERBOARD_TTL', 30.0, float)
+    app.config['LEADERBOARD_MAX_BOARDS'] = setting('LEADERBOARD_MAX_BOARDS', 256, int)
+
+    # Upper bound on items accepted by POST /me/activities/batch
+    app.config['ACTIVITY_BATCH_MAX'] = setting('ACTIVITY_BATCH_MAX', 500, int)
+
+    # Rows fetched per server-side cursor round trip by GET /me/activities/export
+    app.config['EXPORT_CHUNK_SIZE'] = setting('EXPORT_CHUNK_SIZE', 1000, int)
+
+    # Rows per committed chunk for CSV/GPX imports
+    app.config['IMPORT_CHUNK_SIZE'] = setting('IMPORT_CHUNK_SIZE', 1000, int)
+
+    # bcrypt worker pool (workers=0 hashes inline, still bounded by max pending)
+    app.config['BCRYPT_LOG_ROUNDS'] = setting('BCRYPT_LOG_ROUNDS', 12, int)
+    app.config['PASSWORD_POOL_WORKERS'] = setting('PASSWORD_POOL_WORKERS', 2, int)
+    app.config['PASSWORD_POOL_MAX_PENDING'] = setting('PASSWORD_POOL_MAX_PENDING', 16, int)
+    app.config['PASSWORD_POOL_TIMEOUT'] = setting('PASSWORD_POOL_TIMEOUT', 5.0, float)
+
+    # Rate limiting (memory, or sqlite to share limits across workers on a host)
+    app.config['RATELIMIT_ENABLED'] = setting('RATELIMIT_ENABLED', True, _as_bool)
+    app.config['RATELIMIT_BACKEND'] = setting('RATELIMIT_BACKEND', 'memory')
+    app.config['RATELIMIT_SQLITE_PATH'] = setting('RATELIMIT_SQLITE_PATH', None)
+    # Reverse proxies in front of the app (e.g. 1 behind a load balancer). Their
+    # X-Forwarded-For/-Proto are trusted, so limits key on the real client address
+    app.config['TRUSTED_PROXIES'] = setting('TRUSTED_PROXIES', 0, int)
+
+    # Prometheus metrics at /metrics (optionally protected by a bearer token)
+    app.config['METRICS_ENABLED'] = setting('METRICS_ENABLED', True, _as_bool)
+    app.config['METRICS_TOKEN'] = setting('METRICS_TOKEN', None)
+    app.config['METRICS_REQUIRE_TOKEN'] = setting('METRICS_REQUIRE_TOKEN', False, _as_bool)
+
+    # Background database prober behind /health, /health/live and /health/ready
+    app.config['HEALTH_PROBE_INTERVAL'] = setting('HEALTH_PROBE_INTERVAL', 5.0, float)
+
+    # Optional OAuth provider config passthrough
+    app.config['OAUTH2_PROVIDERS'] = oauth2_providers()
+
+    # Strava activity sync (see strava.py); the URLs can point at a local stub
+    app.config['STRAVA_API_URL'] = setting('STRAVA_API_URL', 'https://www.strava.com/api/v3')
+    app.config['STRAVA_TOKEN_URL'] = setting(
+        'STRAVA_TOKEN_URL', app.config['OAUTH2_PROVIDERS']['strava']['token_url']
+    )
+    app.config['STRAVA_SYNC_CONCURRENCY'] = setting('STRAVA_SYNC_CONCURRENCY', 4, int)
+    app.config['STRAVA_PAGE_SIZE'] = setting('STRAVA_PAGE_SIZE', 200, int)
+    app.config['STRAVA_TIMEOUT'] = setting('STRAVA_TIMEOUT', 30.0, float)
+    # Longest wait for the next 15-minute rate-limit window before a sync stops
+    app.config['STRAVA_RATE_LIMIT_MAX_WAIT'] = setting('STRAVA_RATE_LIMIT_MAX_WAIT', 900.0, float)
+    # Category for sport types that match no category (unset: such activities are skipped)
+    app.config['STRAVA_DEFAULT_CATEGORY'] = setting('STRAVA_DEFAULT_CATEGORY', None)
+    # Push subscription: GET /webhooks/strava must echo challenges carrying this token
+    app.config['STRAVA_WEBHOOK_VERIFY_TOKEN'] = setting('STRAVA_WEBHOOK_VERIFY_TOKEN', None)
+    # When set, POSTed events from other subscriptions are rejected
+    app.config['STRAVA_SUBSCRIPTION_ID'] = setting('STRAVA_SUBSCRIPTION_ID', None)
+
+    # Local SQLite file holding received webhook events until a worker applies them
+    app.config['WEBHOOK_QUEUE_PATH'] = setting(
+        'WEBHOOK_QUEUE_PATH', os.path.join(app.instance_path, 'webhook_queue.db')
+    )
+    app.config['WEBHOOK_MAX_ATTEMPTS'] = setting('WEBHOOK_MAX_ATTEMPTS', 5, int)
+
+    for key, value in overrides.items():
+        app.config.setdefault(key, value)
+
+
+def _init_extensions(app: Flask) -> None:
+    from flask_cors import CORS
+    from flask_migrate import Migrate
+
+    if app.config['TRUSTED_PROXIES'] > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+    if app.config['DEBUG_TOOLBAR']:
+        # Development only: the toolbar wraps every HTML response
+        from flask_debugtoolbar import DebugToolbarExtension
+        DebugToolbarExtension(app)
+
+    connect_db(app)
+    bcrypt.init_app(app)
+    CORS(
+        app,
+        resources={r"/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"]}},
+        expose_headers=["Content-Type", "Authorization"],
+        supports_credentials=False,
+    )
+    Migrate(app, db)
+    principal_cache.configure(
+        maxsize=app.config['PRINCIPAL_CACHE_SIZE'],
+        ttl=app.config['PRINCIPAL_CACHE_TTL'],
+    )
+    # Revocation floors only matter while the tokens they reject could still be valid
+    token_generations.configure(ttl=app.config['JWT_ACCESS_TTL'])
+    category_registry.configure(ttl=app.config['CATEGORY_REGISTRY_TTL'])
+    leaderboards.configure(
+        ttl=app.config['LEADERBOARD_TTL'],
+        max_boards=app.config['LEADERBOARD_MAX_BOARDS'],
+    )
+    recent_writers.configure(ttl=app.config['REPLICA_STICKY_SECONDS'])
+    password_hasher.configure(
+        workers=app.config['PASSWORD_POOL_WORKERS'],
+        max_pending=app.config['PASSWORD_POOL_MAX_PENDING'],
+        timeout=app.config['PASSWORD_POOL_TIMEOUT'],
+        rounds=app.config['BCRYPT_LOG_ROUNDS'],
+    )
+    limiter.configure(
+        backend=app.config['RATELIMIT_BACKEND'],
+        sqlite_path=app.config['RATELIMIT_SQLITE_PATH'],
+        enabled=app.config['RATELIMIT_ENABLED'],
+    )
+    # Opened on first use, so processes that never touch webhooks skip the file
+    webhook_queue.configure(
+        path=app.config['WEBHOOK_QUEUE_PATH'],
+        max_attempts=app.config['WEBHOOK_MAX_ATTEMPTS'],
+    )
+    if app.config['METRICS_ENABLED']:
+        from .metrics import metrics, init_app as init_metrics
+        init_metrics(app, db)
+        metrics.register_gauges('principal_cache', principal_cache.stats)
+        metrics.register_gauges('password_pool', password_hasher.stats)
+
+    from .health import init_app as init_health
+    init_health(app, db, extra=lambda: {"principal_cache": principal_cache.stats()})
+
+
+def _register_routes(app: Flask) -> None:
+    # Root routes
+    @app.get('/hello')
+    def say_hello():
+        html = "<html><body><h1>Hello</h1></body></html>"
+        return html
+
+    # Register blueprints
+    from .routes.auth_routes import bp as auth_bp
+    from .routes.users import bp as users_bp
+    from .routes.activities import bp as activities_bp
+    from .routes.categories import bp as categories_bp
+    from .routes.leaderboards import bp as leaderboards_bp
+    from .routes.webhooks import bp as webhooks_bp
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(users_bp)
+    app.register_blueprint(activities_bp)
+    app.register_blueprint(categories_bp)
+    app.register_blueprint(leaderboards_bp)
+    app.register_blueprint(webhooks_bp)
+
+    # Error handlers and CLI
+    from .errors import register_error_handlers
+    from .cli import register_cli
+
+    register_error_handlers(app)
+    register_cli(app)
+
+
+def create_app(profile: Optional[str] = None, **overrides) -> Flask:
+    """Build the Flask app.
+
+    `profile` is one of PROFILES (default: $APP_PROFILE, else development).
+    The production profile leaves out the debug toolbar; testing also turns
+    off rate limiting and metrics and hashes passwords inline with cheap
+    rounds. Keyword overrides take precedence over environment variables.
+    """
+    _load_env()
+    profile = profile or os.getenv('APP_PROFILE') or 'development'
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile {profile!r}; expected one of {PROFILES}")
+
+    app = Flask(__name__)
+    _configure(app, profile, overrides)
+    _init_extensions(app)
+    _register_routes(app)
+    return app
+
+
+def __getattr__(name):
+    # `from backend.app import app` and FLASK_APP=backend.app keep working:
+    # the default app is built on first access instead of at import time.
+    if name == 'app':
+        application = globals()['app'] = create_app()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,59 @@
 from typing import Optional, Dict, Any, Type, Callable
 from functools import wraps
-from flask import current_app, request, jsonify, g
+import math
+import time
+from flask import current_app, request, jsonify, g, make_response
 import jwt
 
+from .caching import TTLCache
+from .db_routing import primary
+from .ratelimit import limiter
+from .schemas import schema_for
 
-def create_access_token(email: str) -> str:
-    """Create a signed JWT for the given user email."""
-    payload = {"email": email}
+
+TOKEN_VERSION = 2
+
+# Verified token (v1) or ("id", user id) (v2) -> column snapshot of the user.
+principal_cache = TTLCache(maxsize=1024, ttl=60.0)
+
+# user id -> lowest token generation still accepted. Raised when this process
+# revokes a user's tokens, so stale v2 tokens are refused without a query.
+token_generations = TTLCache(maxsize=100_000, ttl=3600.0)
+
+
+def _encode(payload: Dict[str, Any]) -> str:
     secret = current_app.config.get("SECRET_KEY")
     return jwt.encode(payload, secret, algorithm="HS256")
 
 
+def _issue(user, typ: str, ttl: float) -> str:
+    now = int(time.time())
+    return _encode({
+        "ver": TOKEN_VERSION,
+        "typ": typ,
+        "sub": str(user.id),
+        "iat": now,
+        "exp": now + int(ttl),
+        "gen": user.token_generation,
+    })
+
+
+def create_access_token(user) -> str:
+    """Create a short-lived signed JWT (v2) for `user`."""
+    return _issue(user, "access", current_app.config.get("JWT_ACCESS_TTL", 3600))
+
+
+def create_refresh_token(user) -> str:
+    """Create a long-lived JWT that can only be exchanged for new tokens."""
+    return _issue(user, "refresh", current_app.config.get("JWT_REFRESH_TTL", 30 * 24 * 3600))
+
+
+def issue_tokens(user) -> Dict[str, str]:
+    return {"token": create_access_token(user), "refresh_token": create_refresh_token(user)}
+
+
 def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
-    """Decode a JWT and return its payload, or None on failure."""
+    """Decode a JWT and return its payload, or None on failure (including expiry)."""
     secret = current_app.config.get("SECRET_KEY")
     try:
         return jwt.decode(token, secret, algorithms=["HS256"])
@@ -20,6 +61,25 @@ def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+def token_subject(payload: Dict[str, Any], typ: str) -> Optional[int]:
+    """User id of a well-formed, unrevoked v2 token of type `typ`, else None.
+
+    Only the in-process generation floor is consulted; callers still compare
+    `gen` with the loaded user's `token_generation`.
+    """
+    if payload.get("ver") != TOKEN_VERSION or payload.get("typ") != typ:
+        return None
+    if "exp" not in payload or not isinstance(payload.get("gen"), int):
+        return None
+    try:
+        user_id = int(payload["sub"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if payload["gen"] < token_generations.get(user_id, 0):
+        return None
+    return user_id
+
+
 def jwt_required(fn: Callable) -> Callable:
     """Decorator that enforces JWT auth and loads g.current_user."""
 
@@ -31,12 +91,24 @@ def jwt_required(fn: Callable) -> Callable:
 
         token = auth_header.split(' ', 1)[1].strip()
         payload = decode_access_token(token)
-        if payload is None or 'email' not in payload:
+        if payload is None:
             return jsonify(message='Invalid or expired token'), 401
 
-        # Lazy import to avoid circular deps
-        from .models import User
-        user = User.query.filter_by(email=payload['email']).one_or_none()
+        if 'ver' in payload:
+            user_id = token_subject(payload, 'access')
+            if user_id is None:
+                return jsonify(message='Invalid or expired token'), 401
+            user = _load_principal_by_id(user_id, payload['gen'])
+            if user is not None and user.token_generation != payload['gen']:
+                return jsonify(message='Invalid or expired token'), 401
+        elif 'email' in payload and current_app.config.get('JWT_ACCEPT_V1', True):
+            # Legacy {"email": ...} tokens, accepted while clients migrate. They
+            # carry no generation, so the first revocation ends them all
+            user = _load_principal(token, payload)
+            if user is not None and max(user.token_generation, token_generations.get(user.id, 0)) > 0:
+                return jsonify(message='Invalid or expired token'), 401
+        else:
+            return jsonify(message='Invalid or expired token'), 401
         if not user:
             return jsonify(message='User not found'), 404
 
@@ -46,21 +118,142 @@ def jwt_required(fn: Callable) -> Callable:
     return wrapper
 
 
+def client_ip() -> str:
+    """The client's address; behind TRUSTED_PROXIES proxies, as they forwarded it."""
+    return request.remote_addr or 'unknown'
+
+
+def rate_limit(
+    scope: str,
+    limit: int,
+    period: float,
+    key: Callable[[], str] = client_ip,
+    counts: Optional[Callable[[Any], bool]] = None,
+    message: str = 'Too many requests. Try again later',
+) -> Callable:
+    """Decorator that rejects requests over `limit` per `period` seconds with 429.
+
+    The window is keyed by `scope` plus `key()` (client IP by default). When
+    `counts` is given, only responses for which it returns True consume quota
+    (e.g. failed attempts); otherwise every admitted request does. Either way
+    the hit is recorded before the view runs, and refunded afterwards if it
+    does not count, so concurrent requests cannot exceed the limit. Place it
+    below `jwt_required` to key on `g.current_user`.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            bucket = f"{scope}:{key()}"
+            result = limiter.hit(bucket, limit, period)
+            if not result.allowed:
+                response = jsonify(message=message)
+                response.headers['Retry-After'] = str(max(1, math.ceil(result.retry_after)))
+                return response, 429
+
+            if counts is None:
+                return fn(*args, **kwargs)
+            try:
+                response = make_response(fn(*args, **kwargs))
+            except Exception:
+                limiter.refund(bucket, result)
+                raise
+            if not counts(response):
+                limiter.refund(bucket, result)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _snapshot(user) -> Dict[str, Any]:
+    from sqlalchemy import inspect
+
+    return {attr.key: getattr(user, attr.key) for attr in inspect(type(user)).column_attrs}
+
+
+def _from_snapshot(values: Dict[str, Any]):
+    """Rebuild a `User` from cached column values and attach it without a SELECT."""
+    from sqlalchemy.orm import make_transient_to_detached
+    from .models import db, User
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def _load_principal(token: str, payload: Dict[str, Any]):
+    """Resolve the user for a verified v1 token, consulting `principal_cache` first."""
+    from .models import User
+
+    values = principal_cache.get(token)
+    if values is not None:
+        return _from_snapshot(values)
+
+    # A lagging replica could miss a just-changed email, so always ask the primary
+    with primary():
+        user = User.query.filter_by(email=payload['email']).one_or_none()
+    if user is not None:
+        principal_cache.set(token, _snapshot(user))
+    return user
+
+
+def _load_principal_by_id(user_id: int, generation: int):
+    """Resolve the user for a v2 token by primary key, consulting `principal_cache` first.
+
+    A cached snapshot older than the token's `generation` (tokens reissued by
+    another worker) is reloaded rather than trusted.
+    """
+    from .models import db, User
+
+    key = ("id", user_id)
+    values = principal_cache.get(key)
+    if values is not None and values['token_generation'] >= generation:
+        return _from_snapshot(values)
+
+    # The primary has the current token generation even if the replica lags
+    with primary():
+        user = db.session.get(User, user_id)
+    if user is not None:
+        principal_cache.set(key, _snapshot(user))
+        if user.token_generation > token_generations.get(user_id, 0):
+            token_generations.set(user_id, user.token_generation)
+    return user
+
+
+def revoke_tokens(user) -> None:
+    """Invalidate every token issued to `user` so far, once the session commits."""
+    user.token_generation = type(user).token_generation + 1
+
+
+def invalidate_principal(user_id: int, token_generation: Optional[int] = None) -> int:
+    """Drop every cached principal for `user_id` (after it changes or is deleted).
+
+    Pass the user's new `token_generation` after `revoke_tokens` so older
+    tokens are refused in this process without a lookup.
+    """
+    if token_generation is not None and token_generation > token_generations.get(user_id, 0):
+        token_generations.set(user_id, token_generation)
+    return principal_cache.discard_where(lambda values: values['id'] == user_id)
+
+
 def json_form_required(form_cls: Type) -> Callable:
-    """Decorator that parses JSON body into a WTForms form and validates it.
+    """Decorator that validates the JSON body against `form_cls`'s rules.
 
-    On success, attaches `g.json` and `g.form` for downstream use.
+    Uses the schema compiled from the form (see schemas.py). On success,
+    attaches the decoded record as `g.data`; otherwise responds 400 with
+    `{"errors": {field: [messages]}}`.
     """
+    schema = schema_for(form_cls)
 
     def decorator(fn: Callable) -> Callable:
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            data = request.get_json(silent=True) or {}
-            form = form_cls(csrf_enabled=False, data=data)
-            if not form.validate_on_submit():
-                return jsonify(errors=form.errors), 400
-            g.json = data
-            g.form = form
+            data, errors = schema.validate(request.get_json(silent=True) or {})
+            if errors:
+                return jsonify(errors=errors), 400
+            g.data = data
             return fn(*args, **kwargs)
 
         return wrapper
@@ -0,0 +1,6 @@
+"""Benchmarks for the backend.
+
+Run from the directory that contains the `backend` package, e.g.
+`python -m backend.benchmarks.login_pool`. Unless DATABASE_URL is set, each
+benchmark uses a throwaway SQLite database.
+"""
@@ -0,0 +1,48 @@
+"""Shared helpers for the benchmark scripts."""
+import json
+import os
+import statistics
+import sys
+import tempfile
+from typing import Dict, List
+
+
+def prepare_env() -> None:
+    """Point the app at a scratch SQLite database unless DATABASE_URL is set."""
+    if not os.environ.get("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="fitness-bench-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+
+def load_app(profile: str = "production", **overrides):
+    """Build the app against the benchmark database and create its tables."""
+    prepare_env()
+    from ..app import create_app
+    from ..models import db
+
+    app = create_app(profile, **overrides)
+
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 (milliseconds) of latency samples given in seconds."""
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None}
+    if len(samples) == 1:
+        value = round(samples[0] * 1000, 3)
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49] * 1000, 3),
+        "p95": round(cuts[94] * 1000, 3),
+        "p99": round(cuts[98] * 1000, 3),
+    }
+
+
+def emit(result) -> None:
+    json.dump(result, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write("\n")
@@ -0,0 +1,322 @@
+"""End-to-end HTTP benchmark for every public endpoint.
+
+    python -m backend.benchmarks.endpoints --users 20 --activities-per-user 200 \
+        --concurrency 8 --requests 200 --output bench.json
+
+Boots the app from `app.py` on a local werkzeug server (SQLite scratch file
+unless DATABASE_URL points at e.g. a local Postgres), seeds users and
+activities, then drives each scenario from `--concurrency` threads over real
+HTTP. For every scenario it reports p50/p95/p99 latency, throughput, status
+counts and SQL queries per request (counted with engine events), as JSON
+suitable for diffing across commits.
+"""
+import argparse
+import http.client
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta, time as dtime
+from typing import Callable, Dict, List, Tuple
+
+from .common import emit, load_app, percentiles
+
+
+PASSWORD = "password123"
+SEARCH_NOTES = ("tempo intervals", "hill repeats", "easy recovery", "long steady effort", "race pace")
+SEARCH_TERMS = ("tempo", "hill+repeats", "recovery", "session", "race")
+
+
+class QueryCounter:
+    """Counts statements executed on an engine."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+
+def seed(app, users: int, activities_per_user: int, rng: random.Random) -> List[Dict]:
+    """Create benchmark users with history; returns [{id, email, token}]."""
+    from sqlalchemy import insert
+    from ..auth import create_access_token
+    from ..category_registry import category_registry
+    from ..models import db, User, Activity, ActivityCategory
+    from ..passwords import password_hasher
+    from ..leaderboards import rebuild_leaderboards
+    from ..rollups import rebuild_rollups
+
+    with app.app_context():
+        for name in ("Run", "Bike", "Swim", "Weight Training", "Yoga"):
+            if not category_registry.find(name):
+                db.session.add(ActivityCategory(name=name))
+        db.session.commit()
+        category_ids = [ref.id for ref in category_registry.all()]
+
+        pw_hash = password_hasher.hash(PASSWORD)
+        accounts = []
+        for i in range(users):
+            email = f"bench.user{i}@example.com"
+            user = User.query.filter_by(email=email).one_or_none()
+            if not user:
+                user = User(email=email, password=pw_hash, first_name="Bench", last_name=str(i))
+                db.session.add(user)
+                db.session.flush()
+                rows = [
+                    {
+                        "title": f"Session {j}",
+                        "category_id": rng.choice(category_ids),
+                        "distance": round(rng.uniform(0, 30), 2),
+                        "duration": dtime(rng.randint(0, 2), rng.randint(0, 59), rng.randint(0, 59)),
+                        "time": dtime(rng.randint(5, 21), rng.choice((0, 15, 30, 45)), 0),
+                        "date": date.today() - timedelta(days=rng.randrange(28)),
+                        "notes": rng.choice(SEARCH_NOTES) if rng.random() < 0.3 else None,
+                        "complete": rng.random() < 0.8,
+                        "user_id": user.id,
+                    }
+                    for j in range(activities_per_user)
+                ]
+                if rows:
+                    db.session.execute(insert(Activity), rows)
+            accounts.append({"id": user.id, "email": email})
+        db.session.commit()
+        rebuild_rollups()
+        rebuild_leaderboards()
+        for account in accounts:
+            account["token"] = create_access_token(db.session.get(User, account["id"]))
+    return accounts
+
+
+def start_server(app) -> Tuple[object, int]:
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_port
+
+
+class Client:
+    """Keep-alive HTTP client bound to one thread."""
+
+    def __init__(self, port: int):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def request(self, method: str, path: str, body=None, token: str = None) -> Tuple[int, bytes]:
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        self.conn.request(method, path, body=payload, headers=headers)
+        resp = self.conn.getresponse()
+        return resp.status, resp.read()
+
+
+def _activity_body(rng: random.Random) -> Dict:
+    return {
+        "title": "Bench run",
+        "category": rng.choice(("Run", "Bike", "Swim")),
+        "distance": round(rng.uniform(1, 20), 2),
+        "duration": "00:45:00",
+        "time": "07:30:00",
+        "complete": True,
+    }
+
+
+def scenarios(accounts: List[Dict]) -> Dict[str, Callable]:
+    """name -> fn(client, rng, n) performing one request for iteration n."""
+    counter = iter(range(10 ** 9))
+    counter_lock = threading.Lock()
+
+    def account(rng):
+        return rng.choice(accounts)
+
+    def signup(client, rng, n):
+        with counter_lock:
+            k = next(counter)
+        return client.request("POST", "/signup", {
+            "email": f"bench.signup{k}.{time.time_ns()}@example.com",
+            "password": PASSWORD,
+            "first_name": "Bench",
+            "last_name": "Signup",
+        })
+
+    def login(client, rng, n):
+        return client.request("POST", "/login", {"email": account(rng)["email"], "password": PASSWORD})
+
+    def me(client, rng, n):
+        return client.request("GET", "/me", token=account(rng)["token"])
+
+    def list_activities(client, rng, n):
+        return client.request("GET", "/me/activities?limit=100", token=account(rng)["token"])
+
+    def list_activities_cursor(client, rng, n):
+        return client.request("GET", "/me/activities?limit=100&cursor=", token=account(rng)["token"])
+
+    def create_activity(client, rng, n):
+        return client.request("POST", "/me/activities", _activity_body(rng), token=account(rng)["token"])
+
+    def activity_crud(client, rng, n):
+        token = account(rng)["token"]
+        status, body = client.request("POST", "/me/activities", _activity_body(rng), token=token)
+        if status != 201:
+            return status, body
+        activity_id = json.loads(body)["activity"]["id"]
+        client.request("GET", f"/me/activities/{activity_id}", token=token)
+        client.request("PATCH", f"/me/activities/{activity_id}", {"distance": 3.5}, token=token)
+        return client.request("DELETE", f"/me/activities/{activity_id}", token=token)
+
+    def search(client, rng, n):
+        q = rng.choice(SEARCH_TERMS)
+        return client.request("GET", f"/me/activities/search?q={q}", token=account(rng)["token"])
+
+    def stats(client, rng, n):
+        return client.request("GET", "/me/activities/stats", token=account(rng)["token"])
+
+    def categories(client, rng, n):
+        return client.request("GET", "/activity-categories")
+
+    def leaderboard(client, rng, n):
+        return client.request("GET", f"/leaderboards/{rng.randint(1, 3)}?limit=20", token=account(rng)["token"])
+
+    def leaderboard_me(client, rng, n):
+        return client.request("GET", f"/me/leaderboards/{rng.randint(1, 3)}", token=account(rng)["token"])
+
+    def categories_search(client, rng, n):
+        return client.request("GET", f"/activity-categories?q={rng.choice('rbswy')}")
+
+    return {
+        "signup": signup,
+        "login": login,
+        "me": me,
+        "list_activities": list_activities,
+        "list_activities_cursor": list_activities_cursor,
+        "create_activity": create_activity,
+        "activity_crud": activity_crud,
+        "search_activities": search,
+        "stats": stats,
+        "activity_categories": categories,
+        "activity_categories_q": categories_search,
+        "leaderboard": leaderboard,
+        "leaderboard_me": leaderboard_me,
+    }
+
+
+def run_scenario(port, fn, queries: QueryCounter, concurrency: int, requests: int, seed_value: int):
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+    gate = threading.Barrier(concurrency)
+
+    def worker(idx):
+        rng = random.Random(seed_value + idx)
+        client = Client(port)
+        gate.wait()
+        for n in range(per_thread):
+            t0 = time.perf_counter()
+            status, _ = fn(client, rng, n)
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    q0 = queries.count
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    total = len(latencies)
+    return {
+        "requests": total,
+        "throughput_rps": round(total / wall, 2) if wall else None,
+        "latency_ms": percentiles(latencies),
+        "queries_per_request": round((queries.count - q0) / total, 2) if total else None,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--activities-per-user", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--scenario", action="append", help="run only these scenarios")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="low by default so auth does not dominate")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    app = load_app()
+    from ..models import db
+    from ..passwords import password_hasher
+    from ..ratelimit import limiter
+
+    # Measure the endpoints, not the abuse protections
+    limiter.enabled = False
+    password_hasher.configure(rounds=args.bcrypt_rounds)
+
+    rng = random.Random(args.seed)
+    t0 = time.perf_counter()
+    accounts = seed(app, args.users, args.activities_per_user, rng)
+    seed_seconds = time.perf_counter() - t0
+
+    with app.app_context():
+        engine = db.engine
+        dialect = engine.dialect.name
+    queries = QueryCounter(engine)
+    server, port = start_server(app)
+
+    selected = scenarios(accounts)
+    if args.scenario:
+        selected = {k: v for k, v in selected.items() if k in args.scenario}
+
+    results = {}
+    try:
+        for name, fn in selected.items():
+            results[name] = run_scenario(port, fn, queries, args.concurrency, args.requests, args.seed)
+    finally:
+        server.shutdown()
+        password_hasher.shutdown()
+
+    report = {
+        "benchmark": "endpoints",
+        "revision": _git_revision(),
+        "database": dialect,
+        "users": args.users,
+        "activities_per_user": args.activities_per_user,
+        "concurrency": args.concurrency,
+        "seed_seconds": round(seed_seconds, 3),
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+    emit(report)
+
+
+if __name__ == "__main__":
+    main()
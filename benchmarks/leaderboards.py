@@ -0,0 +1,232 @@
+"""Weekly leaderboard reads: GROUP BY over activities vs the maintained boards.
+
+    python -m backend.benchmarks.leaderboards --users 2000 --activities-per-user 40 --lookups 300
+
+Seeds `--users` users with activities spread over the current and previous
+week, then times, for one category and week:
+
+- "my rank" and top-10 computed per request with GROUP BY over `activities`
+  (what the endpoints would do without the leaderboard table)
+- the same two reads from `leaderboard_entries` in SQL
+- the same two reads from the in-process ranked board (after its one load)
+
+It then drives creates, updates (distance, date and category changes) and
+deletes through the HTTP handlers and checks that the cached boards, the
+table and a fresh rebuild agree entry for entry.
+"""
+import argparse
+import random
+import time
+from datetime import date, time as dtime, timedelta
+
+from .common import emit, load_app, percentiles
+
+
+CATEGORIES = ("Run", "Bike", "Swim")
+
+
+def time_of(seconds: int) -> dtime:
+    return dtime(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--activities-per-user", type=int, default=40)
+    parser.add_argument("--lookups", type=int, default=300, help="Timed reads per strategy.")
+    parser.add_argument("--writes", type=int, default=300, help="Handler writes in the consistency check.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    app = load_app(LEADERBOARD_TTL=3600.0, RATELIMIT_ENABLED=False)
+
+    from sqlalchemy import func, insert, select
+    from ..auth import create_access_token
+    from ..category_registry import category_registry
+    from ..leaderboards import compute_leaderboards, leaderboards, rebuild_leaderboards, week_start
+    from ..models import db, Activity, ActivityCategory, LeaderboardEntry, User
+    from ..rollups import find_drift, rebuild_rollups
+
+    this_week = week_start()
+    days = [this_week - timedelta(days=7) + timedelta(days=i) for i in range(7 + date.today().weekday() + 1)]
+
+    with app.app_context():
+        for name in CATEGORIES:
+            if not category_registry.find(name):
+                db.session.add(ActivityCategory(name=name))
+        db.session.commit()
+        category_ids = [category_registry.find(name).id for name in CATEGORIES]
+
+        user_rows = [
+            {"email": f"board{i}@example.com", "password": "-", "first_name": "Board", "last_name": str(i)}
+            for i in range(args.users)
+        ]
+        user_ids = db.session.scalars(
+            insert(User).returning(User.id, sort_by_parameter_order=True), user_rows
+        ).all()
+        rows = [
+            {
+                "title": "Session",
+                "category_id": rng.choice(category_ids),
+                "distance": round(rng.uniform(1, 40), 2),
+                "duration": time_of(rng.randrange(600, 7200)),
+                "time": time_of(rng.randrange(5 * 3600, 21 * 3600)),
+                "date": rng.choice(days),
+                "complete": True,
+                "user_id": user_id,
+            }
+            for user_id in user_ids
+            for _ in range(args.activities_per_user)
+        ]
+        db.session.execute(insert(Activity), rows)
+        db.session.commit()
+        rebuild_rollups()
+        entries = rebuild_leaderboards()
+
+        category_id = category_ids[0]
+        week_end = this_week + timedelta(days=7)
+        sample = [rng.choice(user_ids) for _ in range(args.lookups)]
+
+        totals = (
+            select(Activity.user_id, func.sum(Activity.distance).label("total"))
+            .where(Activity.category_id == category_id, Activity.date >= this_week, Activity.date < week_end)
+            .group_by(Activity.user_id)
+            .subquery()
+        )
+
+        def group_by_rank(user_id):
+            mine = select(totals.c.total).where(totals.c.user_id == user_id).scalar_subquery()
+            return db.session.scalar(select(func.count() + 1).where(totals.c.total > mine))
+
+        def group_by_top():
+            return db.session.execute(select(totals).order_by(totals.c.total.desc()).limit(10)).all()
+
+        entry = LeaderboardEntry
+        in_week = (entry.category_id == category_id, entry.week_start == this_week)
+
+        def table_rank(user_id):
+            mine = select(entry.total_distance).where(*in_week, entry.user_id == user_id).scalar_subquery()
+            return db.session.scalar(select(func.count() + 1).where(*in_week, entry.total_distance > mine))
+
+        def table_top():
+            return db.session.execute(
+                select(entry.user_id, entry.total_distance).where(*in_week)
+                .order_by(entry.total_distance.desc()).limit(10)
+            ).all()
+
+        def board_rank(user_id):
+            return leaderboards.standing(category_id, this_week, user_id)
+
+        def board_top():
+            return leaderboards.top(category_id, this_week, 10)
+
+        def timed(fn, arg_list):
+            samples = []
+            for arg in arg_list:
+                started = time.perf_counter()
+                fn(*arg)
+                samples.append(time.perf_counter() - started)
+            return percentiles(samples)
+
+        leaderboards.invalidate()
+        started = time.perf_counter()
+        board_top()
+        first_load = time.perf_counter() - started
+
+        reads = {}
+        for name, rank, top in (
+            ("group_by", group_by_rank, group_by_top),
+            ("table", table_rank, table_top),
+            ("board", board_rank, board_top),
+        ):
+            reads[name] = {
+                "my_rank_ms": timed(rank, [(u,) for u in sample]),
+                "top10_ms": timed(top, [()] * max(1, args.lookups // 10)),
+            }
+        reads["board"]["first_load_ms"] = round(first_load * 1000, 3)
+
+        # Board ranks match GROUP BY totals (compared at the board's 3-decimal precision)
+        grouped = {user_id: round(total, 3) for user_id, total in db.session.execute(select(totals))}
+        for user_id in sample[:50]:
+            standing, _ = board_rank(user_id)
+            if user_id not in grouped:
+                assert standing is None, user_id
+                continue
+            expected = 1 + sum(1 for total in grouped.values() if total > grouped[user_id])
+            assert standing.rank == expected, (user_id, standing.rank, expected)
+
+        tokens = {user_id: create_access_token(db.session.get(User, user_id)) for user_id in user_ids[:50]}
+        mine = {
+            user_id: list(db.session.scalars(select(Activity.id).where(Activity.user_id == user_id)))
+            for user_id in tokens
+        }
+
+    # Load every board the writes can touch so they are maintained in place
+    with app.app_context():
+        for cid in category_ids:
+            for start in (this_week - timedelta(days=7), this_week):
+                leaderboards.top(cid, start, 1)
+
+    client = app.test_client()
+    started = time.perf_counter()
+    for _ in range(args.writes):
+        user_id = rng.choice(list(tokens))
+        headers = {"Authorization": f"Bearer {tokens[user_id]}"}
+        action = rng.random()
+        if action < 0.4 or not mine[user_id]:
+            response = client.post("/me/activities", headers=headers, json={
+                "title": "Extra",
+                "category": rng.choice(CATEGORIES),
+                "distance": round(rng.uniform(1, 40), 2),
+                "duration": "00:40:00",
+                "time": "07:00:00",
+                "date": rng.choice(days).isoformat(),
+            })
+            assert response.status_code == 201, response.get_data(as_text=True)
+            mine[user_id].append(response.get_json()["activity"]["id"])
+        elif action < 0.8:
+            body = rng.choice((
+                {"distance": round(rng.uniform(1, 40), 2)},
+                {"date": rng.choice(days).isoformat()},
+                {"category": rng.choice(CATEGORIES)},
+            ))
+            response = client.patch(f"/me/activities/{rng.choice(mine[user_id])}", headers=headers, json=body)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        else:
+            activity_id = mine[user_id].pop(rng.randrange(len(mine[user_id])))
+            response = client.delete(f"/me/activities/{activity_id}", headers=headers)
+            assert response.status_code == 204, response.get_data(as_text=True)
+    write_seconds = time.perf_counter() - started
+
+    with app.app_context():
+        cached = {}
+        for cid in category_ids:
+            for start in (this_week - timedelta(days=7), this_week):
+                standings, _ = leaderboards.top(cid, start, args.users)
+                for s in standings:
+                    cached[(cid, start, s.user_id)] = (round(s.total_distance, 6), s.activity_count)
+        stored = {
+            (e.category_id, e.week_start, e.user_id): (round(e.total_distance, 6), e.activity_count)
+            for e in db.session.scalars(select(LeaderboardEntry))
+        }
+        expected = {
+            (row["category_id"], row["week_start"], row["user_id"]): (round(row["total_distance"], 6), row["activity_count"])
+            for row in compute_leaderboards().rows()
+        }
+        assert stored == expected, "leaderboard_entries drifted from activities"
+        assert cached == expected, "cached boards drifted from activities"
+        assert not find_drift(), "rollups drifted"
+
+    emit({
+        "benchmark": "leaderboards",
+        "users": args.users,
+        "activities": args.users * args.activities_per_user,
+        "entries": entries,
+        "reads": reads,
+        "writes": {"count": args.writes, "seconds": round(write_seconds, 3), "consistent": True},
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Login throughput under concurrency, with bcrypt inline vs. in the worker pool.
+
+    python -m backend.benchmarks.login_pool --threads 16 --requests 20 --workers 4
+
+Each mode fires `threads * requests` POST /login calls from concurrent
+threads and reports throughput, latency percentiles and how many requests
+were shed with 503 by the bounded pool.
+"""
+import argparse
+import threading
+import time
+
+from .common import emit, load_app, percentiles
+
+
+EMAIL = "bench.login@example.com"
+PASSWORD = "password123"
+
+
+def _ensure_user(app):
+    from ..models import db, User
+
+    with app.app_context():
+        if not User.query.filter_by(email=EMAIL).one_or_none():
+            User.signup(email=EMAIL, password=PASSWORD, first_name="Bench", last_name="Login")
+            db.session.commit()
+
+
+def run_mode(app, threads: int, requests: int):
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(threads)
+
+    def worker():
+        client = app.test_client()
+        start_gate.wait()
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            resp = client.post("/login", json={"email": EMAIL, "password": PASSWORD})
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    ok = statuses.get(200, 0)
+    return {
+        "requests": len(latencies),
+        "wall_seconds": round(wall, 3),
+        "successful_logins_per_second": round(ok / wall, 2) if wall else None,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20, help="logins per thread")
+    parser.add_argument("--workers", type=int, default=4, help="pool processes for the pooled run")
+    parser.add_argument("--max-pending", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args(argv)
+
+    app = load_app()
+    from ..passwords import password_hasher
+
+    password_hasher.configure(rounds=args.rounds, max_pending=args.threads)
+    _ensure_user(app)
+
+    results = {}
+    modes = [
+        ("inline", 0, args.threads),
+        ("pool", args.workers, args.max_pending),
+    ]
+    for name, workers, max_pending in modes:
+        password_hasher.configure(workers=workers, max_pending=max_pending)
+        run_mode(app, threads=min(args.threads, 2), requests=1)  # warm pool and caches
+        results[name] = run_mode(app, args.threads, args.requests)
+        results[name].update(workers=workers, max_pending=max_pending)
+    password_hasher.shutdown()
+
+    emit({"benchmark": "login_pool", "threads": args.threads, "rounds": args.rounds, "modes": results})
+
+
+if __name__ == "__main__":
+    main()
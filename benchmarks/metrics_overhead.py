@@ -0,0 +1,56 @@
+"""Per-request cost of the /metrics instrumentation.
+
+    python -m backend.benchmarks.metrics_overhead
+
+Times GET /hello through the test client with the request hooks installed
+and with them bypassed, plus the bare `metrics.observe` call. The database
+is not touched.
+"""
+import argparse
+import timeit
+
+from .common import emit, load_app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    app = load_app()
+    from ..metrics import metrics
+
+    client = app.test_client()
+
+    def hello():
+        client.get("/hello")
+
+    def observe():
+        metrics.observe("bench.endpoint", "GET", 200, 0.012, 3, 0.002)
+
+    instrumented = min(timeit.repeat(hello, number=args.number, repeat=3)) / args.number
+    observe_cost = min(timeit.repeat(observe, number=args.number * 10, repeat=3)) / (args.number * 10)
+
+    # Temporarily drop the metrics hooks to measure the same request without them
+    before_funcs = app.before_request_funcs.get(None, [])
+    after_funcs = app.after_request_funcs.get(None, [])
+    saved = list(before_funcs), list(after_funcs)
+    hooks_module = type(metrics).__module__
+    before_funcs[:] = [f for f in before_funcs if f.__module__ != hooks_module]
+    after_funcs[:] = [f for f in after_funcs if f.__module__ != hooks_module]
+    try:
+        bare = min(timeit.repeat(hello, number=args.number, repeat=3)) / args.number
+    finally:
+        before_funcs[:], after_funcs[:] = saved
+
+    emit({
+        "benchmark": "metrics_overhead",
+        "request_us_with_metrics": round(instrumented * 1e6, 2),
+        "request_us_without_metrics": round(bare * 1e6, 2),
+        "overhead_us": round((instrumented - bare) * 1e6, 2),
+        "observe_us": round(observe_cost * 1e6, 3),
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Per-row cost of building and encoding a 100-item activity page.
+
+    python -m backend.benchmarks.serialization --rows 100 --repeat 2000
+
+"before" is the hand-built dict per row plus Flask's default JSON encoding
+(stdlib json with sorted keys); "after" is `activity_serializer.many` plus
+`serializers.dumps`. Needs no database.
+"""
+import argparse
+import json
+import timeit
+from collections import namedtuple
+from datetime import date, time, timedelta
+
+from .common import emit
+from ..serializers import activity_serializer, dumps, orjson
+
+
+Row = namedtuple("Row", activity_serializer.fields)
+
+
+def make_rows(n):
+    return [
+        Row(
+            id=i,
+            title=f"Activity {i}",
+            category_id=1 + i % 5,
+            category="Run",
+            distance=5.0 + i / 10,
+            duration=time(0, 42, i % 60),
+            notes="Tempo run" if i % 2 else None,
+            user_id=7,
+            time=time(6, 30, 0),
+            date=date(2024, 1, 1) + timedelta(days=i % 28),
+            complete=bool(i % 3),
+        )
+        for i in range(n)
+    ]
+
+
+def before(rows):
+    payload = [
+        {
+            "id": a.id,
+            "title": a.title,
+            "category_id": a.category_id,
+            "category": a.category,
+            "distance": a.distance,
+            "duration": a.duration.isoformat() if a.duration else None,
+            "notes": a.notes,
+            "user_id": a.user_id,
+            "time": a.time.isoformat() if a.time else None,
+            "date": a.date.isoformat() if a.date else None,
+            "complete": a.complete,
+        }
+        for a in rows
+    ]
+    return json.dumps({"activities": payload, "count": len(payload)}, sort_keys=True).encode()
+
+
+def after(rows):
+    payload = activity_serializer.many(rows)
+    return dumps({"activities": payload, "count": len(payload)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    rows = make_rows(args.rows)
+    assert json.loads(before(rows)) == json.loads(after(rows))
+
+    results = {}
+    for name, fn in (("before", before), ("after", after)):
+        best = min(timeit.repeat(lambda: fn(rows), number=args.repeat, repeat=5))
+        per_page = best / args.repeat
+        results[name] = {
+            "page_us": round(per_page * 1e6, 2),
+            "per_row_us": round(per_page / args.rows * 1e6, 3),
+        }
+    results["speedup"] = round(results["before"]["page_us"] / results["after"]["page_us"], 2)
+
+    emit({
+        "benchmark": "serialization",
+        "rows": args.rows,
+        "encoder": "orjson" if orjson is not None else "json",
+        "results": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
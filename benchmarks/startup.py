@@ -0,0 +1,68 @@
+"""Cold-start cost of importing the package and building the app per profile.
+
+    python -m backend.benchmarks.startup --runs 5
+
+Each run is a fresh interpreter, so nothing is cached between samples. For
+every profile it reports the time to import `backend.app`, the time spent in
+`create_app`, and how many modules ended up loaded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from .common import emit, prepare_env
+
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+from backend.app import create_app
+t1 = time.perf_counter()
+app = create_app(sys.argv[1])
+t2 = time.perf_counter()
+json.dump({
+    "import_s": t1 - t0,
+    "create_app_s": t2 - t1,
+    "modules": len(sys.modules),
+    "debug_toolbar": "flask_debugtoolbar" in sys.modules,
+    "importer_loaded": "backend.importer" in sys.modules,
+}, sys.stdout)
+"""
+
+
+def _sample(profile: str) -> dict:
+    package_parent = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_parent, env.get("PYTHONPATH")]))
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE, profile],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profiles", nargs="+", default=["development", "production", "testing"])
+    args = parser.parse_args(argv)
+
+    prepare_env()
+    results = {}
+    for profile in args.profiles:
+        samples = [_sample(profile) for _ in range(args.runs)]
+        results[profile] = {
+            "import_ms": round(min(s["import_s"] for s in samples) * 1000, 2),
+            "create_app_ms": round(min(s["create_app_s"] for s in samples) * 1000, 2),
+            "total_ms": round(min(s["import_s"] + s["create_app_s"] for s in samples) * 1000, 2),
+            "modules": samples[-1]["modules"],
+            "debug_toolbar": samples[-1]["debug_toolbar"],
+            "importer_loaded": samples[-1]["importer_loaded"],
+        }
+    emit({"benchmark": "startup", "runs": args.runs, "profiles": results})
+
+
+if __name__ == "__main__":
+    main()
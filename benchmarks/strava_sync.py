@@ -0,0 +1,274 @@
+"""Strava sync against a local stub of the Strava API.
+
+    python -m backend.benchmarks.strava_sync --activities 2000 --latency-ms 150 --concurrency 4
+
+Starts a threaded HTTP server that mimics the endpoints the sync uses:
+GET /athlete/activities (with `after`/`page`/`per_page`, oldest first,
+per-request latency, X-RateLimit-* headers and 429s past the limit),
+GET /activities/{id}, GET /athlete and the OAuth token refresh. It then
+times, for one fresh athlete per scenario:
+
+- a full sync fetching one page at a time (`--concurrency 1`)
+- a full sync with `--concurrency` pages in flight (its access token starts expired)
+- an incremental sync after `--new` more activities appear
+- a full sync under a tight rate limit (`--limit` requests per `--window` seconds)
+
+It checks that every activity arrived exactly once, that a repeat sync
+adds nothing, and that the rollups match the activities table.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+import zlib
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .common import emit, load_app
+
+
+SPORTS = ("Run", "Ride", "Swim", "WeightTraining", "Yoga", "TrailRun", "Kayaking")
+EPOCH = datetime(2024, 1, 1, 6, 0, tzinfo=timezone.utc)
+
+
+def _activity(athlete: str, index: int) -> dict:
+    start = EPOCH + timedelta(hours=7 * index)
+    return {
+        "id": zlib.crc32(athlete.encode()) % 10000 * 10**7 + index,
+        "name": f"Stub activity {index}",
+        "sport_type": SPORTS[index % len(SPORTS)],
+        "distance": 1000.0 + 37 * (index % 200),
+        "moving_time": 1200 + 11 * (index % 300),
+        "elapsed_time": 1500 + 11 * (index % 300),
+        "start_date": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "start_date_local": (start + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "_epoch": int(start.timestamp()),
+    }
+
+
+class StubStrava:
+    """In-memory Strava: athletes by access token, with rate limiting."""
+
+    def __init__(self, latency: float, limit: int, daily_limit: int, window: float):
+        self.latency = latency
+        self.limit = limit
+        self.daily_limit = daily_limit
+        self.window = window
+        self.athletes = {}  # name -> list of activities, oldest first
+        self.tokens = {}  # access token -> athlete name
+        self.usage = defaultdict(int)  # window index -> requests
+        self.daily = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def add_athlete(self, name: str, count: int) -> str:
+        self.athletes[name] = [_activity(name, i) for i in range(count)]
+        token = f"token-{name}-0"
+        self.tokens[token] = name
+        return token
+
+    def add_activities(self, name: str, count: int) -> None:
+        start = len(self.athletes[name])
+        self.athletes[name].extend(_activity(name, start + i) for i in range(count))
+
+    def find(self, athlete: str, activity_id: str):
+        for activity in self.athletes[athlete]:
+            if str(activity["id"]) == activity_id:
+                return {k: v for k, v in activity.items() if k != "_epoch"}
+        return None
+
+    def count(self):
+        """Count a request; returns (allowed, headers)."""
+        with self.lock:
+            index = int(time.time() // self.window)
+            allowed = self.usage[index] < self.limit and self.daily < self.daily_limit
+            if allowed:
+                self.usage[index] += 1
+                self.daily += 1
+            else:
+                self.throttled += 1
+            headers = {
+                "X-RateLimit-Limit": f"{self.limit},{self.daily_limit}",
+                "X-RateLimit-Usage": f"{self.usage[index]},{self.daily}",
+            }
+        return allowed, headers
+
+
+def make_handler(stub: StubStrava):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            single = url.path.startswith("/api/v3/activities/")
+            profile = url.path == "/api/v3/athlete"
+            if url.path != "/api/v3/athlete/activities" and not single and not profile:
+                return self._send(404, {"message": "Record Not Found"})
+            token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+            athlete = stub.tokens.get(token)
+            if athlete is None:
+                return self._send(401, {"message": "Authorization Error"})
+            allowed, headers = stub.count()
+            if not allowed:
+                return self._send(429, {"message": "Rate Limit Exceeded"}, headers)
+            if profile:
+                return self._send(200, {"id": athlete}, headers)
+            if single:
+                time.sleep(stub.latency)
+                found = stub.find(athlete, url.path.rsplit("/", 1)[-1])
+                if found is None:
+                    return self._send(404, {"message": "Record Not Found"}, headers)
+                return self._send(200, found, headers)
+            params = dict(urllib.parse.parse_qsl(url.query))
+            after = int(params.get("after", 0))
+            page = int(params.get("page", 1))
+            per_page = int(params.get("per_page", 30))
+            time.sleep(stub.latency)
+            activities = stub.athletes[athlete]
+            first = bisect_right([a["_epoch"] for a in activities], after) + (page - 1) * per_page
+            items = [
+                {k: v for k, v in a.items() if k != "_epoch"}
+                for a in activities[first:first + per_page]
+            ]
+            self._send(200, items, headers)
+
+        def do_POST(self):
+            if self.path != "/oauth/token":
+                return self._send(404, {"message": "Record Not Found"})
+            length = int(self.headers.get("Content-Length", 0))
+            fields = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode("ascii")))
+            athlete = fields.get("refresh_token", "").removeprefix("refresh-")
+            if athlete not in stub.athletes:
+                return self._send(400, {"message": "Bad Request"})
+            token = f"token-{athlete}-{time.monotonic_ns()}"
+            stub.tokens[token] = athlete
+            self._send(200, {
+                "access_token": token,
+                "refresh_token": f"refresh-{athlete}",
+                "expires_at": int(time.time()) + 21600,
+            })
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--activities", type=int, default=2000)
+    parser.add_argument("--new", type=int, default=25, help="Activities added before the incremental sync.")
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="Stub response latency.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--per-page", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=6, help="Requests per window in the rate-limited run.")
+    parser.add_argument("--window", type=float, default=2.0, help="Rate-limit window (seconds) for the stub.")
+    args = parser.parse_args(argv)
+
+    stub = StubStrava(args.latency_ms / 1000, limit=10**6, daily_limit=10**6, window=args.window)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    app = load_app(
+        STRAVA_API_URL=f"{base}/api/v3",
+        STRAVA_TOKEN_URL=f"{base}/oauth/token",
+        STRAVA_DEFAULT_CATEGORY=None,
+    )
+
+    from sqlalchemy import func, select
+    from ..category_registry import category_registry
+    from ..models import db, Activity, ActivityCategory, ProviderConnection, User
+    from ..rollups import find_drift
+    from ..strava import RateLimitBudget, sync_connection
+
+    def connect(name: str, expired: bool = False) -> ProviderConnection:
+        token = stub.add_athlete(name, args.activities)
+        user = User(email=f"{name}@example.com", password="-", first_name="Strava", last_name=name)
+        db.session.add(user)
+        db.session.flush()
+        connection = ProviderConnection(
+            user_id=user.id,
+            provider="strava",
+            access_token="expired" if expired else token,
+            refresh_token=f"refresh-{name}",
+            expires_at=int(time.time()) - 10 if expired else int(time.time()) + 21600,
+            synced_until=0,
+        )
+        db.session.add(connection)
+        db.session.commit()
+        return connection
+
+    def run(connection, concurrency, budget=None):
+        budget = budget or RateLimitBudget(window=args.window)
+        started = time.perf_counter()
+        result = sync_connection(connection, budget=budget, concurrency=concurrency, per_page=args.per_page)
+        elapsed = time.perf_counter() - started
+        return {
+            "seconds": round(elapsed, 3),
+            "requests": budget.requests,
+            "stalled_s": round(budget.stalled, 3),
+            **result.as_dict(),
+        }
+
+    def stored(connection) -> int:
+        return db.session.scalar(select(func.count()).where(Activity.user_id == connection.user_id))
+
+    results = {}
+    with app.app_context():
+        for name in ("Run", "Bike", "Swim", "Weight Training", "Yoga"):
+            if not category_registry.find(name):
+                db.session.add(ActivityCategory(name=name))
+        db.session.commit()
+        # One sport type in SPORTS maps to no category and is skipped
+        expected = args.activities - sum(1 for i in range(args.activities) if SPORTS[i % len(SPORTS)] == "Kayaking")
+
+        sequential = connect("sequential")
+        results["full_sequential"] = run(sequential, 1)
+        concurrent = connect("concurrent", expired=True)
+        results["full_concurrent"] = run(concurrent, args.concurrency)
+        for connection in (sequential, concurrent):
+            assert stored(connection) == expected, (stored(connection), expected)
+
+        stub.add_activities("concurrent", args.new)
+        results["incremental"] = run(concurrent, args.concurrency)
+        results["repeat"] = run(concurrent, args.concurrency)
+        assert results["repeat"]["inserted"] == 0 and results["repeat"]["fetched"] == 0
+        expected_new = sum(
+            1 for i in range(args.activities, args.activities + args.new) if SPORTS[i % len(SPORTS)] != "Kayaking"
+        )
+        assert stored(concurrent) == expected + expected_new
+
+        stub.limit = args.limit
+        limited = connect("limited")
+        results["full_rate_limited"] = run(limited, args.concurrency, RateLimitBudget(reserve=0, window=args.window))
+        assert stored(limited) == expected
+        results["full_rate_limited"]["stub_429s"] = stub.throttled
+
+        assert not find_drift(), "rollups drifted"
+
+    server.shutdown()
+    emit({
+        "benchmark": "strava_sync",
+        "activities": args.activities,
+        "latency_ms": args.latency_ms,
+        "concurrency": args.concurrency,
+        "per_page": args.per_page,
+        "rate_limit": {"limit": args.limit, "window_s": args.window},
+        "scenarios": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
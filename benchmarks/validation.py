@@ -0,0 +1,80 @@
+"""Per-request cost of validating a JSON body: WTForms vs. compiled schemas.
+
+    python -m backend.benchmarks.validation --repeat 5000
+
+"before" builds the FlaskForm and calls `validate_on_submit()` inside a JSON
+request context, as `json_form_required` used to; "after" is
+`Schema.validate` on the same payload. Both are timed inside one request
+context, so request setup is excluded. Valid and invalid payloads are
+measured per form, after checking that both paths report the same errors.
+Needs no database.
+"""
+import argparse
+import timeit
+
+from flask import Flask
+
+from .common import emit
+from .. import forms
+from ..schemas import schema_for
+
+
+CASES = {
+    "activity": (forms.ActivityForm, {
+        "valid": {"title": "Morning Run", "category": "Run", "distance": 5.2,
+                  "duration": "00:42:30", "time": "06:30:00", "notes": "Tempo", "complete": True},
+        "invalid": {"title": "x" * 30, "distance": "far", "duration": "42 min", "time": ""},
+    }),
+    "activity_update": (forms.ActivityUpdateForm, {
+        "valid": {"distance": 3.5, "complete": False},
+        "invalid": {"distance": -1, "time": "noon"},
+    }),
+    "signup": (forms.UserAddForm, {
+        "valid": {"email": "bench@example.com", "password": "password123", "first_name": "Bench",
+                  "last_name": "User", "birthday": "1990-04-01", "weight": 70},
+        "invalid": {"email": "not-an-email", "password": "123", "first_name": ""},
+    }),
+    "login": (forms.LoginForm, {
+        "valid": {"email": "bench@example.com", "password": "password123"},
+        "invalid": {"email": "", "password": ""},
+    }),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "benchmark-secret"
+
+    results = {}
+    for name, (form_cls, payloads) in CASES.items():
+        schema = schema_for(form_cls)
+        for kind, payload in payloads.items():
+            with app.test_request_context("/", method="POST", json=payload):
+                def before():
+                    form = form_cls(csrf_enabled=False, data=payload)
+                    form.validate_on_submit()
+                    return form
+
+                def after():
+                    return schema.validate(payload)
+
+                form = before()
+                _, errors = after()
+                assert form.errors == (errors or {}), (name, kind, form.errors, errors)
+
+                timings = {}
+                for label, fn in (("before", before), ("after", after)):
+                    best = min(timeit.repeat(fn, number=args.repeat, repeat=5))
+                    timings[f"{label}_us"] = round(best / args.repeat * 1e6, 2)
+                timings["speedup"] = round(timings["before_us"] / timings["after_us"], 1)
+                results[f"{name}.{kind}"] = timings
+
+    emit({"benchmark": "validation", "repeat": args.repeat, "cases": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Webhook intake and queue draining against the local Strava stub.
+
+    python -m backend.benchmarks.webhooks --objects 500 --events-per-object 4 --batch-size 100
+
+Posts `--objects * --events-per-object` Strava-style push events (creates,
+updates and some deletes, shuffled) to POST /webhooks/strava through the
+test client. It reports the acknowledgement latency for the first and last
+tenth of the events, which should match because intake does not depend on
+queue depth, and how many queue entries the events coalesced into. It then
+drains the queue with the worker's claim/apply/ack loop against the stub
+from `strava_sync` and reports throughput, Strava requests made and
+requests saved by coalescing. Finally it checks that exactly the objects
+whose last event was not a delete are stored.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from .common import emit, load_app, percentiles
+from .strava_sync import StubStrava, make_handler
+
+
+ATHLETE = "4242"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=500)
+    parser.add_argument("--events-per-object", type=int, default=4)
+    parser.add_argument("--delete-share", type=float, default=0.1, help="Share of objects whose last event is a delete.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Stub response latency.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    stub = StubStrava(args.latency_ms / 1000, limit=10**6, daily_limit=10**6, window=900)
+    token = stub.add_athlete(ATHLETE, args.objects)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    app = load_app(
+        STRAVA_API_URL=f"{base}/api/v3",
+        STRAVA_TOKEN_URL=f"{base}/oauth/token",
+        STRAVA_DEFAULT_CATEGORY="Run",
+        WEBHOOK_QUEUE_PATH=os.path.join(tempfile.mkdtemp(prefix="fitness-bench-"), "queue.db"),
+    )
+
+    from sqlalchemy import select
+    from ..category_registry import category_registry
+    from ..models import db, Activity, ActivityCategory, ProviderConnection, User
+    from ..rollups import find_drift
+    from ..strava import RateLimitBudget, apply_events
+    from ..webhooks import webhook_queue
+
+    with app.app_context():
+        for name in ("Run", "Bike", "Swim", "Weight Training", "Yoga"):
+            if not category_registry.find(name):
+                db.session.add(ActivityCategory(name=name))
+        user = User(email="webhooks@example.com", password="-", first_name="Web", last_name="Hooks")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(ProviderConnection(
+            user_id=user.id, provider="strava", athlete_id=ATHLETE, access_token=token, synced_until=0,
+        ))
+        db.session.commit()
+        user_id = user.id
+
+    # Each object gets a create, then updates; some end with a delete
+    ids = [activity["id"] for activity in stub.athletes[ATHLETE]]
+    deleted = set(rng.sample(ids, int(len(ids) * args.delete_share)))
+    events = []
+    for object_id in ids:
+        aspects = ["create"] + ["update"] * (args.events_per_object - 1)
+        if object_id in deleted:
+            aspects[-1] = "delete"
+        for offset, aspect in enumerate(aspects):
+            events.append((object_id, aspect, 1_700_000_000 + offset))
+    # Keep each object's events in order but interleave objects
+    rng.shuffle(events)
+    events.sort(key=lambda e: e[2])
+
+    client = app.test_client()
+    latencies = []
+    for object_id, aspect, event_time in events:
+        body = {
+            "object_type": "activity",
+            "object_id": object_id,
+            "aspect_type": aspect,
+            "owner_id": int(ATHLETE),
+            "subscription_id": 1,
+            "event_time": event_time,
+            "updates": {"title": "Renamed"} if aspect == "update" else {},
+        }
+        started = time.perf_counter()
+        response = client.post("/webhooks/strava", json=body)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    tenth = max(1, len(latencies) // 10)
+    with app.app_context():
+        queued = webhook_queue.stats()["pending"]
+        assert queued == len(ids), (queued, len(ids))
+
+        budget = RateLimitBudget()
+        batches = 0
+        started = time.perf_counter()
+        while True:
+            claimed = webhook_queue.claim(limit=args.batch_size)
+            if not claimed:
+                break
+            result = apply_events(claimed, budget)
+            assert not result.failed and not result.deferred, (result.failed, result.deferred)
+            webhook_queue.ack(result.done)
+            batches += 1
+        drain_seconds = time.perf_counter() - started
+
+        stored = set(db.session.scalars(
+            select(Activity.external_id).where(Activity.user_id == user_id, Activity.external_source == "strava")
+        ))
+        assert stored == {str(i) for i in ids if i not in deleted}, "stored activities differ from the events"
+        assert webhook_queue.stats()["pending"] == 0
+        assert not find_drift(), "rollups drifted"
+
+    server.shutdown()
+    emit({
+        "benchmark": "webhooks",
+        "events": len(events),
+        "objects": len(ids),
+        "latency_ms": args.latency_ms,
+        "intake": {
+            "first_tenth_ms": percentiles(latencies[:tenth]),
+            "last_tenth_ms": percentiles(latencies[-tenth:]),
+            "queue_entries": queued,
+        },
+        "drain": {
+            "batches": batches,
+            "seconds": round(drain_seconds, 3),
+            "events_per_s": round(len(events) / drain_seconds, 1),
+            "strava_requests": budget.requests,
+            "requests_without_coalescing": sum(1 for _, aspect, _ in events if aspect != "delete"),
+            "stored": len(stored),
+        },
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Process-wide index of activity categories.
+
+The category table is tiny and almost never changes, so write paths resolve
+categories from this in-memory snapshot instead of querying per request.
+The snapshot is reloaded when its TTL lapses, when this process changes a
+category, or (rate-limited) when a lookup misses, which picks up categories
+added by other workers.
+"""
+import hashlib
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from .models import db, ActivityCategory
+
+
+class CategoryRef(NamedTuple):
+    """Detached (id, name) pair; safe to share across sessions and threads."""
+
+    id: int
+    name: str
+
+
+def _fold(name: str) -> str:
+    return name.strip().casefold()
+
+
+def _prefixed(keys: Sequence[str], prefix: str) -> range:
+    """Index range of the sorted `keys` that start with `prefix`."""
+    start = end = bisect_left(keys, prefix)
+    while end < len(keys) and keys[end].startswith(prefix):
+        end += 1
+    return range(start, end)
+
+
+class NameIndex:
+    """Autocomplete over category names, built once per registry snapshot.
+
+    Matches rank as: name starts with the query, then a later word of the
+    name does, then the query appears anywhere; alphabetical within a rank.
+    """
+
+    def __init__(self, refs: Sequence[CategoryRef]):
+        names = sorted((_fold(ref.name), ref) for ref in refs)
+        self._names = [key for key, _ in names]
+        self._name_refs = [ref for _, ref in names]
+        words: List[Tuple[str, str, CategoryRef]] = []
+        for key, ref in names:
+            for word in key.split()[1:]:
+                words.append((word, key, ref))
+        words.sort()
+        self._words = [word for word, _, _ in words]
+        self._word_refs = [ref for _, _, ref in words]
+
+    def complete(self, q: str, limit: int) -> List[CategoryRef]:
+        needle = _fold(q)
+        if not needle or limit <= 0:
+            return []
+        results: List[CategoryRef] = []
+        seen = set()
+
+        def take(ref: CategoryRef) -> bool:
+            if ref.id not in seen:
+                seen.add(ref.id)
+                results.append(ref)
+            return len(results) >= limit
+
+        for i in _prefixed(self._names, needle):
+            if take(self._name_refs[i]):
+                return results
+        for ref in sorted((self._word_refs[i] for i in _prefixed(self._words, needle)), key=lambda r: r.name):
+            if take(ref):
+                return results
+        for key, ref in zip(self._names, self._name_refs):
+            if needle in key and take(ref):
+                return results
+        return results
+
+
+class CategoryRegistry:
+    """Categories indexed by id and by case-folded name."""
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        miss_refresh_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.miss_refresh_interval = miss_refresh_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._by_id: Dict[int, CategoryRef] = {}
+        self._by_name: Dict[str, CategoryRef] = {}
+        self._loaded_at: Optional[float] = None
+        self._dirty = True
+        self.version = 0
+        # Content hash of the snapshot; equal across processes holding the same categories
+        self.digest = ""
+        self._index: Optional[NameIndex] = None
+        self._index_version = -1
+
+    def configure(self, ttl: Optional[float] = None, miss_refresh_interval: Optional[float] = None) -> None:
+        if ttl is not None:
+            self.ttl = ttl
+        if miss_refresh_interval is not None:
+            self.miss_refresh_interval = miss_refresh_interval
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Force a reload on the next lookup."""
+        self._dirty = True
+
+    def refresh(self) -> None:
+        """Reload the snapshot from the database (requires an app context)."""
+        with self._lock:
+            rows = db.session.execute(select(ActivityCategory.id, ActivityCategory.name)).all()
+            by_id = {r.id: CategoryRef(r.id, r.name) for r in rows}
+            if by_id != self._by_id:
+                self.version += 1
+                self.digest = hashlib.blake2b(
+                    repr(sorted(by_id.items())).encode("utf-8"), digest_size=8
+                ).hexdigest()
+            self._by_id = by_id
+            self._by_name = {_fold(ref.name): ref for ref in by_id.values()}
+            self._loaded_at = self._clock()
+            self._dirty = False
+
+    def _ensure_fresh(self) -> None:
+        if self._dirty or self._loaded_at is None or self._clock() - self._loaded_at >= self.ttl:
+            self.refresh()
+
+    def _refresh_after_miss(self) -> bool:
+        if self._loaded_at is not None and self._clock() - self._loaded_at < self.miss_refresh_interval:
+            return False
+        self.refresh()
+        return True
+
+    def get(self, category_id: int) -> Optional[CategoryRef]:
+        self._ensure_fresh()
+        ref = self._by_id.get(category_id)
+        if ref is None and self._refresh_after_miss():
+            ref = self._by_id.get(category_id)
+        return ref
+
+    def find(self, name: str) -> Optional[CategoryRef]:
+        """Case-insensitive lookup by name."""
+        self._ensure_fresh()
+        key = _fold(name)
+        ref = self._by_name.get(key)
+        if ref is None and self._refresh_after_miss():
+            ref = self._by_name.get(key)
+        return ref
+
+    def all(self) -> List[CategoryRef]:
+        """All categories ordered by name."""
+        self._ensure_fresh()
+        return sorted(self._by_id.values(), key=lambda ref: ref.name)
+
+    def matching(self, q: str) -> List[CategoryRef]:
+        """Every category whose name contains `q` (case-insensitive), ordered by name."""
+        needle = _fold(q)
+        return [ref for ref in self.all() if needle in _fold(ref.name)]
+
+    def complete(self, q: str, limit: int = 10) -> List[CategoryRef]:
+        """Up to `limit` categories matching `q`, best first (see `NameIndex`)."""
+        self._ensure_fresh()
+        index = self._index
+        if index is None or self._index_version != self.version:
+            with self._lock:
+                if self._index is None or self._index_version != self.version:
+                    self._index = NameIndex(list(self._by_id.values()))
+                    self._index_version = self.version
+                index = self._index
+        return index.complete(q, limit)
+
+
+category_registry = CategoryRegistry()
+
+
+@event.listens_for(ActivityCategory, "after_insert")
+@event.listens_for(ActivityCategory, "after_update")
+@event.listens_for(ActivityCategory, "after_delete")
+def _category_changed(mapper, connection, target):
+    # Defer the reload until the change is committed and visible to other sessions
+    session = object_session(target)
+    if session is not None:
+        session.info["categories_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("categories_changed", False):
+        category_registry.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("categories_changed", None)
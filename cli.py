@@ -1,7 +1,240 @@
+import click
+
+
 def register_cli(app):
     @app.cli.command("seed")
-    def seed_command():
+    @click.option("--users", type=int, help="Bulk-generate this many synthetic users.")
+    @click.option("--activities-per-user", type=int, default=100, show_default=True)
+    @click.option("--seed", "seed_value", type=int, default=0, show_default=True, help="Random seed for reproducible data.")
+    @click.option("--batch-users", type=int, default=1000, show_default=True, help="Users per committed batch.")
+    def seed_command(users, activities_per_user, seed_value, batch_users):
         """Seed database with sample users, categories, and activities."""
+        if users:
+            from .seed import generate
+            try:
+                generate(users, activities_per_user, seed=seed_value, batch_users=batch_users, log=click.echo)
+            except RuntimeError as exc:
+                raise click.ClickException(str(exc))
+            return
         from .seed import main as _seed_main
         _seed_main()
 
+    @app.cli.command("import-activities")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--email", required=True, help="Owner of the imported activities.")
+    @click.option("--format", "fmt", type=click.Choice(["csv", "gpx"]), help="Defaults to the file extension.")
+    @click.option("--resume", "resume_id", type=int, help="Continue a previous import of the same file.")
+    @click.option("--chunk-size", default=1000, show_default=True, help="Rows per committed chunk.")
+    @click.option("--default-category", help="Category for rows/tracks that do not name one.")
+    def import_activities_command(path, email, fmt, resume_id, chunk_size, default_category):
+        """Import activities from a CSV or GPX file."""
+        from .importer import detect_format, start_import, run_import
+        from .models import User, ActivityImport
+
+        user = User.query.filter_by(email=email).one_or_none()
+        if not user:
+            raise click.ClickException(f"No user with email {email}")
+        fmt = fmt or detect_format(path)
+        if not fmt:
+            raise click.ClickException("Cannot infer format; pass --format")
+
+        if resume_id is not None:
+            job = ActivityImport.query.filter_by(id=resume_id, user_id=user.id).one_or_none()
+            if not job:
+                raise click.ClickException(f"No import {resume_id} for {email}")
+        else:
+            job = start_import(user.id, fmt, path)
+        click.echo(f"Import {job.id}: starting after {job.rows_processed} rows")
+
+        def progress(j):
+            click.echo(f"  {j.rows_processed} rows processed, {j.rows_imported} imported, {j.rows_skipped} skipped")
+
+        with open(path, "rb") as fh:
+            try:
+                run_import(job, fh, chunk_size=chunk_size, default_category=default_category, on_chunk=progress)
+            except Exception as exc:
+                raise click.ClickException(
+                    f"Import {job.id} failed after {job.rows_processed} rows: {exc}. "
+                    f"Re-run with --resume {job.id}"
+                )
+        click.echo(f"Import {job.id} {job.status}")
+
+    @app.cli.group("rollups")
+    def rollups_group():
+        """Maintain the per-user activity rollups behind /me/activities/stats."""
+
+    @rollups_group.command("rebuild")
+    def rollups_rebuild_command():
+        """Recompute all rollups from the activities table."""
+        from .rollups import rebuild_rollups
+        count = rebuild_rollups()
+        click.echo(f"Rebuilt {count} rollup rows")
+
+    @rollups_group.command("check")
+    def rollups_check_command():
+        """Report rollups that drifted from the activities table."""
+        from .rollups import find_drift
+        drift = find_drift()
+        for (user_id, category_id), stored, expected in drift:
+            click.echo(f"user={user_id} category={category_id} stored={stored} expected={expected}")
+        if drift:
+            raise click.ClickException(f"{len(drift)} rollup rows drifted; run `flask rollups rebuild`")
+        click.echo("Rollups are consistent")
+
+    @app.cli.group("leaderboards")
+    def leaderboards_group():
+        """Maintain the weekly per-category leaderboards."""
+
+    @leaderboards_group.command("rebuild")
+    def leaderboards_rebuild_command():
+        """Recompute all leaderboard entries from the activities table."""
+        from .leaderboards import rebuild_leaderboards
+        count = rebuild_leaderboards()
+        click.echo(f"Rebuilt {count} leaderboard entries")
+
+    @app.cli.group("strava")
+    def strava_group():
+        """Pull activities from connected Strava accounts."""
+
+    @strava_group.command("connect")
+    @click.option("--email", required=True, help="User to link.")
+    @click.option("--access-token", required=True)
+    @click.option("--refresh-token", help="Lets the sync renew the access token.")
+    @click.option("--expires-at", type=int, help="Access token expiry (epoch seconds).")
+    @click.option("--athlete-id", help="Strava athlete id (default: looked up with the access token).")
+    def strava_connect_command(email, access_token, refresh_token, expires_at, athlete_id):
+        """Store (or replace) a user's Strava tokens, keeping the sync position."""
+        from .models import db, User, ProviderConnection
+        from .strava import PROVIDER, StravaError, fetch_athlete_id
+
+        user = User.query.filter_by(email=email).one_or_none()
+        if not user:
+            raise click.ClickException(f"No user with email {email}")
+        connection = ProviderConnection.query.filter_by(user_id=user.id, provider=PROVIDER).one_or_none()
+        # Webhook events name the athlete, so every connection needs the id
+        athlete_id = athlete_id or (connection.athlete_id if connection else None)
+        if not athlete_id:
+            try:
+                athlete_id = fetch_athlete_id(access_token)
+            except StravaError as exc:
+                raise click.ClickException(f"Could not look up the Strava athlete ({exc}); pass --athlete-id")
+        if connection is None:
+            connection = ProviderConnection(user_id=user.id, provider=PROVIDER, synced_until=0)
+            db.session.add(connection)
+        connection.access_token = access_token
+        connection.refresh_token = refresh_token
+        connection.expires_at = expires_at
+        connection.athlete_id = athlete_id
+        db.session.commit()
+        click.echo(f"Connected Strava for {email} (synced until {connection.synced_until})")
+
+    @strava_group.command("sync")
+    @click.option("--email", "emails", multiple=True, help="Only sync these users (repeatable); default all.")
+    @click.option("--concurrency", type=int, help="Pages in flight per user (default STRAVA_SYNC_CONCURRENCY).")
+    @click.option("--per-page", type=int, help="Activities per page, at most 200 (default STRAVA_PAGE_SIZE).")
+    @click.option("--default-category", help="Category for sport types that match none.")
+    def strava_sync_command(emails, concurrency, per_page, default_category):
+        """Pull new activities since each connection's last sync."""
+        from flask import current_app
+        from sqlalchemy.exc import SQLAlchemyError
+        from .models import db, User
+        from .strava import (
+            RateLimitBudget, StravaAuthError, StravaError, StravaRateLimited, connections, sync_connection,
+        )
+
+        user_ids = None
+        if emails:
+            users = User.query.filter(User.email.in_(emails)).all()
+            missing = set(emails) - {u.email for u in users}
+            if missing:
+                raise click.ClickException(f"No user with email {', '.join(sorted(missing))}")
+            user_ids = [u.id for u in users]
+
+        # One budget for the run: Strava's limits are per application, not per user
+        budget = RateLimitBudget(max_wait=current_app.config['STRAVA_RATE_LIMIT_MAX_WAIT'])
+        failed = 0
+        for connection in connections(user_ids):
+            label = f"user {connection.user_id}"
+            try:
+                result = sync_connection(
+                    connection,
+                    budget=budget,
+                    concurrency=concurrency,
+                    per_page=per_page,
+                    default_category=default_category,
+                )
+            except StravaRateLimited as exc:
+                raise click.ClickException(f"{label}: {exc}; re-run after epoch {int(exc.retry_at)}")
+            except StravaAuthError as exc:
+                failed += 1
+                click.echo(f"{label}: {exc}", err=True)
+                continue
+            except StravaError as exc:
+                failed += 1
+                click.echo(f"{label}: {exc}; will resume from {connection.synced_until}", err=True)
+                continue
+            except SQLAlchemyError as exc:
+                # Only the uncommitted page is lost; the next run resumes after the last committed one
+                db.session.rollback()
+                failed += 1
+                click.echo(
+                    f"{label}: database error: {getattr(exc, 'orig', None) or exc}; "
+                    f"will resume from {connection.synced_until}",
+                    err=True,
+                )
+                continue
+            click.echo(
+                f"{label}: {result.fetched} fetched, {result.inserted} new, {result.updated} updated, "
+                f"{result.skipped} skipped; synced until {connection.synced_until}"
+            )
+        click.echo(f"{budget.requests} Strava requests")
+        if failed:
+            raise click.ClickException(f"{failed} connections failed")
+
+    @app.cli.group("webhooks")
+    def webhooks_group():
+        """Apply queued provider webhook events."""
+
+    @webhooks_group.command("work")
+    @click.option("--batch-size", default=100, show_default=True, help="Events claimed per batch.")
+    @click.option("--lease", default=120.0, show_default=True, help="Seconds a claimed batch stays hidden from other workers.")
+    @click.option("--idle-sleep", default=1.0, show_default=True, help="Seconds to wait when the queue is empty.")
+    @click.option("--once", is_flag=True, help="Exit once the queue has no due events.")
+    def webhooks_work_command(batch_size, lease, idle_sleep, once):
+        """Drain the webhook queue into activities."""
+        import time
+        from flask import current_app
+        from .strava import RateLimitBudget, apply_events
+        from .webhooks import webhook_queue
+
+        budget = RateLimitBudget(max_wait=current_app.config['STRAVA_RATE_LIMIT_MAX_WAIT'])
+        while True:
+            events = webhook_queue.claim(limit=batch_size, lease=lease)
+            if not events:
+                if once:
+                    break
+                time.sleep(idle_sleep)
+                continue
+            result = apply_events(events, budget)
+            webhook_queue.ack(result.done)
+            for failed, error in result.failed:
+                webhook_queue.retry(failed, error)
+            if result.deferred:
+                delay = max(0.0, result.retry_at - time.time())
+                webhook_queue.retry(result.deferred, "rate limited", delay=delay, count_attempt=False)
+            click.echo(
+                f"{len(events)} events: {result.inserted} new, {result.updated} updated, "
+                f"{result.deleted} deleted, {sum(len(f) for f, _ in result.failed)} failed, "
+                f"{len(result.deferred)} deferred"
+            )
+            if result.deferred:
+                if once:
+                    break
+                time.sleep(delay)
+
+    @webhooks_group.command("stats")
+    def webhooks_stats_command():
+        """Show queue depth."""
+        from .webhooks import webhook_queue
+        stats = webhook_queue.stats()
+        click.echo(f"{stats['pending']} pending, {stats['due']} due, {stats['dead']} dead")
@@ -0,0 +1,101 @@
+"""Read/write session routing to an optional read replica.
+
+When `DATABASE_READ_URL` is set, the replica engine is registered as the
+`replica` bind. Views marked with `@read_only` send their SELECTs there;
+everything else stays on the primary, including:
+
+* flushes and DML statements (INSERT/UPDATE/DELETE);
+* any query after the session has written in the current request;
+* requests from a user who committed a write within the last
+  `REPLICA_STICKY_SECONDS` (read-your-own-writes despite replica lag);
+* work wrapped in `primary()`, such as resolving the JWT principal.
+"""
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session as _FlaskSession
+from sqlalchemy import event, inspect
+
+from .caching import TTLCache
+
+
+REPLICA_BIND = "replica"
+
+# user id -> True while that user's recent writes may not have replicated yet
+recent_writers = TTLCache(maxsize=100_000, ttl=5.0)
+
+
+def read_only(fn: Callable) -> Callable:
+    """Mark a view as safe to serve from the read replica."""
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def primary():
+    """Force queries issued inside the block onto the primary."""
+    previous = g.get("db_force_primary", False)
+    g.db_force_primary = True
+    try:
+        yield
+    finally:
+        g.db_force_primary = previous
+
+
+def _current_user_id():
+    user = g.get("current_user")
+    if user is None:
+        return None
+    identity = inspect(user).identity
+    return identity[0] if identity else None
+
+
+def _replica_allowed(session) -> bool:
+    if not has_app_context() or not g.get("db_read_only") or g.get("db_force_primary"):
+        return False
+    if session.info.get("wrote"):
+        return False
+    user_id = _current_user_id()
+    return user_id is None or recent_writers.get(user_id) is None
+
+
+class RoutingSession(_FlaskSession):
+    """Flask-SQLAlchemy session that may route reads to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, "is_dml", False):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None and _replica_allowed(self):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_writer(session):
+    if session.info.pop("wrote", False) and has_app_context():
+        user_id = _current_user_id()
+        if user_id is not None:
+            recent_writers.set(user_id, True)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
@@ -1,6 +1,8 @@
 from flask import jsonify
 from werkzeug.exceptions import HTTPException
 
+from .passwords import PasswordPoolSaturated
+
 
 def _json_error(status_code: int, message: str, **extra):
     payload = {"error": {"code": status_code, "message": message}}
@@ -45,6 +47,12 @@ def register_error_handlers(app):
         msg = err.description if isinstance(err, HTTPException) else "Too Many Requests"
         return _json_error(429, msg)
 
+    @app.errorhandler(PasswordPoolSaturated)
+    def password_pool_saturated(err):
+        response, status = _json_error(503, str(err))
+        response.headers["Retry-After"] = str(err.retry_after)
+        return response, status
+
     @app.errorhandler(Exception)
     def internal_error(err):
         if isinstance(err, HTTPException):
@@ -0,0 +1,89 @@
+"""Conditional GET support (ETag / If-None-Match -> 304).
+
+Per-user resources are tagged with `users.data_version`, which every write
+to a user's profile or activities bumps in the same transaction via
+`bump_data_version`. Answering a matching `If-None-Match` then costs one
+primary-key lookup and skips the view (its queries and serialization).
+
+The version is read before the view runs, so a write that lands in between
+can only make the tag older than the body; clients then refetch once more
+rather than keep a stale copy.
+"""
+import hashlib
+from functools import wraps
+from typing import Callable, Optional
+
+from flask import g, make_response, request
+from sqlalchemy import select, update
+
+from .models import db, User
+
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def bump_data_version(*user_ids: int) -> None:
+    """Invalidate the ETags of `user_ids`; call before committing the write."""
+    ids = {uid for uid in user_ids if uid is not None}
+    if not ids:
+        return
+    db.session.execute(
+        update(User)
+        .where(User.id.in_(ids))
+        .values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def data_version(user_id: int) -> Optional[int]:
+    return db.session.execute(select(User.data_version).where(User.id == user_id)).scalar_one_or_none()
+
+
+def query_variant() -> str:
+    """Short hash of the query string, so each filter/page gets its own tag."""
+    args = sorted(request.args.items(multi=True))
+    if not args:
+        return "-"
+    return hashlib.blake2b(repr(args).encode("utf-8"), digest_size=6).hexdigest()
+
+
+def user_etag(resource: str) -> Callable[[], Optional[str]]:
+    """Tag builder for a resource owned by `g.current_user`."""
+
+    def compute() -> Optional[str]:
+        version = data_version(g.current_user.id)
+        if version is None:
+            return None
+        g.data_version = version
+        return f"{resource}.{g.current_user.id}.{version}.{query_variant()}"
+
+    return compute
+
+
+def conditional(compute_etag: Callable[[], Optional[str]], cache_control: str = CACHE_CONTROL) -> Callable:
+    """Decorator answering a matching If-None-Match with 304 before the view runs.
+
+    Place it below `jwt_required` for per-user tags. Successful responses get
+    the tag and `cache_control` (by default `private, no-cache`, so clients
+    revalidate every time).
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            tag = compute_etag()
+            if tag is None:
+                return fn(*args, **kwargs)
+            if request.if_none_match.contains_weak(tag):
+                response = make_response("", 304)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag, weak=True)
+            response.headers["Cache-Control"] = cache_control
+            return response
+
+        return wrapper
+
+    return decorator
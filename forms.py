@@ -96,6 +96,8 @@ class ActivityForm(FlaskForm):
     # Expect HH:MM:SS for both
     duration = TimeField('Duration', format='%H:%M:%S', validators=[DataRequired()])
     time = TimeField('Time', format='%H:%M:%S', validators=[DataRequired()])
+    # Day the activity happened (YYYY-MM-DD); defaults to today
+    date = DateField('Date', validators=[Optional()])
     notes = TextAreaField('Notes', validators=[Optional()])
     complete = BooleanField('Complete', validators=[Optional()])
 
@@ -112,5 +114,6 @@ class ActivityUpdateForm(FlaskForm):
     distance = FloatField('Distance', validators=[Optional(), NumberRange(min=0)])
     duration = TimeField('Duration', format='%H:%M:%S', validators=[Optional()])
     time = TimeField('Time', format='%H:%M:%S', validators=[Optional()])
+    date = DateField('Date', validators=[Optional()])
     notes = TextAreaField('Notes', validators=[Optional()])
     complete = BooleanField('Complete', validators=[Optional()])
@@ -0,0 +1,163 @@
+"""Health endpoints backed by a background database prober.
+
+A daemon thread runs `SELECT 1` every `HEALTH_PROBE_INTERVAL` seconds and
+caches the outcome together with connection pool statistics, so load
+balancer polls never touch the database. The app factory runs the first probe
+synchronously before starting the thread, so a fresh worker answers its first
+poll with a real result instead of "unknown". Pre-forked workers restart the
+thread after fork.
+
+* `GET /health` returns the cached snapshot (`?deep=1` probes synchronously);
+* `GET /health/live` only reports that the process is serving requests;
+* `GET /health/ready` is 200 while the latest probe succeeded and is fresh.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from flask import jsonify, request
+from sqlalchemy import text
+
+
+def pool_stats(engine) -> Dict[str, Any]:
+    pool = engine.pool
+    stats = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            try:
+                stats[name] = fn()
+            except Exception:
+                pass
+    return stats
+
+
+class DatabaseProber:
+    """Periodically checks the database from a daemon thread."""
+
+    def __init__(self, interval: float = 5.0, stale_after: Optional[float] = None):
+        self.interval = interval
+        self.stale_after = stale_after
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._target = None  # (app, db) being probed
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def configure(self, interval: float, stale_after: Optional[float] = None) -> None:
+        self.interval = interval
+        self.stale_after = stale_after
+
+    @property
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        return self._snapshot
+
+    def probe(self, app, db) -> Dict[str, Any]:
+        """Run one check now and cache the result."""
+        started = time.perf_counter()
+        with app.app_context():
+            engine = db.engine
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                ok, error = True, None
+            except Exception as exc:
+                ok, error = False, type(exc).__name__
+            snapshot = {
+                "ok": ok,
+                "error": error,
+                "checked_at": time.time(),
+                "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+                "pool": pool_stats(engine),
+            }
+        self._snapshot = snapshot
+        return snapshot
+
+    def is_fresh(self, snapshot: Optional[Dict[str, Any]]) -> bool:
+        if snapshot is None:
+            return False
+        stale_after = self.stale_after or self.interval * 3
+        return time.time() - snapshot["checked_at"] <= stale_after
+
+    def start(self, app, db) -> Dict[str, Any]:
+        """Probe once now, then keep probing `app`'s database from a daemon thread.
+
+        Replaces the thread probing any earlier app. Returns the first snapshot.
+        """
+        snapshot = self.probe(app, db)
+        with self._lock:
+            self._stop.set()
+            self._target = (app, db)
+            self._spawn()
+        return snapshot
+
+    def _spawn(self) -> None:
+        self._stop = threading.Event()
+        app, db = self._target
+        self._thread = threading.Thread(
+            target=self._run, args=(app, db, self._stop), name="db-prober", daemon=True
+        )
+        self._thread.start()
+
+    def _after_fork(self) -> None:
+        # Threads do not survive fork, so pre-forked workers start their own
+        self._lock = threading.Lock()
+        if self._target is not None:
+            self._spawn()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, app, db, stop: threading.Event) -> None:
+        while not stop.wait(self.interval):
+            try:
+                self.probe(app, db)
+            except Exception:
+                app.logger.exception("Database probe failed")
+
+
+prober = DatabaseProber()
+
+
+def init_app(app, db, extra=None) -> None:
+    """Register the health endpoints; `extra()` adds fields to /health."""
+    prober.configure(
+        interval=app.config.get('HEALTH_PROBE_INTERVAL', 5.0),
+        stale_after=app.config.get('HEALTH_STALE_AFTER'),
+    )
+    prober.start(app, db)
+
+    @app.get('/health')
+    def health():
+        if request.args.get('deep', '').lower() in ('1', 'true', 'yes'):
+            snapshot = prober.probe(app, db)
+        else:
+            snapshot = prober.snapshot
+        db_ok = bool(snapshot and snapshot["ok"]) and prober.is_fresh(snapshot)
+        if snapshot is None:
+            db_status = "unknown"
+        elif not prober.is_fresh(snapshot):
+            db_status = "stale"
+        else:
+            db_status = "ok" if snapshot["ok"] else "unavailable"
+        payload = dict(
+            status="ok" if db_ok else "degraded",
+            db=db_status,
+            probe=snapshot,
+        )
+        if extra is not None:
+            payload.update(extra())
+        return jsonify(payload), 200 if db_ok else 503
+
+    @app.get('/health/live')
+    def health_live():
+        return jsonify(status="ok")
+
+    @app.get('/health/ready')
+    def health_ready():
+        snapshot = prober.snapshot
+        ready = bool(snapshot and snapshot["ok"]) and prober.is_fresh(snapshot)
+        return jsonify(status="ready" if ready else "not ready"), 200 if ready else 503
@@ -0,0 +1,375 @@
+"""Streaming CSV/GPX activity import.
+
+Files are parsed incrementally and inserted in fixed-size chunks. Each chunk
+is committed together with the progress counters on its `ActivityImport`
+row, so an interrupted import can resume by skipping the source rows that
+were already committed.
+
+CSV columns (header names are case-insensitive):
+  title, category, distance, duration, time, date, notes, complete
+`duration` accepts HH:MM:SS or a number of seconds; `time` accepts HH:MM:SS
+or an ISO-8601 datetime. `date` (YYYY-MM-DD) defaults to the date part of an
+ISO `time`, else to the import day.
+
+GPX: each <trk> becomes one activity. Distance (km) is summed from the track
+points, duration spans the first and last point timestamps, and the category
+comes from the track's <type> (falling back to `default_category`). A track
+with a point lacking lat/lon or with an unreadable <time> is skipped.
+"""
+import codecs
+import csv
+import math
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, IO, Iterator, Optional
+from xml.etree import ElementTree
+
+from sqlalchemy import insert
+
+from .category_registry import category_registry
+from .etags import bump_data_version
+from .models import db, Activity, ActivityImport
+from .rollups import RollupDelta
+
+
+FORMATS = ("csv", "gpx")
+TITLE_MAX = Activity.__table__.c.title.type.length
+
+
+class ImportRowError(ValueError):
+    """A single source row could not be mapped onto an Activity."""
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    ext = (filename or "").rsplit(".", 1)[-1].lower()
+    return ext if ext in FORMATS else None
+
+
+# Parsing
+
+def iter_csv_records(stream: IO[bytes]) -> Iterator[Dict[str, str]]:
+    text = codecs.getreader("utf-8-sig")(stream)
+    reader = csv.DictReader(text)
+    if reader.fieldnames:
+        reader.fieldnames = [(f or "").strip().lower() for f in reader.fieldnames]
+    for record in reader:
+        yield record
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _haversine_km(lat1, lon1, lat2, lon2) -> float:
+    r = 6371.0088
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * r * math.asin(math.sqrt(a))
+
+
+def _parse_iso(value: str) -> datetime:
+    return datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+
+
+def _add_point(record: Dict[str, object], point, prev):
+    """Fold a <trkpt> into its track's record; returns the point's (lat, lon)."""
+    try:
+        lat, lon = float(point.get("lat")), float(point.get("lon"))
+    except (TypeError, ValueError):
+        raise ImportRowError("track point without a valid lat/lon")
+    if prev is not None:
+        record["distance"] += _haversine_km(prev[0], prev[1], lat, lon)
+    for child in point:
+        if _local(child.tag) == "time" and child.text:
+            try:
+                stamp = _parse_iso(child.text)
+            except ValueError:
+                raise ImportRowError(f"invalid track point time {child.text.strip()!r}")
+            record["start"] = record["start"] or stamp
+            record["end"] = stamp
+    return lat, lon
+
+
+def iter_gpx_records(stream: IO[bytes]) -> Iterator[Dict[str, object]]:
+    """Yield one record per <trk>, dropping parsed elements as it goes.
+
+    A track with a bad point still yields a record (so resume offsets stay
+    aligned), carrying the problem in `error` for the mapper to reject.
+    """
+    root = segment = record = prev = None
+    for ev, elem in ElementTree.iterparse(stream, events=("start", "end")):
+        tag = _local(elem.tag)
+        if ev == "start":
+            if root is None:
+                root = elem
+            elif tag == "trk":
+                record = {
+                    "title": None, "category": None, "distance": 0.0, "start": None, "end": None, "error": None,
+                }
+                prev = None
+            elif tag == "trkseg":
+                segment = elem
+            continue
+        if record is None:
+            continue
+        if tag == "name" and record["title"] is None and elem.text:
+            record["title"] = elem.text.strip()
+        elif tag == "type" and elem.text:
+            record["category"] = elem.text.strip()
+        elif tag == "trkpt":
+            if record["error"] is None:
+                try:
+                    prev = _add_point(record, elem, prev)
+                except ImportRowError as exc:
+                    record["error"] = str(exc)
+            # Only finished points hang off the segment; drop them to bound memory
+            if segment is not None:
+                segment.clear()
+        elif tag == "trkseg":
+            segment = None
+        elif tag == "trk":
+            yield record
+            record = None
+            root.clear()
+
+
+# Mapping
+
+def _parse_duration(value) -> time:
+    value = str(value or "").strip()
+    if not value:
+        raise ImportRowError("duration is required")
+    try:
+        if ":" in value:
+            parts = [int(p) for p in value.split(":")]
+            while len(parts) < 3:
+                parts.insert(0, 0)
+            seconds = parts[0] * 3600 + parts[1] * 60 + parts[2]
+        else:
+            seconds = int(float(value))
+    except ValueError:
+        raise ImportRowError(f"invalid duration {value!r}")
+    return _seconds_to_time(seconds)
+
+
+def _seconds_to_time(seconds: int) -> time:
+    if seconds < 0 or seconds >= 86400:
+        raise ImportRowError("duration must be under 24 hours")
+    return (datetime.min + timedelta(seconds=seconds)).time()
+
+
+def _parse_time(value) -> time:
+    value = str(value or "").strip()
+    if not value:
+        raise ImportRowError("time is required")
+    try:
+        if "T" in value or "-" in value:
+            return _parse_iso(value).time().replace(microsecond=0, tzinfo=None)
+        return time.fromisoformat(value)
+    except ValueError:
+        raise ImportRowError(f"invalid time {value!r}")
+
+
+def _parse_date(value, time_value) -> date:
+    value = str(value or "").strip()
+    try:
+        if value:
+            return date.fromisoformat(value[:10])
+        time_value = str(time_value or "").strip()
+        if "T" in time_value or "-" in time_value:
+            return _parse_iso(time_value).date()
+    except ValueError:
+        raise ImportRowError(f"invalid date {value or time_value!r}")
+    return date.today()
+
+
+def _parse_bool(value) -> bool:
+    return str(value or "").strip().lower() in ("1", "true", "yes", "y")
+
+
+# Strava sport types that differ from our category names
+STRAVA_CATEGORIES = {
+    "Ride": "Bike",
+    "VirtualRide": "Bike",
+    "GravelRide": "Bike",
+    "MountainBikeRide": "Bike",
+    "EBikeRide": "Bike",
+    "EMountainBikeRide": "Bike",
+    "TrailRun": "Run",
+    "VirtualRun": "Run",
+    "WeightTraining": "Weight Training",
+}
+
+
+class RowMapper:
+    """Maps parsed records onto Activity column values for one user.
+
+    Categories are resolved once per distinct name.
+    """
+
+    def __init__(self, user_id: int, default_category: Optional[str] = None):
+        self.user_id = user_id
+        self.default_category = default_category
+        self._categories: Dict[str, Optional[int]] = {}
+
+    def category_id(self, name: Optional[str]) -> int:
+        name = (name or self.default_category or "").strip()
+        if not name:
+            raise ImportRowError("category is required")
+        key = name.casefold()
+        if key not in self._categories:
+            ref = category_registry.find(name)
+            self._categories[key] = ref.id if ref else None
+        if self._categories[key] is None:
+            raise ImportRowError(f"unknown category {name!r}")
+        return self._categories[key]
+
+    def from_csv(self, record: Dict[str, str]) -> dict:
+        title = (record.get("title") or "").strip()
+        if not title:
+            raise ImportRowError("title is required")
+        try:
+            distance = float(record.get("distance") or 0)
+        except ValueError:
+            raise ImportRowError(f"invalid distance {record.get('distance')!r}")
+        if distance < 0:
+            raise ImportRowError("distance must be at least 0")
+        return {
+            "title": title[:TITLE_MAX],
+            "category_id": self.category_id(record.get("category") or record.get("type")),
+            "distance": distance,
+            "duration": _parse_duration(record.get("duration")),
+            "time": _parse_time(record.get("time")),
+            "date": _parse_date(record.get("date"), record.get("time")),
+            "notes": (record.get("notes") or "").strip() or None,
+            "complete": _parse_bool(record.get("complete", "true")),
+            "user_id": self.user_id,
+        }
+
+    def from_gpx(self, record: Dict[str, object]) -> dict:
+        if record.get("error"):
+            raise ImportRowError(record["error"])
+        start, end = record["start"], record["end"]
+        if start is None:
+            raise ImportRowError("track has no timestamps")
+        try:
+            seconds = int((end - start).total_seconds())
+        except TypeError:
+            raise ImportRowError("track mixes timestamps with and without a UTC offset")
+        return {
+            "title": (record["title"] or "GPX import")[:TITLE_MAX],
+            "category_id": self.category_id(record["category"]),
+            "distance": round(record["distance"], 3),
+            "duration": _seconds_to_time(seconds),
+            "time": start.time().replace(microsecond=0, tzinfo=None),
+            "date": start.date(),
+            "notes": None,
+            "complete": True,
+            "user_id": self.user_id,
+        }
+
+    def from_strava(self, item: Dict[str, object]) -> dict:
+        """Map a Strava activity (summary or detailed representation)."""
+        sport = item.get("sport_type") or item.get("type") or ""
+        try:
+            category_id = self.category_id(STRAVA_CATEGORIES.get(sport, sport) or None)
+        except ImportRowError:
+            if not self.default_category:
+                raise
+            category_id = self.category_id(None)
+        start = item.get("start_date_local") or item.get("start_date")
+        if not start:
+            raise ImportRowError("activity has no start date")
+        start = _parse_iso(str(start))
+        return {
+            "title": (str(item.get("name") or "").strip() or "Strava activity")[:TITLE_MAX],
+            "category_id": category_id,
+            "distance": round(float(item.get("distance") or 0) / 1000, 3),
+            "duration": _seconds_to_time(int(item.get("moving_time") or item.get("elapsed_time") or 0)),
+            "time": start.time().replace(microsecond=0, tzinfo=None),
+            "date": start.date(),
+            "notes": (item.get("description") or "").strip() or None,
+            "complete": True,
+            "user_id": self.user_id,
+            "external_source": "strava",
+            "external_id": str(item["id"]),
+        }
+
+
+# Pipeline
+
+def start_import(user_id: int, fmt: str, filename: Optional[str] = None) -> ActivityImport:
+    job = ActivityImport(
+        user_id=user_id,
+        filename=filename,
+        format=fmt,
+        status="running",
+        rows_processed=0,
+        rows_imported=0,
+        rows_skipped=0,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def run_import(
+    job: ActivityImport,
+    stream: IO[bytes],
+    chunk_size: int = 1000,
+    default_category: Optional[str] = None,
+    on_chunk: Optional[Callable[[ActivityImport], None]] = None,
+) -> ActivityImport:
+    """Import `stream` into `job`'s user, resuming after `job.rows_processed`.
+
+    Each chunk of `chunk_size` source rows is inserted and committed together
+    with the job's counters. On failure the current chunk is rolled back, the
+    job is marked failed, and the exception propagates; calling again with
+    the same file resumes from the last committed chunk.
+    """
+    mapper = RowMapper(job.user_id, default_category)
+    if job.format == "csv":
+        records, to_values = iter_csv_records(stream), mapper.from_csv
+    else:
+        records, to_values = iter_gpx_records(stream), mapper.from_gpx
+
+    skip = job.rows_processed
+    job.status = "running"
+    job.error = None
+    rows = []
+    consumed = skipped = 0
+
+    def flush():
+        nonlocal rows, consumed, skipped
+        if rows:
+            db.session.execute(insert(Activity), rows)
+            RollupDelta().add_all(rows).apply()
+            bump_data_version(job.user_id)
+        job.rows_processed += consumed
+        job.rows_imported += len(rows)
+        job.rows_skipped += skipped
+        db.session.commit()
+        rows, consumed, skipped = [], 0, 0
+        if on_chunk:
+            on_chunk(job)
+
+    try:
+        for index, record in enumerate(records):
+            if index < skip:
+                continue
+            consumed += 1
+            try:
+                rows.append(to_values(record))
+            except ImportRowError:
+                skipped += 1
+            if consumed >= chunk_size:
+                flush()
+        job.status = "completed"
+        flush()
+    except Exception as exc:
+        db.session.rollback()
+        job.status = "failed"
+        job.error = str(exc)[:500]
+        db.session.commit()
+        raise
+    return job
@@ -0,0 +1,315 @@
+"""Weekly per-category distance leaderboards.
+
+`leaderboard_entries` holds each user's total distance and activity count
+per (category, week). Every activity write already reports its
+contribution to a `RollupDelta`, which passes it on to a `LeaderboardDelta`.
+That delta upserts the net change in the same transaction, so the table never
+needs a GROUP BY over `activities`. `rebuild_leaderboards` recomputes it for
+the CLI.
+
+Reads go through `leaderboards`, a process-wide cache of ranked boards. A
+board is loaded from the table once (one primary-key range scan, always on
+the primary, never the replica, and outside the cache's lock). After that
+it stays sorted by distance: this process's committed writes are applied in
+place. A user's rank is then a bisect (O(log n)) and the top N a slice. Writes
+made by other processes show up once the board's TTL lapses.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, delete, event, insert, or_, select
+from sqlalchemy.orm import Session
+
+from .db_routing import primary
+from .models import db, Activity, LeaderboardEntry
+
+
+BoardKey = Tuple[int, date]  # (category_id, week start)
+# (category_id, week start, user_id, distance delta, count delta)
+Change = Tuple[int, date, int, float, int]
+
+
+def week_start(day: Optional[date] = None) -> date:
+    """Monday of the week containing `day` (default: today)."""
+    day = day or date.today()
+    return day - timedelta(days=day.weekday())
+
+
+class LeaderboardDelta:
+    """Accumulates signed distance/count changes keyed by (category, week, user).
+
+    Undated activities (logged before activities had a date) are ignored.
+    """
+
+    def __init__(self):
+        self._totals: Dict[Tuple[int, date, int], List[float]] = defaultdict(lambda: [0.0, 0])
+
+    def add(self, user_id: int, category_id: int, day: Optional[date], distance: Optional[float], sign: int = 1):
+        if day is None:
+            return self
+        totals = self._totals[(category_id, week_start(day), user_id)]
+        totals[0] += sign * (distance or 0.0)
+        totals[1] += sign
+        return self
+
+    def rows(self) -> List[Dict]:
+        """Accumulated totals as leaderboard_entries column dicts."""
+        return [
+            dict(category_id=category_id, week_start=start, user_id=user_id,
+                 total_distance=distance, activity_count=count)
+            for (category_id, start, user_id), (distance, count) in self._totals.items()
+        ]
+
+    def apply(self) -> None:
+        """Upsert the accumulated deltas; loaded boards follow once the session commits."""
+        from .rollups import upsert_increment
+
+        table = LeaderboardEntry.__table__
+        changes: List[Change] = []
+        emptied = []
+        for (category_id, start, user_id), (distance, count) in self._totals.items():
+            if not count and not distance:
+                continue
+            key = dict(category_id=category_id, week_start=start, user_id=user_id)
+            upsert_increment(table, key, dict(total_distance=distance, activity_count=count))
+            if count < 0:
+                emptied.append(and_(*(table.c[name] == value for name, value in key.items())))
+            changes.append((category_id, start, user_id, distance, count))
+        if emptied:
+            # Users left without activities that week drop off the board
+            db.session.execute(
+                delete(table).where(table.c.activity_count <= 0, or_(*emptied))
+            )
+        self._totals.clear()
+        if changes:
+            info = db.session.info
+            info.setdefault("leaderboard_staged_at", leaderboards.clock())
+            info.setdefault("leaderboard_changes", []).extend(changes)
+
+
+class Standing(NamedTuple):
+    rank: int
+    user_id: int
+    total_distance: float
+    activity_count: int
+
+
+def _score(distance: float) -> float:
+    # Rounded so float noise from incremental sums cannot split ties
+    return -round(distance, 3)
+
+
+class Board:
+    """Users of one (category, week) ordered by total distance, highest first.
+
+    Ties share a rank (1, 2, 2, 4); within a tie users are ordered by id.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[int, float, int]], loaded_at: float):
+        self.loaded_at = loaded_at
+        self._totals: Dict[int, Tuple[float, int]] = {}
+        for user_id, distance, count in entries:
+            self._totals[user_id] = (distance, count)
+        self._keys: List[Tuple[float, int]] = sorted(
+            (_score(distance), user_id) for user_id, (distance, _) in self._totals.items()
+        )
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def apply(self, user_id: int, distance: float, count: int) -> None:
+        """Add a (signed) change to a user's totals, keeping the order."""
+        old = self._totals.pop(user_id, None)
+        if old is not None:
+            index = bisect_left(self._keys, (_score(old[0]), user_id))
+            del self._keys[index]
+        distance += old[0] if old else 0.0
+        count += old[1] if old else 0
+        if count > 0:
+            self._totals[user_id] = (distance, count)
+            insort(self._keys, (_score(distance), user_id))
+
+    def standing(self, user_id: int) -> Optional[Standing]:
+        totals = self._totals.get(user_id)
+        if totals is None:
+            return None
+        rank = bisect_left(self._keys, (_score(totals[0]), float("-inf"))) + 1
+        return Standing(rank, user_id, totals[0], totals[1])
+
+    def top(self, limit: int, offset: int = 0) -> List[Standing]:
+        keys = self._keys
+        if offset >= len(keys):
+            return []
+        score = keys[offset][0]
+        rank = bisect_left(keys, (score, float("-inf"))) + 1
+        result = []
+        for index in range(offset, min(offset + limit, len(keys))):
+            score, user_id = keys[index]
+            if index and keys[index - 1][0] != score:
+                rank = index + 1
+            distance, count = self._totals[user_id]
+            result.append(Standing(rank, user_id, distance, count))
+        return result
+
+
+class Leaderboards:
+    """Process-wide LRU of loaded boards (see the module docstring)."""
+
+    def __init__(self, ttl: float = 30.0, max_boards: int = 256, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_boards = max_boards
+        self.clock = clock
+        self._boards: "OrderedDict[BoardKey, Board]" = OrderedDict()
+        self._lock = threading.Lock()
+        # In-flight loads per key, and changes seen by the keys while they load
+        self._loading: Dict[BoardKey, int] = {}
+        self._versions: Dict[BoardKey, int] = {}
+
+    def configure(self, ttl: Optional[float] = None, max_boards: Optional[int] = None) -> None:
+        if ttl is not None:
+            self.ttl = ttl
+        if max_boards is not None:
+            self.max_boards = max_boards
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._boards.clear()
+            for key in self._loading:
+                self._changed(key)
+
+    def _load(self, key: BoardKey) -> Board:
+        category_id, start = key
+        started = self.clock()
+        # From the primary: a lagging replica's standings would stay cached for the TTL
+        with primary():
+            rows = db.session.execute(
+                select(LeaderboardEntry.user_id, LeaderboardEntry.total_distance, LeaderboardEntry.activity_count)
+                .where(LeaderboardEntry.category_id == category_id, LeaderboardEntry.week_start == start)
+            ).all()
+        return Board(rows, started)
+
+    def _get(self, key: BoardKey) -> Board:
+        """Board for `key`, loading it if absent or stale.
+
+        The query runs without the lock, so other boards stay readable
+        meanwhile. A change to `key` that commits while it runs bumps the
+        key's version; the loaded board is then served once but not cached,
+        as it may predate the change.
+        """
+        with self._lock:
+            board = self._boards.get(key)
+            if board is not None and self.clock() - board.loaded_at < self.ttl:
+                self._boards.move_to_end(key)
+                return board
+            self._loading[key] = self._loading.get(key, 0) + 1
+            version = self._versions.get(key, 0)
+        board = None
+        try:
+            board = self._load(key)
+        finally:
+            with self._lock:
+                changed = self._versions.get(key, 0) != version
+                self._loading[key] -= 1
+                if not self._loading[key]:
+                    del self._loading[key]
+                    self._versions.pop(key, None)
+                if board is not None and not changed:
+                    current = self._boards.get(key)
+                    if current is not None and current.loaded_at >= board.loaded_at:
+                        # A concurrent load of the same board finished with a newer one
+                        board = current
+                    self._boards[key] = board
+                    self._boards.move_to_end(key)
+                    while len(self._boards) > self.max_boards:
+                        self._boards.popitem(last=False)
+        return board
+
+    def _changed(self, key: BoardKey) -> None:
+        """Note a change to `key` for loads in flight; call with the lock held."""
+        if key in self._loading:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def top(self, category_id: int, start: date, limit: int = 10, offset: int = 0) -> Tuple[List[Standing], int]:
+        """(standings from `offset`, number of users on the board)."""
+        board = self._get((category_id, start))
+        with self._lock:
+            return board.top(limit, offset), len(board)
+
+    def standing(self, category_id: int, start: date, user_id: int) -> Tuple[Optional[Standing], int]:
+        """(the user's standing or None, number of users on the board)."""
+        board = self._get((category_id, start))
+        with self._lock:
+            return board.standing(user_id), len(board)
+
+    def apply_changes(self, changes: Iterable[Change], staged_at: float) -> None:
+        """Apply committed deltas to loaded boards; others load fresh later.
+
+        A board whose load began after the changes were staged may already
+        contain them, so it is dropped instead.
+        """
+        with self._lock:
+            for category_id, start, user_id, distance, count in changes:
+                key = (category_id, start)
+                self._changed(key)
+                board = self._boards.get(key)
+                if board is None:
+                    continue
+                if board.loaded_at < staged_at:
+                    board.apply(user_id, distance, count)
+                else:
+                    del self._boards[key]
+
+    def forget_user(self, user_id: int) -> None:
+        """Drop a deleted user from every loaded board."""
+        with self._lock:
+            for key in self._loading:
+                self._changed(key)
+            for board in self._boards.values():
+                standing = board.standing(user_id)
+                if standing is not None:
+                    board.apply(user_id, -standing.total_distance, -standing.activity_count)
+
+
+leaderboards = Leaderboards()
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_on_commit(session):
+    staged_at = session.info.pop("leaderboard_staged_at", None)
+    changes = session.info.pop("leaderboard_changes", None)
+    if changes:
+        leaderboards.apply_changes(changes, staged_at)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("leaderboard_staged_at", None)
+    session.info.pop("leaderboard_changes", None)
+
+
+def compute_leaderboards(chunk_size: int = 10000) -> LeaderboardDelta:
+    """Recompute every entry from `activities`, streaming the table."""
+    delta = LeaderboardDelta()
+    stmt = select(
+        Activity.user_id, Activity.category_id, Activity.date, Activity.distance,
+    ).where(Activity.date.is_not(None)).execution_options(yield_per=chunk_size)
+    for rows in db.session.execute(stmt).partitions():
+        for user_id, category_id, day, distance in rows:
+            delta.add(user_id, category_id, day, distance)
+    return delta
+
+
+def rebuild_leaderboards() -> int:
+    """Replace all entries with freshly computed totals; returns the row count."""
+    rows = compute_leaderboards().rows()
+    db.session.execute(delete(LeaderboardEntry))
+    if rows:
+        db.session.execute(insert(LeaderboardEntry), rows)
+    db.session.commit()
+    leaderboards.invalidate()
+    return len(rows)
@@ -0,0 +1,167 @@
+"""Per-endpoint request and SQL instrumentation, exported at /metrics.
+
+Request hooks time every request and record its status; SQLAlchemy engine
+events count the statements (and time spent in them) issued while the
+request runs. Aggregates are kept in process and rendered in the
+Prometheus text exposition format.
+
+Per-request bookkeeping is a handful of `perf_counter` calls and one locked
+dict update, so it is cheap enough to leave on in production.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import Response, abort, current_app, g, request
+from sqlalchemy import event
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# [query count, query seconds] for the request being handled in this context
+_request_sql: ContextVar[Optional[List[float]]] = ContextVar("request_sql", default=None)
+
+
+class _EndpointStats:
+    __slots__ = ("buckets", "count", "latency_sum", "statuses", "sql_queries", "sql_seconds")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.statuses: Dict[int, int] = {}
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+
+
+class Metrics:
+    """In-process registry of per-endpoint aggregates."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[Tuple[str, str], _EndpointStats] = {}
+        self._gauges: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def observe(self, endpoint: str, method: str, status: int, seconds: float, queries: int, sql_seconds: float):
+        with self._lock:
+            stats = self._endpoints.get((endpoint, method))
+            if stats is None:
+                stats = self._endpoints[(endpoint, method)] = _EndpointStats()
+            stats.buckets[bisect_left(BUCKETS, seconds)] += 1
+            stats.count += 1
+            stats.latency_sum += seconds
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.sql_queries += queries
+            stats.sql_seconds += sql_seconds
+
+    def register_gauges(self, prefix: str, collect: Callable[[], Dict[str, float]]) -> None:
+        """Export numeric values from `collect()` as `<prefix>_<key>` gauges."""
+        self._gauges[prefix] = collect
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by endpoint.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self._endpoints.items())
+            for (endpoint, method), s in items:
+                labels = f'endpoint="{endpoint}",method="{method}"'
+                cumulative = 0
+                for bound, n in zip(BUCKETS, s.buckets):
+                    cumulative += n
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {s.count}')
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {s.latency_sum:.6f}")
+                lines.append(f"http_request_duration_seconds_count{{{labels}}} {s.count}")
+
+            lines += ["# HELP http_requests_total Responses by endpoint and status.", "# TYPE http_requests_total counter"]
+            for (endpoint, method), s in items:
+                for status, n in sorted(s.statuses.items()):
+                    lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {n}')
+
+            lines += ["# HELP db_queries_total SQL statements issued while handling requests.", "# TYPE db_queries_total counter"]
+            for (endpoint, method), s in items:
+                lines.append(f'db_queries_total{{endpoint="{endpoint}",method="{method}"}} {s.sql_queries}')
+
+            lines += ["# HELP db_query_seconds_total Time spent in SQL while handling requests.", "# TYPE db_query_seconds_total counter"]
+            for (endpoint, method), s in items:
+                lines.append(f'db_query_seconds_total{{endpoint="{endpoint}",method="{method}"}} {s.sql_seconds:.6f}')
+
+        for prefix, collect in sorted(self._gauges.items()):
+            for key, value in sorted(collect().items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_sql.get() is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_sql.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - getattr(context, "_metrics_started", time.perf_counter())
+
+
+def instrument_engine(engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def init_app(app, db) -> None:
+    """Install request hooks, instrument `db`'s engines and add GET /metrics."""
+
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_engine(engine)
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        g._metrics_sql_token = _request_sql.set([0, 0.0])
+
+    @app.after_request
+    def _record(response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        token = g.pop('_metrics_sql_token', None)
+        sql = _request_sql.get() or [0, 0.0]
+        if token is not None:
+            _request_sql.reset(token)
+        metrics.observe(
+            request.endpoint or 'unmatched',
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            int(sql[0]),
+            sql[1],
+        )
+        return response
+
+    @app.get('/metrics')
+    def prometheus_metrics():
+        token = current_app.config.get('METRICS_TOKEN')
+        if not token:
+            if current_app.config.get('METRICS_REQUIRE_TOKEN'):
+                abort(404)
+        elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
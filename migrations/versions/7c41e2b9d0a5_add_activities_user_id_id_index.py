@@ -0,0 +1,23 @@
+"""add composite (user_id, id) index on activities
+
+Revision ID: 7c41e2b9d0a5
+Revises: 3de2f8d8a1a8
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7c41e2b9d0a5'
+down_revision = '3de2f8d8a1a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_activities_user_id_id', 'activities', ['user_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_activities_user_id_id', table_name='activities')
@@ -0,0 +1,39 @@
+"""add activities.date and leaderboard entries
+
+Revision ID: a2c7e9f4b356
+Revises: f3b9d5a8c417
+Create Date: 2026-10-18 19:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2c7e9f4b356'
+down_revision = 'f3b9d5a8c417'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nothing records when existing activities happened, so they stay undated
+    # (NULL) and are left off the leaderboards; the new table starts empty
+    op.add_column('activities', sa.Column('date', sa.Date(), nullable=True))
+    op.create_table('leaderboard_entries',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('week_start', sa.Date(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_distance', sa.Float(), nullable=False),
+    sa.Column('activity_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['activity_categories.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('category_id', 'week_start', 'user_id')
+    )
+    op.create_index('ix_leaderboard_entries_user_id', 'leaderboard_entries', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_leaderboard_entries_user_id', table_name='leaderboard_entries')
+    op.drop_table('leaderboard_entries')
+    op.drop_column('activities', 'date')
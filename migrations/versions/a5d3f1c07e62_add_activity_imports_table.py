@@ -0,0 +1,40 @@
+"""add activity imports table
+
+Revision ID: a5d3f1c07e62
+Revises: 7c41e2b9d0a5
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5d3f1c07e62'
+down_revision = '7c41e2b9d0a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('activity_imports',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.Text(), nullable=True),
+    sa.Column('format', sa.String(length=10), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('rows_processed', sa.Integer(), nullable=False),
+    sa.Column('rows_imported', sa.Integer(), nullable=False),
+    sa.Column('rows_skipped', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_activity_imports_user_id', 'activity_imports', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_activity_imports_user_id', table_name='activity_imports')
+    op.drop_table('activity_imports')
@@ -0,0 +1,33 @@
+"""index activity search by (user_id, search_vector)
+
+Revision ID: b6f1d3a8c725
+Revises: a2c7e9f4b356
+Create Date: 2026-10-18 21:40:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f1d3a8c725'
+down_revision = 'a2c7e9f4b356'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # btree_gin lets one GIN index hold the user id next to the lexemes, so a
+    # search intersects the user's entries with the term's instead of reading
+    # every user's matches and filtering them
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.execute("CREATE INDEX ix_activities_user_search ON activities USING GIN (user_id, search_vector)")
+    op.drop_index('ix_activities_search_vector', table_name='activities')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("CREATE INDEX ix_activities_search_vector ON activities USING GIN (search_vector)")
+    op.drop_index('ix_activities_user_search', table_name='activities')
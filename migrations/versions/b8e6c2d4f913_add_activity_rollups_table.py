@@ -0,0 +1,49 @@
+"""add activity rollups table
+
+Revision ID: b8e6c2d4f913
+Revises: a5d3f1c07e62
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e6c2d4f913'
+down_revision = 'a5d3f1c07e62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('activity_rollups',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('activity_count', sa.Integer(), nullable=False),
+    sa.Column('complete_count', sa.Integer(), nullable=False),
+    sa.Column('total_distance', sa.Float(), nullable=False),
+    sa.Column('total_duration_seconds', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['category_id'], ['activity_categories.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'category_id')
+    )
+    # Populate from existing history; afterwards handlers maintain it incrementally
+    op.execute(
+        """
+        INSERT INTO activity_rollups
+            (user_id, category_id, activity_count, complete_count, total_distance, total_duration_seconds)
+        SELECT user_id,
+               category_id,
+               COUNT(*),
+               SUM(CASE WHEN complete THEN 1 ELSE 0 END),
+               COALESCE(SUM(distance), 0),
+               COALESCE(SUM(EXTRACT(EPOCH FROM duration)), 0)::bigint
+        FROM activities
+        GROUP BY user_id, category_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_table('activity_rollups')
@@ -0,0 +1,24 @@
+"""add users.data_version
+
+Revision ID: c4a9e7d2b158
+Revises: b8e6c2d4f913
+Create Date: 2026-10-18 13:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a9e7d2b158'
+down_revision = 'b8e6c2d4f913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('users', 'data_version')
@@ -0,0 +1,77 @@
+"""add full-text search index on activity titles and notes
+
+Revision ID: d7e2a4c1f839
+Revises: c4a9e7d2b158
+Create Date: 2026-10-18 14:30:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e2a4c1f839'
+down_revision = 'c4a9e7d2b158'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Generated column: Postgres keeps it current on every insert/update
+        op.execute(
+            """
+            ALTER TABLE activities ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(notes, '')), 'B')
+            ) STORED
+            """
+        )
+        op.execute("CREATE INDEX ix_activities_search_vector ON activities USING GIN (search_vector)")
+    elif dialect == 'sqlite':
+        op.execute(
+            """
+            CREATE VIRTUAL TABLE activities_fts USING fts5(
+                title, notes, content='activities', content_rowid='id', tokenize='porter unicode61'
+            )
+            """
+        )
+        op.execute(
+            """
+            CREATE TRIGGER activities_fts_insert AFTER INSERT ON activities BEGIN
+                INSERT INTO activities_fts(rowid, title, notes) VALUES (new.id, new.title, new.notes);
+            END
+            """
+        )
+        op.execute(
+            """
+            CREATE TRIGGER activities_fts_delete AFTER DELETE ON activities BEGIN
+                INSERT INTO activities_fts(activities_fts, rowid, title, notes)
+                VALUES ('delete', old.id, old.title, old.notes);
+            END
+            """
+        )
+        op.execute(
+            """
+            CREATE TRIGGER activities_fts_update AFTER UPDATE OF title, notes ON activities BEGIN
+                INSERT INTO activities_fts(activities_fts, rowid, title, notes)
+                VALUES ('delete', old.id, old.title, old.notes);
+                INSERT INTO activities_fts(rowid, title, notes) VALUES (new.id, new.title, new.notes);
+            END
+            """
+        )
+        # Index existing rows
+        op.execute("INSERT INTO activities_fts(activities_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_activities_search_vector', table_name='activities')
+        op.drop_column('activities', 'search_vector')
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS activities_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS activities_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS activities_fts_insert")
+        op.execute("DROP TABLE IF EXISTS activities_fts")
@@ -0,0 +1,24 @@
+"""add users.token_generation
+
+Revision ID: e1f8b3c6a274
+Revises: d7e2a4c1f839
+Create Date: 2026-10-18 15:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f8b3c6a274'
+down_revision = 'd7e2a4c1f839'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('token_generation', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('users', 'token_generation')
@@ -0,0 +1,49 @@
+"""add provider connections and activities external ids
+
+Revision ID: f3b9d5a8c417
+Revises: e1f8b3c6a274
+Create Date: 2026-10-18 17:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b9d5a8c417'
+down_revision = 'e1f8b3c6a274'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('provider_connections',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('provider', sa.String(length=20), nullable=False),
+    sa.Column('athlete_id', sa.String(length=64), nullable=True),
+    sa.Column('access_token', sa.Text(), nullable=False),
+    sa.Column('refresh_token', sa.Text(), nullable=True),
+    sa.Column('expires_at', sa.BigInteger(), nullable=True),
+    sa.Column('synced_until', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('last_synced_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'provider', name='uq_provider_connections_user_id_provider')
+    )
+    op.add_column('activities', sa.Column('external_source', sa.String(length=20), nullable=True))
+    op.add_column('activities', sa.Column('external_id', sa.String(length=64), nullable=True))
+    # A unique index rather than a constraint: SQLite can add it without
+    # rebuilding the table (which would drop the search triggers)
+    op.create_index(
+        'uq_activities_user_id_external', 'activities',
+        ['user_id', 'external_source', 'external_id'], unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index('uq_activities_user_id_external', table_name='activities')
+    op.drop_column('activities', 'external_id')
+    op.drop_column('activities', 'external_source')
+    op.drop_table('provider_connections')
@@ -3,8 +3,16 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from flask_bcrypt import Bcrypt
 
+from .db_routing import RoutingSession
+from .passwords import password_hasher
+from .serializers import (
+    user_serializer,
+    category_serializer,
+    password_change_log_serializer,
+)
+
 bcrypt = Bcrypt()
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
 class User(UserMixin, db.Model):
@@ -44,19 +52,26 @@ class User(UserMixin, db.Model):
 
     benchmarks = db.Column(db.JSON, nullable=True)
 
+    # Bumped by every write to the user's profile or activities; used for ETags
+    data_version = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
+
+    # Tokens carrying an older generation are rejected (see auth.revoke_tokens)
+    token_generation = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
+
     def serialize(self):
         """Serialize to dictionary"""
 
-        return {
-            "id": self.id,
-            "email": self.email,
-            "first_name": self.first_name,
-            "last_name": self.last_name,
-            "birthday": self.birthday.isoformat() if self.birthday else None,
-            "weight": self.weight,
-            "gender": self.gender,
-            "benchmarks": self.benchmarks,
-        }
+        return user_serializer.one(self)
 
     @classmethod
     def signup(
@@ -74,7 +89,7 @@ class User(UserMixin, db.Model):
 
         Hashes password and adds user to system.
         """
-        hashed_pwd = bcrypt.generate_password_hash(password).decode("UTF-8")
+        hashed_pwd = password_hasher.hash(password)
         user = User(
             email=email,
             password=hashed_pwd,
@@ -102,7 +117,7 @@ class User(UserMixin, db.Model):
 
         user = cls.query.filter_by(email=email).one_or_none()
 
-        if user and bcrypt.check_password_hash(user.password, password):
+        if user and password_hasher.check(user.password, password):
             return user
 
         return False
@@ -113,6 +128,16 @@ class Activity(db.Model):
     """An individual activity for a user"""
 
     __tablename__ = "activities"
+    __table_args__ = (
+        # Serves keyset pagination of a user's history (newest first)
+        db.Index("ix_activities_user_id_id", "user_id", "id"),
+        # One row per synced provider activity; NULLs (manual entries) never collide
+        db.Index(
+            "uq_activities_user_id_external",
+            "user_id", "external_source", "external_id",
+            unique=True,
+        ),
+    )
 
     id = db.Column(
         db.Integer,
@@ -139,6 +164,10 @@ class Activity(db.Model):
 
     time = db.Column(db.Time, nullable=False)
 
+    # Day the activity took place; weekly leaderboards group by it. Activities
+    # logged before the column existed have no date and are left off the boards.
+    date = db.Column(db.Date, nullable=True)
+
     complete = db.Column(db.Boolean, nullable=False)
 
     user = db.relationship('User', backref=db.backref('activities', lazy=True, cascade='all, delete-orphan'))
@@ -152,6 +181,10 @@ class Activity(db.Model):
     )
     category = db.relationship('ActivityCategory', backref=db.backref('activities', lazy=True))
 
+    # Set for activities pulled from a provider (e.g. "strava" and its activity id)
+    external_source = db.Column(db.String(20), nullable=True)
+    external_id = db.Column(db.String(64), nullable=True)
+
 
 class PasswordChangeLog(db.Model):
     """Audit log for password change attempts."""
@@ -174,15 +207,122 @@ class PasswordChangeLog(db.Model):
     def serialize(self):
         """Serialize to dictionary for audit viewing."""
 
+        return password_change_log_serializer.one(self)
+
+
+class ActivityRollup(db.Model):
+    """Running per-user, per-category activity totals (see rollups.py)."""
+
+    __tablename__ = "activity_rollups"
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    category_id = db.Column(
+        db.Integer,
+        db.ForeignKey("activity_categories.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    activity_count = db.Column(db.Integer, nullable=False, default=0)
+    complete_count = db.Column(db.Integer, nullable=False, default=0)
+    total_distance = db.Column(db.Float, nullable=False, default=0.0)
+    total_duration_seconds = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class LeaderboardEntry(db.Model):
+    """A user's total for one category and week (see leaderboards.py)."""
+
+    __tablename__ = "leaderboard_entries"
+
+    category_id = db.Column(
+        db.Integer,
+        db.ForeignKey("activity_categories.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # Monday of the week
+    week_start = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+    total_distance = db.Column(db.Float, nullable=False, default=0.0)
+    activity_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ActivityImport(db.Model):
+    """Progress of a file import; lets an interrupted import resume."""
+
+    __tablename__ = "activity_imports"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    filename = db.Column(db.Text, nullable=True)
+    format = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="running")
+    # Source rows consumed and committed so far; a resume skips this many
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    rows_imported = db.Column(db.Integer, nullable=False, default=0)
+    rows_skipped = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now(), onupdate=db.func.now())
+
+    user = db.relationship('User', backref=db.backref('activity_imports', lazy=True, cascade='all, delete-orphan'))
+
+    def serialize(self):
+        """Serialize to dictionary"""
+
         return {
             "id": self.id,
-            "user_id": self.user_id,
-            "ip": self.ip,
+            "filename": self.filename,
+            "format": self.format,
+            "status": self.status,
+            "rows_processed": self.rows_processed,
+            "rows_imported": self.rows_imported,
+            "rows_skipped": self.rows_skipped,
+            "error": self.error,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "success": self.success,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
 
 
+class ProviderConnection(db.Model):
+    """A user's linked provider account and its sync position (see strava.py)."""
+
+    __tablename__ = "provider_connections"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "provider", name="uq_provider_connections_user_id_provider"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    provider = db.Column(db.String(20), nullable=False)
+    athlete_id = db.Column(db.String(64), nullable=True)
+    access_token = db.Column(db.Text, nullable=False)
+    refresh_token = db.Column(db.Text, nullable=True)
+    # Epoch seconds at which access_token expires
+    expires_at = db.Column(db.BigInteger, nullable=True)
+    # High-water mark: epoch start time of the newest activity synced so far
+    synced_until = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    last_synced_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+
+    user = db.relationship('User', backref=db.backref('provider_connections', lazy=True, cascade='all, delete-orphan'))
+
+
 def connect_db(app):
     """Connect this database to provided Flask app.
 
@@ -202,4 +342,4 @@ class ActivityCategory(db.Model):
     name = db.Column(db.String(50), nullable=False, unique=True, index=True)
 
     def serialize(self):
-        return {"id": self.id, "name": self.name}
+        return category_serializer.one(self)
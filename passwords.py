@@ -0,0 +1,152 @@
+"""Password hashing routed through a bounded worker pool.
+
+bcrypt is deliberately slow, so running it on request threads lets a burst
+of logins stall every worker. `password_hasher` runs it in a small process
+pool instead and caps in-flight work: once `max_pending` operations are
+queued or running, new requests fail fast with `PasswordPoolSaturated`
+(answered as 503) instead of piling up. A pool whose worker died is
+replaced on the next call; the call that found it broken gets a 503 too.
+
+This module only imports bcrypt so pool workers start cheaply.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import NoReturn, Optional
+
+import bcrypt
+
+
+class PasswordPoolSaturated(Exception):
+    """Raised when the hashing pool is full, broken, or an operation timed out."""
+
+    retry_after = 1
+
+
+def _hash(password: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def _check(pw_hash: bytes, password: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(password, pw_hash)
+    except ValueError:
+        # Malformed stored hash
+        return False
+
+
+def _to_bytes(value) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+class PasswordHasher:
+    """Hash/check passwords inline (workers=0) or in a process pool.
+
+    Either way at most `max_pending` operations are admitted at once.
+    """
+
+    def __init__(self, workers: int = 0, max_pending: int = 16, timeout: float = 5.0, rounds: int = 12):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.configure(workers=workers, max_pending=max_pending, timeout=timeout, rounds=rounds)
+
+    def configure(
+        self,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        timeout: Optional[float] = None,
+        rounds: Optional[int] = None,
+    ) -> None:
+        self.shutdown()
+        if workers is not None:
+            self.workers = workers
+        if max_pending is not None:
+            self.max_pending = max_pending
+        if timeout is not None:
+            self.timeout = timeout
+        if rounds is not None:
+            self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created lazily and per process, so pre-forking servers get their own pool
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                    self._pid = pid
+        return self._executor
+
+    def _run(self, fn, *args):
+        # configure() may swap in a new semaphore while this call is in
+        # flight; the slot goes back to the one it was taken from
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PasswordPoolSaturated("Password service is busy, try again shortly")
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                slots.release()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            slots.release()
+            self._broken(executor)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            self.rejected += 1
+            raise PasswordPoolSaturated("Password service timed out, try again shortly")
+        except BrokenProcessPool:
+            self._broken(executor)
+
+    def _broken(self, executor: ProcessPoolExecutor) -> NoReturn:
+        # A worker died (e.g. OOM-killed) and every later submit to this pool
+        # would fail too: drop it so the next call starts a fresh one
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.rejected += 1
+        raise PasswordPoolSaturated("Password service restarted, try again shortly")
+
+    def hash(self, password) -> str:
+        """Return a bcrypt hash (utf-8 str) of `password`."""
+        return self._run(_hash, _to_bytes(password), self.rounds)
+
+    def check(self, pw_hash, password) -> bool:
+        """Return True if `password` matches the stored bcrypt `pw_hash`."""
+        if not pw_hash or password is None:
+            return False
+        return self._run(_check, _to_bytes(pw_hash), _to_bytes(password))
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher()
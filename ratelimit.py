@@ -0,0 +1,166 @@
+"""Sliding-window rate limiting with pluggable storage.
+
+`limiter` is the process-wide instance used by `auth.rate_limit`. The memory
+backend keeps per-key timestamp logs in this process; the SQLite backend
+stores them in a local file so several workers on one host share limits.
+Neither touches the application database.
+
+Both backends check and record a hit in one step (under a lock, or in one
+SQLite write transaction), so concurrent requests cannot overshoot a limit.
+A recorded hit can be refunded afterwards, which is how `auth.rate_limit`
+counts only some outcomes (e.g. failed logins).
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, NamedTuple, Optional
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float
+    # Timestamp of the hit this call recorded (None if nothing was recorded)
+    stamp: Optional[float] = None
+
+
+class MemoryBackend:
+    """Per-key sliding-window logs held in this process."""
+
+    def __init__(self, clock: Callable[[], float] = time.time, sweep_every: int = 1000):
+        self._clock = clock
+        self._logs: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self._sweep_every = sweep_every
+        self._ops = 0
+
+    def _window(self, key: str, period: float, now: float) -> Deque[float]:
+        log = self._logs.get(key)
+        if log is None:
+            log = self._logs[key] = deque()
+        cutoff = now - period
+        while log and log[0] <= cutoff:
+            log.popleft()
+        return log
+
+    def _sweep(self, now: float, period: float) -> None:
+        self._ops += 1
+        if self._ops % self._sweep_every:
+            return
+        for key in [k for k, log in self._logs.items() if not log or log[-1] <= now - period]:
+            del self._logs[key]
+
+    def hit(self, key: str, limit: int, period: float, record: bool = True) -> RateLimitResult:
+        now = self._clock()
+        with self._lock:
+            log = self._window(key, period, now)
+            if len(log) >= limit:
+                return RateLimitResult(False, 0, log[0] + period - now)
+            if record:
+                log.append(now)
+            self._sweep(now, period)
+            return RateLimitResult(True, limit - len(log), 0.0, now if record else None)
+
+    def refund(self, key: str, stamp: float) -> None:
+        with self._lock:
+            log = self._logs.get(key)
+            if log is not None and stamp in log:
+                log.remove(stamp)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._logs.clear()
+
+
+class SQLiteBackend:
+    """Sliding-window logs in a local SQLite file shared by all workers on a host."""
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self._clock = clock
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS hits (key TEXT NOT NULL, ts REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_hits_key_ts ON hits (key, ts)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit(self, key: str, limit: int, period: float, record: bool = True) -> RateLimitResult:
+        now = self._clock()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM hits WHERE key = ? AND ts <= ?", (key, now - period))
+            count, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(ts) FROM hits WHERE key = ?", (key,)
+            ).fetchone()
+            if count >= limit:
+                result = RateLimitResult(False, 0, oldest + period - now)
+            else:
+                if record:
+                    conn.execute("INSERT INTO hits (key, ts) VALUES (?, ?)", (key, now))
+                    count += 1
+                result = RateLimitResult(True, limit - count, 0.0, now if record else None)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def refund(self, key: str, stamp: float) -> None:
+        self._connect().execute(
+            "DELETE FROM hits WHERE rowid = (SELECT rowid FROM hits WHERE key = ? AND ts = ? LIMIT 1)",
+            (key, stamp),
+        )
+
+    def reset(self) -> None:
+        self._connect().execute("DELETE FROM hits")
+
+
+class RateLimiter:
+    """Front end over a backend; `enabled=False` lets every request through."""
+
+    def __init__(self, backend=None, enabled: bool = True):
+        self.backend = backend or MemoryBackend()
+        self.enabled = enabled
+
+    def configure(self, backend: str = "memory", sqlite_path: str = None, enabled: bool = True) -> None:
+        if backend == "sqlite":
+            if not sqlite_path:
+                raise ValueError("RATELIMIT_SQLITE_PATH is required for the sqlite backend")
+            self.backend = SQLiteBackend(sqlite_path)
+        elif backend == "memory":
+            self.backend = MemoryBackend()
+        else:
+            raise ValueError(f"Unknown rate limit backend {backend!r}")
+        self.enabled = enabled
+
+    def hit(self, key: str, limit: int, period: float) -> RateLimitResult:
+        """Consume one unit for `key` if the window allows it."""
+        if not self.enabled:
+            return RateLimitResult(True, limit, 0.0)
+        return self.backend.hit(key, limit, period, record=True)
+
+    def refund(self, key: str, result: RateLimitResult) -> None:
+        """Give back the hit `result` recorded, as if the request had not counted."""
+        if self.enabled and result.stamp is not None:
+            self.backend.refund(key, result.stamp)
+
+    def peek(self, key: str, limit: int, period: float) -> RateLimitResult:
+        """Report whether `key` is within its limit without consuming anything."""
+        if not self.enabled:
+            return RateLimitResult(True, limit, 0.0)
+        return self.backend.hit(key, limit, period, record=False)
+
+
+limiter = RateLimiter()
@@ -0,0 +1,145 @@
+"""Incremental per-user, per-category activity totals.
+
+Write handlers collect the contribution of each activity they create, change
+or delete and apply the net delta with one upsert per (user, category) in the
+same transaction. The same contributions feed the weekly leaderboards (see
+leaderboards.py). `compute_rollups` rebuilds the totals from `activities`
+for the rebuild/drift-check CLI commands.
+"""
+from collections import defaultdict
+from collections.abc import Mapping
+from datetime import time
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, update
+
+from .leaderboards import LeaderboardDelta
+from .models import db, Activity, ActivityRollup
+
+
+Key = Tuple[int, int]  # (user_id, category_id)
+FIELDS = ("activity_count", "complete_count", "total_distance", "total_duration_seconds")
+
+
+def duration_seconds(value: Optional[time]) -> int:
+    if value is None:
+        return 0
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+class RollupDelta:
+    """Accumulates signed contributions keyed by (user_id, category_id)."""
+
+    def __init__(self):
+        self._totals: Dict[Key, List[float]] = defaultdict(lambda: [0, 0, 0.0, 0])
+        self.leaderboard = LeaderboardDelta()
+
+    def add(self, activity, sign: int = 1) -> "RollupDelta":
+        """Add (sign=1) or remove (sign=-1) an Activity, row, or column dict."""
+        get = activity.get if isinstance(activity, Mapping) else partial(getattr, activity)
+        totals = self._totals[(get("user_id"), get("category_id"))]
+        totals[0] += sign
+        totals[1] += sign if get("complete") else 0
+        totals[2] += sign * (get("distance") or 0.0)
+        totals[3] += sign * duration_seconds(get("duration"))
+        self.leaderboard.add(get("user_id"), get("category_id"), get("date"), get("distance"), sign)
+        return self
+
+    def add_all(self, activities: Iterable, sign: int = 1) -> "RollupDelta":
+        for activity in activities:
+            self.add(activity, sign)
+        return self
+
+    def rows(self) -> List[Dict]:
+        """Accumulated totals as activity_rollups column dicts."""
+        return [
+            dict(user_id=user_id, category_id=category_id, **dict(zip(FIELDS, totals)))
+            for (user_id, category_id), totals in self._totals.items()
+        ]
+
+    def apply(self) -> None:
+        """Upsert the accumulated deltas (rollups and leaderboards) in the current session."""
+        table = ActivityRollup.__table__
+        for (user_id, category_id), totals in self._totals.items():
+            if not any(totals):
+                continue
+            upsert_increment(table, dict(user_id=user_id, category_id=category_id), dict(zip(FIELDS, totals)))
+        self._totals.clear()
+        self.leaderboard.apply()
+
+
+def upsert_increment(table, key: Dict[str, object], values: Dict[str, float]) -> None:
+    """Add `values` to the row of `table` whose primary key is `key`, creating it if needed."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table).values(**key, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[name] for name in key],
+            set_={name: table.c[name] + stmt.excluded[name] for name in values},
+        )
+        db.session.execute(stmt)
+        return
+
+    result = db.session.execute(
+        update(table)
+        .where(*(table.c[name] == value for name, value in key.items()))
+        .values({name: table.c[name] + value for name, value in values.items()})
+    )
+    if result.rowcount == 0:
+        db.session.execute(insert(table).values(**key, **values))
+
+
+def compute_rollups(chunk_size: int = 10000) -> Dict[Key, Tuple]:
+    """Recompute every rollup from `activities`, streaming the table."""
+    delta = RollupDelta()
+    stmt = select(
+        Activity.user_id,
+        Activity.category_id,
+        Activity.complete,
+        Activity.distance,
+        Activity.duration,
+        Activity.date,
+    ).execution_options(yield_per=chunk_size)
+    for rows in db.session.execute(stmt).partitions():
+        delta.add_all(rows)
+    return {key: tuple(totals) for key, totals in delta._totals.items()}
+
+
+def stored_rollups() -> Dict[Key, Tuple]:
+    rows = db.session.execute(select(ActivityRollup)).scalars()
+    return {
+        (r.user_id, r.category_id): tuple(getattr(r, name) for name in FIELDS)
+        for r in rows
+    }
+
+
+def find_drift(tolerance: float = 1e-6) -> List[Tuple[Key, Optional[Tuple], Optional[Tuple]]]:
+    """Return (key, stored, expected) for every rollup that disagrees with the source rows."""
+    expected = compute_rollups()
+    stored = stored_rollups()
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        want = expected.get(key, (0, 0, 0.0, 0))
+        have = stored.get(key, (0, 0, 0.0, 0))
+        if any(abs((h or 0) - (w or 0)) > tolerance for h, w in zip(have, want)):
+            drift.append((key, stored.get(key), expected.get(key)))
+    return drift
+
+
+def rebuild_rollups() -> int:
+    """Replace all rollups with freshly computed totals; returns the row count."""
+    expected = compute_rollups()
+    db.session.execute(delete(ActivityRollup))
+    rows = [
+        dict(user_id=user_id, category_id=category_id, **dict(zip(FIELDS, totals)))
+        for (user_id, category_id), totals in expected.items()
+    ]
+    if rows:
+        db.session.execute(insert(ActivityRollup), rows)
+    db.session.commit()
+    return len(rows)
@@ -1,132 +1,412 @@
-from flask import Blueprint, request, jsonify, g
-from sqlalchemy import func
+import base64
+import binascii
+import csv
+import io
+from datetime import date
+from typing import Optional, Tuple
+
+from flask import Blueprint, Response, current_app, request, jsonify, g, stream_with_context
+from sqlalchemy import insert, select
 
 from ..auth import jwt_required, json_form_required
+from ..category_registry import category_registry, CategoryRef
+from ..db_routing import read_only
+from ..etags import bump_data_version, conditional, user_etag
 from ..forms import ActivityForm, ActivityUpdateForm
-from ..models import db, Activity, ActivityCategory
+from ..schemas import activity_schema
+from ..models import db, Activity, ActivityCategory, ActivityImport, ActivityRollup
+from ..rollups import RollupDelta
+from ..search import search_activities
+from ..serializers import activity_serializer, dumps, json_response
 
 
 bp = Blueprint('activities', __name__)
 
 
+def _activity_rows():
+    """SELECT of activity columns plus the category name, for row serialization."""
+    return (
+        select(
+            Activity.id,
+            Activity.title,
+            Activity.category_id,
+            ActivityCategory.name.label('category'),
+            Activity.distance,
+            Activity.duration,
+            Activity.notes,
+            Activity.user_id,
+            Activity.time,
+            Activity.date,
+            Activity.complete,
+        )
+        .join(ActivityCategory, Activity.category_id == ActivityCategory.id)
+    )
+
+
+def _resolve_category(category_id, name) -> Tuple[Optional[CategoryRef], Optional[str]]:
+    """Resolve a category by id or (case-insensitive) name; returns (ref, error)."""
+    if category_id:
+        ref = category_registry.get(category_id)
+    elif name:
+        ref = category_registry.find(name)
+    else:
+        return None, 'category_id or category is required'
+    if not ref:
+        return None, 'Category not found'
+    return ref, None
+
+
+def _activity_values(data, user_id: int, category_id: int) -> dict:
+    """Column values for a new activity from a validated `activity_schema` record."""
+    return {
+        "title": data.title,
+        "distance": data.distance,
+        "duration": data.duration,
+        "notes": data.notes or None,
+        "user_id": user_id,
+        "time": data.time,
+        "date": data.date or date.today(),
+        "complete": data.complete,
+        "category_id": category_id,
+    }
+
+
+def _encode_cursor(activity_id: int) -> str:
+    """Opaque cursor pointing just past `activity_id` in newest-first order."""
+    return base64.urlsafe_b64encode(f"v1:{activity_id}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Optional[int]:
+    """Return the activity id encoded in `cursor`, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        version, _, value = raw.partition(":")
+        if version != "v1":
+            return None
+        return int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
 @bp.post('/me/activities')
 @jwt_required
 @json_form_required(ActivityForm)
 def log_activity():
     user = g.current_user
-    form = g.form
+    data = g.data
 
     # Resolve category via id or name
-    cat_obj = None
-    if form.category_id.data:
-        cat_obj = ActivityCategory.query.get(form.category_id.data)
-        if not cat_obj:
-            return jsonify(message='Category not found'), 400
-    elif form.category.data:
-        name = form.category.data.strip()
-        cat_obj = ActivityCategory.query.filter(func.lower(ActivityCategory.name) == name.lower()).one_or_none()
-        if not cat_obj:
-            return jsonify(message='Category not found'), 400
-    else:
-        return jsonify(message='category_id or category is required'), 400
-
-    activity = Activity(
-        title=form.title.data,
-        distance=form.distance.data,
-        duration=form.duration.data,
-        notes=form.notes.data or None,
-        user_id=user.id,
-        time=form.time.data,
-        complete=bool(form.complete.data),
-        category_id=cat_obj.id,
-    )
+    cat_obj, error = _resolve_category(data.category_id, data.category)
+    if error:
+        return jsonify(message=error), 400
+
+    activity = Activity(**_activity_values(data, user.id, cat_obj.id))
 
     db.session.add(activity)
+    RollupDelta().add(activity).apply()
+    bump_data_version(user.id)
     db.session.commit()
 
-    payload = {
-        "id": activity.id,
-        "title": activity.title,
-        "category_id": activity.category_id,
-        "category": activity.category.name if activity.category else None,
-        "distance": activity.distance,
-        "duration": activity.duration.isoformat() if activity.duration else None,
-        "notes": activity.notes,
-        "user_id": activity.user_id,
-        "time": activity.time.isoformat() if activity.time else None,
-        "complete": activity.complete,
-    }
+    return json_response(activity=activity_serializer.one(activity, category=cat_obj.name), status=201)
+
 
-    return jsonify(activity=payload), 201
+@bp.post('/me/activities/batch')
+@jwt_required
+def log_activities_batch():
+    """Create many activities in one transaction.
+
+    Body: {"activities": [...], "atomic": false}. Each item is validated with
+    the same rules as POST /me/activities. Valid items are inserted with a
+    single bulk INSERT; with "atomic": true any invalid item rejects the whole
+    batch. Responds with one result per item, in request order.
+    """
+    user = g.current_user
+    body = request.get_json(silent=True) or {}
+    items = body.get('activities') if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify(message='activities must be a non-empty list'), 400
+    max_items = current_app.config.get('ACTIVITY_BATCH_MAX', 500)
+    if len(items) > max_items:
+        return jsonify(message=f'At most {max_items} activities per batch'), 400
+    atomic = body.get('atomic', False)
+    if not isinstance(atomic, bool):
+        return jsonify(message='atomic must be a boolean'), 400
+
+    results = []
+    rows = []
+    pending = []  # (results index, category name) for each row
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({"index": index, "status": "error", "errors": {"activity": ["Must be an object"]}})
+            continue
+        data, errors = activity_schema.validate(item)
+        if errors:
+            results.append({"index": index, "status": "error", "errors": errors})
+            continue
+        cat_obj, error = _resolve_category(data.category_id, data.category)
+        if error:
+            results.append({"index": index, "status": "error", "errors": {"category": [error]}})
+            continue
+        rows.append(_activity_values(data, user.id, cat_obj.id))
+        pending.append((len(results), cat_obj.name))
+        results.append(None)
+
+    failed = len(items) - len(rows)
+    if not rows or (atomic and failed):
+        for slot, _ in pending:
+            results[slot] = {"index": slot, "status": "skipped"}
+        return jsonify(results=results, created=0, failed=failed), 400
+
+    ids = db.session.scalars(
+        insert(Activity).returning(Activity.id, sort_by_parameter_order=True),
+        rows,
+    ).all()
+    RollupDelta().add_all(rows).apply()
+    bump_data_version(user.id)
+    db.session.commit()
+
+    for (slot, category_name), row, activity_id in zip(pending, rows, ids):
+        payload = activity_serializer.one(Activity(id=activity_id, **row), category=category_name)
+        results[slot] = {"index": slot, "status": "created", "activity": payload}
+
+    status_code = 207 if failed else 201
+    return json_response(results=results, created=len(rows), failed=failed, status=status_code)
 
 
 @bp.get('/me/activities')
+@read_only
 @jwt_required
+@conditional(user_etag('activities'))
 def list_my_activities():
     user = g.current_user
 
-    q = Activity.query.filter(Activity.user_id == user.id)
+    q = _activity_rows().where(Activity.user_id == user.id)
 
     category_id = request.args.get('category_id', type=int)
     if category_id is not None:
-        q = q.filter(Activity.category_id == category_id)
+        q = q.where(Activity.category_id == category_id)
 
     complete_param = request.args.get('complete')
     if complete_param is not None:
         val = complete_param.strip().lower()
         if val in ('true', '1', 'yes'):
-            q = q.filter(Activity.complete.is_(True))
+            q = q.where(Activity.complete.is_(True))
         elif val in ('false', '0', 'no'):
-            q = q.filter(Activity.complete.is_(False))
+            q = q.where(Activity.complete.is_(False))
 
     limit = request.args.get('limit', default=50, type=int)
-    offset = request.args.get('offset', default=0, type=int)
     limit = max(1, min(100, limit or 50))
-    offset = max(0, offset or 0)
 
-    activities = q.order_by(Activity.id.desc()).offset(offset).limit(limit).all()
+    # Keyset mode: seek past the cursor on (user_id, id) instead of OFFSET.
+    # An empty cursor requests the first page.
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        if cursor:
+            after_id = _decode_cursor(cursor)
+            if after_id is None:
+                return jsonify(message='Invalid cursor'), 400
+            q = q.where(Activity.id < after_id)
+        q = q.order_by(Activity.id.desc())
+    else:
+        offset = request.args.get('offset', default=0, type=int)
+        offset = max(0, offset or 0)
+        q = q.order_by(Activity.id.desc()).offset(offset)
+
+    # Fetch one extra row to learn whether another page exists
+    rows = db.session.execute(q.limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_cursor(rows[-1].id) if has_more else None
+
+    return json_response(
+        activities=activity_serializer.many(rows),
+        count=len(rows),
+        next_cursor=next_cursor,
+    )
+
+
+@bp.get('/me/activities/search')
+@read_only
+@jwt_required
+@conditional(user_etag('search'))
+def search_my_activities():
+    """Full-text search over titles and notes: ?q=...&limit=&offset=, best match first."""
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify(message='q is required'), 400
+    if len(q) > 200:
+        return jsonify(message='q must be at most 200 characters'), 400
+
+    limit = request.args.get('limit', default=20, type=int)
+    limit = max(1, min(100, limit or 20))
+    offset = max(0, request.args.get('offset', default=0, type=int) or 0)
+
+    rows = search_activities(_activity_rows(), g.current_user.id, q, limit=limit + 1, offset=offset)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return json_response(
+        activities=activity_serializer.many(rows),
+        count=len(rows),
+        next_offset=offset + limit if has_more else None,
+    )
 
-    def _act_payload(a: Activity):
+
+@bp.post('/me/activities/import')
+@jwt_required
+def import_my_activities():
+    """Import a CSV or GPX upload (multipart field `file`).
+
+    Optional form fields: `format` (csv|gpx, otherwise inferred from the file
+    name), `default_category`, and `resume` (id of a previous import of the
+    same file, which continues after its last committed chunk).
+    """
+    # Imported here so the parsers stay off the app startup path
+    from xml.etree import ElementTree
+    from ..importer import FORMATS, detect_format, start_import, run_import
+
+    user = g.current_user
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify(message='file is required'), 400
+    fmt = (request.form.get('format') or detect_format(upload.filename) or '').strip().lower()
+    if fmt not in FORMATS:
+        return jsonify(message='format must be csv or gpx'), 400
+
+    resume_id = request.form.get('resume', type=int)
+    if resume_id is not None:
+        job = ActivityImport.query.filter_by(id=resume_id, user_id=user.id).one_or_none()
+        if not job:
+            return jsonify(message='Import not found'), 404
+        if job.format != fmt:
+            return jsonify(message='format does not match the import being resumed'), 400
+        if job.status == 'completed':
+            return jsonify(activity_import=job.serialize())
+    else:
+        job = start_import(user.id, fmt, upload.filename)
+
+    try:
+        run_import(
+            job,
+            upload.stream,
+            chunk_size=current_app.config.get('IMPORT_CHUNK_SIZE', 1000),
+            default_category=request.form.get('default_category'),
+        )
+    except (ElementTree.ParseError, csv.Error, UnicodeDecodeError):
+        return jsonify(
+            message='Could not parse file; fix it and retry with resume',
+            activity_import=job.serialize(),
+        ), 422
+
+    return jsonify(activity_import=job.serialize()), 201 if resume_id is None else 200
+
+
+@bp.get('/me/activities/imports/<int:import_id>')
+@read_only
+@jwt_required
+def get_my_import(import_id: int):
+    job = ActivityImport.query.filter_by(id=import_id, user_id=g.current_user.id).one_or_none()
+    if not job:
+        return jsonify(message='Import not found'), 404
+    return jsonify(activity_import=job.serialize())
+
+
+@bp.get('/me/activities/stats')
+@read_only
+@jwt_required
+def my_activity_stats():
+    """Totals per category, served from the activity_rollups table."""
+    user = g.current_user
+    rows = db.session.execute(
+        select(ActivityRollup, ActivityCategory.name)
+        .join(ActivityCategory, ActivityRollup.category_id == ActivityCategory.id)
+        .where(ActivityRollup.user_id == user.id, ActivityRollup.activity_count > 0)
+        .order_by(ActivityCategory.name)
+    ).all()
+
+    def _stats(count, complete, distance, seconds):
         return {
-            "id": a.id,
-            "title": a.title,
-            "category_id": a.category_id,
-            "category": a.category.name if a.category else None,
-            "distance": a.distance,
-            "duration": a.duration.isoformat() if a.duration else None,
-            "notes": a.notes,
-            "user_id": a.user_id,
-            "time": a.time.isoformat() if a.time else None,
-            "complete": a.complete,
+            "count": count,
+            "complete_count": complete,
+            "completion_rate": round(complete / count, 4) if count else None,
+            "total_distance": round(distance, 3),
+            "total_duration_seconds": seconds,
         }
 
-    return jsonify(activities=[_act_payload(a) for a in activities], count=len(activities))
+    categories = []
+    totals = [0, 0, 0.0, 0]
+    for rollup, name in rows:
+        values = (
+            rollup.activity_count,
+            rollup.complete_count,
+            rollup.total_distance,
+            rollup.total_duration_seconds,
+        )
+        totals = [t + v for t, v in zip(totals, values)]
+        categories.append({"category_id": rollup.category_id, "category": name, **_stats(*values)})
+
+    return jsonify(categories=categories, totals=_stats(*totals))
+
+
+@bp.get('/me/activities/export')
+@read_only
+@jwt_required
+def export_my_activities():
+    """Stream the caller's full history as NDJSON (default) or CSV.
+
+    Rows are read through a server-side cursor in EXPORT_CHUNK_SIZE batches
+    and written out per batch, so memory stays flat for any history size.
+    """
+    fmt = (request.args.get('format') or 'ndjson').strip().lower()
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify(message='format must be ndjson or csv'), 400
+
+    chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 1000)
+    stmt = (
+        _activity_rows()
+        .where(Activity.user_id == g.current_user.id)
+        .order_by(Activity.id)
+        .execution_options(yield_per=chunk_size)
+    )
+
+    def generate_ndjson():
+        for rows in db.session.execute(stmt).partitions():
+            yield b''.join(dumps(payload) + b'\n' for payload in activity_serializer.many(rows))
+
+    def generate_csv():
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=activity_serializer.fields)
+        writer.writeheader()
+        # Send the header before the query runs so clients see a first byte early
+        yield buf.getvalue()
+        for rows in db.session.execute(stmt).partitions():
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows(activity_serializer.many(rows))
+            yield buf.getvalue()
+
+    if fmt == 'csv':
+        generate, mimetype, ext = generate_csv, 'text/csv', 'csv'
+    else:
+        generate, mimetype, ext = generate_ndjson, 'application/x-ndjson', 'ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="activities.{ext}"'},
+    )
 
 
 @bp.get('/me/activities/<int:activity_id>')
+@read_only
 @jwt_required
 def get_my_activity(activity_id: int):
     user = g.current_user
-    a = (
-        Activity.query
-        .filter(Activity.id == activity_id, Activity.user_id == user.id)
-        .one_or_none()
-    )
-    if not a:
+    row = db.session.execute(
+        _activity_rows().where(Activity.id == activity_id, Activity.user_id == user.id)
+    ).one_or_none()
+    if not row:
         return jsonify(message="Activity not found"), 404
-    payload = {
-        "id": a.id,
-        "title": a.title,
-        "category_id": a.category_id,
-        "category": a.category.name if a.category else None,
-        "distance": a.distance,
-        "duration": a.duration.isoformat() if a.duration else None,
-        "notes": a.notes,
-        "user_id": a.user_id,
-        "time": a.time.isoformat() if a.time else None,
-        "complete": a.complete,
-    }
-    return jsonify(activity=payload)
+    return json_response(activity=activity_serializer.one(row))
 
 
 @bp.patch('/me/activities/<int:activity_id>')
@@ -134,71 +414,65 @@ def get_my_activity(activity_id: int):
 @json_form_required(ActivityUpdateForm)
 def update_my_activity(activity_id: int):
     user = g.current_user
-    received = g.json
-    form = g.form
+    data = g.data
 
     activity = Activity.query.filter(
         Activity.id == activity_id, Activity.user_id == user.id
     ).one_or_none()
     if not activity:
         return jsonify(message="Activity not found"), 404
+    current = category_registry.get(activity.category_id)
+    category_name = current.name if current else None
+    rollup = RollupDelta().add(activity, -1)
 
     # Title
-    if 'title' in received and received['title'] is not None:
-        activity.title = form.title.data
+    if data.title is not None:
+        activity.title = data.title
 
     # Category resolution
-    if 'category_id' in received or 'category' in received:
+    if 'category_id' in data.present or 'category' in data.present:
         cat_obj = None
-        if 'category_id' in received and received['category_id'] is not None:
-            cat_obj = ActivityCategory.query.get(form.category_id.data)
+        if data.category_id is not None:
+            cat_obj = category_registry.get(data.category_id)
             if not cat_obj:
                 return jsonify(message='Category not found'), 400
-        elif 'category' in received and received['category']:
-            name = form.category.data.strip()
-            cat_obj = ActivityCategory.query.filter(
-                func.lower(ActivityCategory.name) == name.lower()
-            ).one_or_none()
+        elif data.category:
+            cat_obj = category_registry.find(data.category)
             if not cat_obj:
                 return jsonify(message='Category not found'), 400
         if cat_obj:
             activity.category_id = cat_obj.id
+            category_name = cat_obj.name
 
     # Distance
-    if 'distance' in received and received['distance'] is not None:
-        activity.distance = form.distance.data
+    if data.distance is not None:
+        activity.distance = data.distance
 
     # Duration
-    if 'duration' in received and received['duration']:
-        activity.duration = form.duration.data
+    if data.duration:
+        activity.duration = data.duration
 
     # Time
-    if 'time' in received and received['time']:
-        activity.time = form.time.data
+    if data.time:
+        activity.time = data.time
+
+    # Date
+    if data.date:
+        activity.date = data.date
 
     # Notes
-    if 'notes' in received:
-        activity.notes = received['notes'] or None
+    if 'notes' in data.present:
+        activity.notes = data.notes or None
 
     # Complete
-    if 'complete' in received:
-        activity.complete = bool(form.complete.data)
+    if 'complete' in data.present:
+        activity.complete = data.complete
 
+    rollup.add(activity).apply()
+    bump_data_version(user.id)
     db.session.commit()
 
-    payload = {
-        "id": activity.id,
-        "title": activity.title,
-        "category_id": activity.category_id,
-        "category": activity.category.name if activity.category else None,
-        "distance": activity.distance,
-        "duration": activity.duration.isoformat() if activity.duration else None,
-        "notes": activity.notes,
-        "user_id": activity.user_id,
-        "time": activity.time.isoformat() if activity.time else None,
-        "complete": activity.complete,
-    }
-    return jsonify(activity=payload)
+    return json_response(activity=activity_serializer.one(activity, category=category_name))
 
 
 @bp.delete('/me/activities/<int:activity_id>')
@@ -210,7 +484,9 @@ def delete_my_activity(activity_id: int):
     ).one_or_none()
     if not activity:
         return jsonify(message="Activity not found"), 404
+    RollupDelta().add(activity, -1).apply()
     db.session.delete(activity)
+    bump_data_version(user.id)
     db.session.commit()
     return "", 204
 
@@ -224,7 +500,9 @@ def delete_activity(activity_id: int):
     ).one_or_none()
     if not activity:
         return jsonify(message="Activity not found"), 404
+    RollupDelta().add(activity, -1).apply()
     db.session.delete(activity)
+    bump_data_version(user.id)
     db.session.commit()
     return "", 204
 
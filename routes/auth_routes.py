@@ -1,29 +1,30 @@
-from flask import Blueprint, jsonify, g
+from flask import Blueprint, jsonify, g, request
 from sqlalchemy.exc import IntegrityError
 
 from ..forms import UserAddForm, LoginForm
 from ..models import db, User
-from ..auth import create_access_token
-from ..auth import json_form_required
+from ..auth import decode_access_token, issue_tokens, token_subject
+from ..auth import json_form_required, rate_limit
+from ..db_routing import primary
 
 
 bp = Blueprint('auth_routes', __name__)
 
 
 @bp.route('/signup', methods=["POST"])
+@rate_limit('signup', limit=5, period=60)
 @json_form_required(UserAddForm)
 def signup():
-    received = g.json
-    form = g.form
-
-    email = received.get("email")
-    password = received.get("password")
-    first_name = received.get("first_name")
-    last_name = received.get("last_name")
-    birthday = received.get("birthday")
-    weight = received.get("weight")
-    gender = received.get("gender")
-    benchmarks = received.get("benchmarks")
+    data = g.data
+
+    email = data.email
+    password = data.password
+    first_name = data.first_name
+    last_name = data.last_name
+    birthday = data.birthday
+    weight = data.weight
+    gender = data.gender
+    benchmarks = data.benchmarks
 
     if isinstance(benchmarks, str):
         try:
@@ -48,26 +49,46 @@ def signup():
         db.session.rollback()
         return jsonify(message="Email already registered"), 409
 
-    token = create_access_token(email)
-    return jsonify(user=user.serialize(), token=token), 201
+    return jsonify(user=user.serialize(), **issue_tokens(user)), 201
 
 
 @bp.route('/login', methods=["POST"])
+@rate_limit('login', limit=10, period=60)
 @json_form_required(LoginForm)
 def login():
-    received = g.json
-    form = g.form
+    data = g.data
 
-    email = received.get("email")
-    password = received.get("password")
+    email = data.email
+    password = data.password
 
     user = User.authenticate(email, password)
 
     if not user:
         return jsonify(message='Invalid email or password'), 401
 
-    token = create_access_token(email)
-    return jsonify(user=user.serialize(), token=token)
+    return jsonify(user=user.serialize(), **issue_tokens(user))
+
+
+@bp.route('/token/refresh', methods=["POST"])
+@rate_limit('token-refresh', limit=30, period=60)
+def refresh_token():
+    """Exchange {"refresh_token": ...} for a new access and refresh token."""
+    body = request.get_json(silent=True) or {}
+    refresh = body.get('refresh_token') if isinstance(body, dict) else None
+    if not isinstance(refresh, str) or not refresh:
+        return jsonify(message='refresh_token is required'), 400
+
+    payload = decode_access_token(refresh)
+    user_id = token_subject(payload, 'refresh') if payload else None
+    if user_id is None:
+        return jsonify(message='Invalid or expired refresh token'), 401
+
+    with primary():
+        user = db.session.get(User, user_id)
+    if user is None or user.token_generation != payload['gen']:
+        return jsonify(message='Invalid or expired refresh token'), 401
+
+    return jsonify(**issue_tokens(user))
 
 
 @bp.route('/logout', methods=["POST"])
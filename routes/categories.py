@@ -1,18 +1,40 @@
-from flask import Blueprint, jsonify, request
-from sqlalchemy import func
+from flask import Blueprint, request
 
-from ..models import ActivityCategory
+from ..category_registry import category_registry
+from ..db_routing import read_only
+from ..etags import conditional, query_variant
+from ..serializers import category_serializer, json_response
 
 
 bp = Blueprint('categories', __name__)
 
+# Not user specific, so shared caches may keep it briefly
+CATEGORIES_CACHE_CONTROL = "public, max-age=60"
+
+
+def _categories_etag():
+    # The registry digest is a content hash, so every worker tags equal lists alike
+    category_registry.all()
+    return f"categories.{category_registry.digest or '-'}.{query_variant()}"
+
 
 @bp.get('/activity-categories')
+@read_only
+@conditional(_categories_etag, cache_control=CATEGORIES_CACHE_CONTROL)
 def list_activity_categories():
-    q = request.args.get('q', type=str)
-    query = ActivityCategory.query
-    if q:
-        query = query.filter(ActivityCategory.name.ilike(f"%{q}%"))
-    cats = query.order_by(ActivityCategory.name.asc()).all()
-    return jsonify(categories=[c.serialize() for c in cats])
+    """All categories by name, or those whose name contains ?q=.
 
+    With ?q= and ?limit=, answers as autocomplete instead: at most `limit`
+    (up to 50) matches, prefix matches first.
+    """
+    q = (request.args.get('q', type=str) or '').strip()
+    limit = request.args.get('limit', type=int)
+    if q and limit:
+        cats = category_registry.complete(q, max(1, min(50, limit)))
+    elif q:
+        cats = category_registry.matching(q)
+    else:
+        cats = category_registry.all()
+        if limit:
+            cats = cats[:max(1, limit)]
+    return json_response(categories=category_serializer.many(cats))
@@ -0,0 +1,85 @@
+from datetime import date
+from typing import Optional, Tuple
+
+from flask import Blueprint, request, jsonify, g
+
+from ..auth import jwt_required
+from ..category_registry import category_registry
+from ..db_routing import read_only
+from ..leaderboards import Standing, leaderboards, week_start
+from ..serializers import json_response
+
+
+bp = Blueprint('leaderboards', __name__)
+
+
+def _week_start() -> Tuple[Optional[date], Optional[str]]:
+    """Monday of the week named by ?week= (any day of it, default this week); returns (start, error)."""
+    week = (request.args.get('week') or '').strip()
+    try:
+        return week_start(date.fromisoformat(week) if week else None), None
+    except ValueError:
+        return None, 'week must be a date (YYYY-MM-DD)'
+
+
+def _standing(standing: Standing) -> dict:
+    return {
+        "rank": standing.rank,
+        "user_id": standing.user_id,
+        "total_distance": round(standing.total_distance, 3),
+        "activity_count": standing.activity_count,
+    }
+
+
+@bp.get('/leaderboards/<int:category_id>')
+@read_only
+@jwt_required
+def get_leaderboard(category_id: int):
+    """Weekly distance board for a category: ?week=YYYY-MM-DD&limit=&offset=, plus the caller's standing.
+
+    Entries identify users by id only; profiles stay private.
+    """
+    ref = category_registry.get(category_id)
+    if not ref:
+        return jsonify(message='Category not found'), 404
+    start, error = _week_start()
+    if error:
+        return jsonify(message=error), 400
+
+    limit = request.args.get('limit', default=10, type=int)
+    limit = max(1, min(100, limit or 10))
+    offset = max(0, request.args.get('offset', default=0, type=int) or 0)
+
+    standings, participants = leaderboards.top(ref.id, start, limit, offset)
+    me, _ = leaderboards.standing(ref.id, start, g.current_user.id)
+
+    return json_response(
+        category_id=ref.id,
+        category=ref.name,
+        week_start=start.isoformat(),
+        participants=participants,
+        entries=[_standing(s) for s in standings],
+        me=_standing(me) if me else None,
+    )
+
+
+@bp.get('/me/leaderboards/<int:category_id>')
+@read_only
+@jwt_required
+def my_leaderboard_position(category_id: int):
+    """The caller's rank on a category's weekly board (?week=), or null if they have no activities that week."""
+    ref = category_registry.get(category_id)
+    if not ref:
+        return jsonify(message='Category not found'), 404
+    start, error = _week_start()
+    if error:
+        return jsonify(message=error), 400
+
+    me, participants = leaderboards.standing(ref.id, start, g.current_user.id)
+    return json_response(
+        category_id=ref.id,
+        category=ref.name,
+        week_start=start.isoformat(),
+        participants=participants,
+        me=_standing(me) if me else None,
+    )
@@ -1,20 +1,28 @@
 from flask import Blueprint, jsonify, g, request
-from sqlalchemy import func
 
-from ..auth import jwt_required, json_form_required
+from ..auth import jwt_required, json_form_required, invalidate_principal, rate_limit
+from ..auth import issue_tokens, revoke_tokens
 from ..forms import UserEditForm, PasswordChangeForm, DeleteAccountForm
-from ..models import db, bcrypt, PasswordChangeLog
-from ..auth import create_access_token
-from datetime import datetime, timedelta
+from ..leaderboards import leaderboards
+from ..models import db, PasswordChangeLog
+from ..passwords import password_hasher
+from ..db_routing import read_only
+from ..etags import bump_data_version, conditional, user_etag
 
 
 bp = Blueprint('users', __name__)
 
 
 @bp.get('/me')
+@read_only
 @jwt_required
+@conditional(user_etag('me'))
 def me():
-    return jsonify(user=g.current_user.serialize())
+    user = g.current_user
+    # A cached principal can predate a profile change made through another worker
+    if user.data_version != g.get('data_version', user.data_version):
+        db.session.refresh(user)
+    return jsonify(user=user.serialize())
 
 
 @bp.patch('/me')
@@ -22,25 +30,24 @@ def me():
 @json_form_required(UserEditForm)
 def update_me():
     user = g.current_user
-    received = g.json
-    form = g.form
+    data = g.data
 
     old_email = user.email
 
-    if 'email' in received and received['email']:
-        user.email = received['email']
-    if 'first_name' in received and received['first_name']:
-        user.first_name = received['first_name']
-    if 'last_name' in received and received['last_name']:
-        user.last_name = received['last_name']
-    if 'birthday' in received and received['birthday']:
-        user.birthday = form.birthday.data
-    if 'weight' in received and received['weight'] is not None:
-        user.weight = form.weight.data
-    if 'gender' in received and received['gender']:
-        user.gender = received['gender']
-    if 'benchmarks' in received:
-        benchmarks = received['benchmarks']
+    if data.email:
+        user.email = data.email
+    if data.first_name:
+        user.first_name = data.first_name
+    if data.last_name:
+        user.last_name = data.last_name
+    if data.birthday:
+        user.birthday = data.birthday
+    if data.weight is not None:
+        user.weight = data.weight
+    if data.gender:
+        user.gender = data.gender
+    if 'benchmarks' in data.present:
+        benchmarks = data.benchmarks
         if isinstance(benchmarks, str):
             try:
                 import json as _json
@@ -48,61 +55,63 @@ def update_me():
             except Exception:
                 benchmarks = None
         user.benchmarks = benchmarks
-    if 'password' in received and received['password']:
-        from ..models import bcrypt as _bcrypt
-        user.password = _bcrypt.generate_password_hash(received['password']).decode('UTF-8')
+    password_changed = bool(data.password)
+    if password_changed:
+        user.password = password_hasher.hash(data.password)
+        revoke_tokens(user)
 
     try:
+        bump_data_version(user.id)
         db.session.commit()
     except Exception:
         db.session.rollback()
         return jsonify(message='Email already in use'), 409
-
-    new_token = None
-    if user.email != old_email:
-        new_token = create_access_token(user.email)
+    invalidate_principal(user.id, user.token_generation if password_changed else None)
 
     result = {"user": user.serialize()}
-    if new_token:
-        result["token"] = new_token
+    # A password change revokes the caller's token; an email change still
+    # hands out fresh tokens for clients that key sessions on the email
+    if password_changed or user.email != old_email:
+        result.update(issue_tokens(user))
     return jsonify(result)
 
 
 @bp.patch('/me/password')
 @jwt_required
+@rate_limit(
+    'password-change',
+    limit=5,
+    period=15 * 60,
+    key=lambda: str(g.current_user.id),
+    counts=lambda response: response.status_code == 401,
+    message='Too many failed attempts. Try again in 15 minutes',
+)
 @json_form_required(PasswordChangeForm)
 def change_password():
     user = g.current_user
-    received = g.json
-    form = g.form
-
-    current_password = received.get('current_password')
-    new_password = received.get('new_password')
-
-    window = datetime.utcnow() - timedelta(minutes=15)
-    failed_count = db.session.query(func.count(PasswordChangeLog.id)).filter(
-        PasswordChangeLog.user_id == user.id,
-        PasswordChangeLog.success.is_(False),
-        PasswordChangeLog.created_at >= window,
-    ).scalar() or 0
-    if failed_count >= 5:
-        return jsonify(message='Too many failed attempts. Try again in 15 minutes'), 429
-
-    if not bcrypt.check_password_hash(user.password, current_password):
+    data = g.data
+
+    current_password = data.current_password
+    new_password = data.new_password
+
+    if not password_hasher.check(user.password, current_password):
         log = PasswordChangeLog(user_id=user.id, ip=request.remote_addr, success=False)
         db.session.add(log)
         db.session.commit()
         return jsonify(message='Current password is incorrect'), 401
 
-    if bcrypt.check_password_hash(user.password, new_password):
+    if password_hasher.check(user.password, new_password):
         return jsonify(message='New password must be different from current password'), 400
 
-    user.password = bcrypt.generate_password_hash(new_password).decode('UTF-8')
+    user.password = password_hasher.hash(new_password)
+    revoke_tokens(user)
     log = PasswordChangeLog(user_id=user.id, ip=request.remote_addr, success=True)
     db.session.add(log)
     db.session.commit()
+    invalidate_principal(user.id, user.token_generation)
 
-    return jsonify(message='Password updated successfully')
+    # Every earlier token is now rejected; the caller continues with these
+    return jsonify(message='Password updated successfully', **issue_tokens(user))
 
 
 @bp.delete('/me')
@@ -110,19 +119,23 @@ def change_password():
 @json_form_required(DeleteAccountForm)
 def delete_me():
     user = g.current_user
-    received = g.json
+    data = g.data
 
-    current_password = received.get('current_password')
-    confirm_email = received.get('confirm_email')
+    current_password = data.current_password
+    confirm_email = data.confirm_email
 
     if confirm_email != user.email:
         return jsonify(message='Confirmation email does not match'), 400
 
-    if not bcrypt.check_password_hash(user.password, current_password):
+    if not password_hasher.check(user.password, current_password):
         return jsonify(message='Current password is incorrect'), 401
 
+    user_id = user.id
     db.session.delete(user)
     db.session.commit()
+    invalidate_principal(user_id)
+    # Their leaderboard entries went with the account (ON DELETE CASCADE)
+    leaderboards.forget_user(user_id)
 
     return jsonify(message='Account deleted'), 200
 
@@ -0,0 +1,62 @@
+import hmac
+
+from flask import Blueprint, current_app, jsonify, request
+
+from ..webhooks import DELETE, UPSERT, webhook_queue
+
+
+bp = Blueprint('webhooks', __name__)
+
+STRAVA_OBJECT_TYPES = ('activity', 'athlete')
+STRAVA_ASPECT_TYPES = ('create', 'update', 'delete')
+
+
+@bp.get('/webhooks/strava')
+def strava_subscription_challenge():
+    """Subscription validation: echo hub.challenge when hub.verify_token matches."""
+    expected = current_app.config['STRAVA_WEBHOOK_VERIFY_TOKEN']
+    token = request.args.get('hub.verify_token', '')
+    if (
+        not expected
+        or request.args.get('hub.mode') != 'subscribe'
+        or not hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8'))
+    ):
+        return jsonify(message='Invalid verification request'), 403
+    return jsonify({'hub.challenge': request.args.get('hub.challenge', '')})
+
+
+@bp.post('/webhooks/strava')
+def strava_event():
+    """Queue a push event; the webhook worker applies it (`flask webhooks work`)."""
+    event = request.get_json(silent=True)
+    if not isinstance(event, dict):
+        return jsonify(message='Expected a JSON object'), 400
+
+    subscription_id = current_app.config['STRAVA_SUBSCRIPTION_ID']
+    if subscription_id and str(event.get('subscription_id')) != str(subscription_id):
+        return jsonify(message='Unknown subscription'), 403
+
+    object_type = event.get('object_type')
+    aspect_type = event.get('aspect_type')
+    updates = event.get('updates') or {}
+    try:
+        object_id = int(event['object_id'])
+        owner_id = int(event['owner_id'])
+        event_time = int(event.get('event_time') or 0)
+    except (KeyError, TypeError, ValueError):
+        return jsonify(message='object_id and owner_id are required'), 400
+    if object_type not in STRAVA_OBJECT_TYPES or aspect_type not in STRAVA_ASPECT_TYPES:
+        return jsonify(message='Unsupported event'), 400
+    if not isinstance(updates, dict):
+        return jsonify(message='updates must be an object'), 400
+
+    webhook_queue.enqueue(
+        'strava',
+        object_type,
+        object_id,
+        owner_id,
+        DELETE if aspect_type == 'delete' else UPSERT,
+        event_time,
+        updates,
+    )
+    return jsonify(status='queued')
@@ -0,0 +1,348 @@
+"""Request validation compiled once from the WTForms classes in `forms.py`.
+
+Building a `FlaskForm` per request means binding every field, running the
+metaclass machinery and wrapping the JSON body in a MultiDict, only to read
+a handful of values back out. `Schema` walks a form class's field
+declarations once at import time and turns each field into a single
+convert-and-validate function. `Schema.validate(payload)` then decodes a
+JSON object in one pass into a typed record (a NamedTuple whose `present`
+attribute holds the keys the client sent), or returns WTForms' error shape:
+`{field: [messages]}` with the same messages.
+
+Conversion follows the WTForms fields used by the forms (String, Password,
+TextArea, Integer, Float, Date, Time, Boolean), as does each validator used
+(DataRequired, InputRequired, Optional, Length, Email, NumberRange). A form
+that uses anything else fails at import time instead of validating
+differently. Values WTForms would crash on (e.g. `null` for a number) are
+reported as that field's conversion error, and string fields reject JSON
+lists, objects and numbers outright ("Not a valid string."). String fields
+named in a schema's `json_fields` (e.g. `benchmarks`, stored in a JSON
+column) instead pass any JSON value through unchanged.
+"""
+import math
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Tuple
+
+import email_validator
+from wtforms import fields as wtf
+from wtforms import validators as wtv
+from wtforms.fields.core import UnboundField
+
+from . import forms
+
+
+Errors = Dict[str, List[str]]
+# (value, raw values, errors) -> True to stop the chain
+Check = Callable[[Any, List[Any], List[str]], bool]
+
+REQUIRED = "This field is required."
+
+
+# Conversion: return (value, error) the way the WTForms field would process
+# the JSON value first as `data`, then as form data.
+
+def _string(value, raw):
+    if value is None or isinstance(value, str):
+        return value, None
+    return None, "Not a valid string."
+
+
+def _json(value, raw):
+    return value, None
+
+
+def _integer(value, raw):
+    message = "Not a valid integer value."
+    data = error = None
+    if value is not None:
+        try:
+            data = int(value)
+        except (TypeError, ValueError):
+            error = message
+    if raw:
+        try:
+            data = int(raw[0])
+        except (TypeError, ValueError):
+            return None, message
+    return data, error
+
+
+def _float(value, raw):
+    if not raw:
+        return value, None
+    try:
+        return float(raw[0]), None
+    except (TypeError, ValueError):
+        return None, "Not a valid float value."
+
+
+def _strptime(formats, kind: str, message: str):
+    def convert(value, raw):
+        if not raw:
+            return value, None
+        try:
+            text = " ".join(raw)
+        except TypeError:
+            return None, message
+        for fmt in formats:
+            try:
+                return getattr(datetime.strptime(text, fmt), kind)(), None
+            except ValueError:
+                pass
+        return None, message
+
+    return convert
+
+
+def _boolean(false_values):
+    def convert(value, raw):
+        return not (not raw or raw[0] in false_values), None
+
+    return convert
+
+
+def _converter(field_class, kwargs) -> Tuple[Callable, Any]:
+    """(convert, record type) for a field class; string fields keep the JSON value."""
+    if issubclass(field_class, wtf.BooleanField):
+        return _boolean(tuple(kwargs.get("false_values") or field_class.false_values)), bool
+    if issubclass(field_class, wtf.IntegerField):
+        return _integer, Optional[int]
+    if issubclass(field_class, wtf.FloatField):
+        return _float, Optional[float]
+    if issubclass(field_class, (wtf.DateField, wtf.TimeField)):
+        is_date = issubclass(field_class, wtf.DateField)
+        fmt = kwargs.get("format", "%Y-%m-%d" if is_date else "%H:%M")
+        formats = [fmt] if isinstance(fmt, str) else list(fmt)
+        if is_date:
+            return _strptime(formats, "date", "Not a valid date value."), Optional[date]
+        return _strptime(formats, "time", "Not a valid time value."), Optional[time]
+    if issubclass(field_class, wtf.StringField):
+        return _string, Any
+    raise TypeError(f"schemas: unsupported field type {field_class.__name__}")
+
+
+# Validators
+
+def _data_required(message):
+    def check(value, raw, errors):
+        if value and (not isinstance(value, str) or value.strip()):
+            return False
+        errors[:] = [message]
+        return True
+
+    return check
+
+
+def _input_required(message):
+    def check(value, raw, errors):
+        if raw and raw[0]:
+            return False
+        errors[:] = [message]
+        return True
+
+    return check
+
+
+def _optional(strip_whitespace: bool):
+    def check(value, raw, errors):
+        if not raw or isinstance(raw[0], str) and not (raw[0].strip() if strip_whitespace else raw[0]):
+            errors.clear()
+            return True
+        return False
+
+    return check
+
+
+def _plural(count: int, singular: str, plural: str) -> str:
+    return singular if count == 1 else plural
+
+
+def _length(v: wtv.Length):
+    if v.message is not None:
+        template = v.message
+    elif v.max == -1:
+        template = _plural(v.min, "Field must be at least %(min)d character long.",
+                           "Field must be at least %(min)d characters long.")
+    elif v.min == -1:
+        template = _plural(v.max, "Field cannot be longer than %(max)d character.",
+                           "Field cannot be longer than %(max)d characters.")
+    elif v.min == v.max:
+        template = _plural(v.max, "Field must be exactly %(max)d character long.",
+                           "Field must be exactly %(max)d characters long.")
+    else:
+        template = "Field must be between %(min)d and %(max)d characters long."
+    low, high = v.min, v.max
+
+    def check(value, raw, errors):
+        try:
+            length = value and len(value) or 0
+        except TypeError:
+            length = None
+        if length is not None and length >= low and (high == -1 or length <= high):
+            return False
+        errors.append(template % dict(min=low, max=high, length=length or 0))
+        return False
+
+    return check
+
+
+def _email(v: wtv.Email):
+    message = v.message or "Invalid email address."
+    options = dict(
+        check_deliverability=v.check_deliverability,
+        allow_smtputf8=v.allow_smtputf8,
+        allow_empty_local=v.allow_empty_local,
+    )
+
+    def check(value, raw, errors):
+        try:
+            if value is None:
+                raise email_validator.EmailNotValidError()
+            email_validator.validate_email(value, **options)
+        except (email_validator.EmailNotValidError, AttributeError, TypeError):
+            errors.append(message)
+        return False
+
+    return check
+
+
+def _number_range(v: wtv.NumberRange):
+    if v.message is not None:
+        template = v.message
+    elif v.max is None:
+        template = "Number must be at least %(min)s."
+    elif v.min is None:
+        template = "Number must be at most %(max)s."
+    else:
+        template = "Number must be between %(min)s and %(max)s."
+    message = template % dict(min=v.min, max=v.max)
+    low, high = v.min, v.max
+
+    def check(value, raw, errors):
+        try:
+            if (
+                value is not None
+                and not math.isnan(value)
+                and (low is None or value >= low)
+                and (high is None or value <= high)
+            ):
+                return False
+        except TypeError:
+            pass
+        errors.append(message)
+        return False
+
+    return check
+
+
+def _check(validator) -> Check:
+    if isinstance(validator, wtv.DataRequired):
+        return _data_required(validator.message or REQUIRED)
+    if isinstance(validator, wtv.InputRequired):
+        return _input_required(validator.message or REQUIRED)
+    if isinstance(validator, wtv.Optional):
+        return _optional(validator.string_check("  ") == "")
+    if isinstance(validator, wtv.Length):
+        return _length(validator)
+    if isinstance(validator, wtv.Email):
+        return _email(validator)
+    if isinstance(validator, wtv.NumberRange):
+        return _number_range(validator)
+    raise TypeError(f"schemas: unsupported validator {type(validator).__name__}")
+
+
+def _compile_field(unbound: UnboundField, json: bool = False) -> Callable[[Mapping], Tuple[Any, List[str]]]:
+    kwargs = dict(unbound.kwargs)
+    validators = kwargs.get("validators")
+    if validators is None and len(unbound.args) > 1:
+        validators = unbound.args[1]
+    convert = _json if json else _converter(unbound.field_class, kwargs)[0]
+    checks = tuple(_check(v) for v in validators or ())
+
+    def run(value, present: bool) -> Tuple[Any, List[str]]:
+        if not present:
+            raw = []
+        elif isinstance(value, (list, tuple)):
+            raw = list(value)
+        else:
+            raw = [value]
+        data, error = convert(value, raw)
+        if error and convert is _string:
+            # Length/DataRequired would otherwise misreport the wrong type
+            return None, [error]
+        errors = [error] if error else []
+        for check in checks:
+            if check(data, raw, errors):
+                break
+        return data, errors
+
+    return run
+
+
+def _declared_fields(form_cls) -> List[Tuple[str, UnboundField]]:
+    found = [
+        (name, attr)
+        for name in dir(form_cls)
+        if not name.startswith("_") and isinstance(attr := getattr(form_cls, name), UnboundField)
+    ]
+    found.sort(key=lambda item: item[1].creation_counter)
+    return found
+
+
+class Schema:
+    """Compiled validator for one form class; see the module docstring."""
+
+    def __init__(self, form_cls, json_fields: FrozenSet[str] = frozenset()):
+        declared = _declared_fields(form_cls)
+        self.form_cls = form_cls
+        self.fields = tuple(name for name, _ in declared)
+        for field in json_fields:
+            if field not in self.fields or not issubclass(dict(declared)[field].field_class, wtf.StringField):
+                raise TypeError(f"schemas: json field {field!r} must be a string field of {form_cls.__name__}")
+        name = form_cls.__name__[:-len("Form")] if form_cls.__name__.endswith("Form") else form_cls.__name__
+        self.record = NamedTuple(
+            f"{name}Data",
+            [(field, _converter(u.field_class, u.kwargs)[1]) for field, u in declared]
+            + [("present", FrozenSet[str])],
+        )
+        self._runners = tuple((field, _compile_field(u, field in json_fields)) for field, u in declared)
+
+    def validate(self, payload: Any) -> Tuple[Optional[Any], Optional[Errors]]:
+        """Return `(record, None)` when `payload` is valid, else `(None, errors)`."""
+        if not isinstance(payload, Mapping):
+            payload = {}
+        values = []
+        errors: Errors = {}
+        for name, run in self._runners:
+            value, field_errors = run(payload.get(name), name in payload)
+            if field_errors:
+                errors[name] = field_errors
+            values.append(value)
+        if errors:
+            return None, errors
+        present = frozenset(name for name in self.fields if name in payload)
+        return self.record(*values, present), None
+
+
+_schemas: Dict[type, Schema] = {}
+
+
+def schema_for(form_cls, json_fields: FrozenSet[str] = frozenset()) -> Schema:
+    """Compiled `Schema` for `form_cls` (compiled on first use if not below).
+
+    `json_fields` only applies to the first call for a form class.
+    """
+    schema = _schemas.get(form_cls)
+    if schema is None:
+        schema = _schemas[form_cls] = Schema(form_cls, frozenset(json_fields))
+    return schema
+
+
+# `benchmarks` is stored in a JSON column: clients may send an object or its JSON text
+user_add_schema = schema_for(forms.UserAddForm, json_fields={"benchmarks"})
+user_edit_schema = schema_for(forms.UserEditForm, json_fields={"benchmarks"})
+login_schema = schema_for(forms.LoginForm)
+password_change_schema = schema_for(forms.PasswordChangeForm)
+delete_account_schema = schema_for(forms.DeleteAccountForm)
+activity_schema = schema_for(forms.ActivityForm)
+activity_update_schema = schema_for(forms.ActivityUpdateForm)
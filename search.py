@@ -0,0 +1,104 @@
+"""Full-text search over activity titles and notes.
+
+Postgres keeps a generated `activities.search_vector` tsvector (title weighted
+above notes) in a GIN index on (user_id, search_vector), using the btree_gin
+extension; SQLite uses an external-content FTS5 table kept in sync by triggers. Neither is mapped on `Activity`, so the ORM and
+`db.create_all` stay portable: DDL listeners add the dialect's objects whenever
+the activities table is created, and the migration adds them to existing
+databases.
+
+On Postgres a search reads only the caller's matching index entries, so its
+cost grows with their matches, not with the size of the table. FTS5 cannot
+hold the user id in the index: SQLite finds every user's matches and then
+filters them by user.
+"""
+import re
+from typing import List
+
+from sqlalchemy import DDL, Select, column, event, func, literal_column, table, text
+
+from .models import db, Activity
+
+
+SEARCH_CONFIG = "english"
+
+POSTGRES_DDL = (
+    f"""
+    ALTER TABLE activities ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(notes, '')), 'B')
+    ) STORED
+    """,
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    "CREATE INDEX ix_activities_user_search ON activities USING GIN (user_id, search_vector)",
+)
+
+SQLITE_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS activities_fts USING fts5(
+        title, notes, content='activities', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS activities_fts_insert AFTER INSERT ON activities BEGIN
+        INSERT INTO activities_fts(rowid, title, notes) VALUES (new.id, new.title, new.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS activities_fts_delete AFTER DELETE ON activities BEGIN
+        INSERT INTO activities_fts(activities_fts, rowid, title, notes)
+        VALUES ('delete', old.id, old.title, old.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS activities_fts_update AFTER UPDATE OF title, notes ON activities BEGIN
+        INSERT INTO activities_fts(activities_fts, rowid, title, notes)
+        VALUES ('delete', old.id, old.title, old.notes);
+        INSERT INTO activities_fts(rowid, title, notes) VALUES (new.id, new.title, new.notes);
+    END
+    """,
+    # Drop entries left over from an earlier activities table
+    "INSERT INTO activities_fts(activities_fts) VALUES ('rebuild')",
+)
+
+_activities_fts = table("activities_fts", column("rowid"))
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+for _statement in POSTGRES_DDL:
+    event.listen(Activity.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+for _statement in SQLITE_DDL:
+    event.listen(Activity.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+def fts5_query(q: str) -> str:
+    """Quote each word so user input cannot use FTS5 query syntax; terms are ANDed."""
+    return " ".join(f'"{term}"' for term in _TERM.findall(q))
+
+
+def search_activities(rows: Select, user_id: int, q: str, limit: int, offset: int = 0) -> List:
+    """Rows of the activities select `rows` matching `q` for `user_id`, best match first."""
+    if db.engine.dialect.name == "postgresql":
+        query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), q)
+        vector = literal_column("activities.search_vector")
+        rank = func.ts_rank_cd(vector, query)
+        stmt = (
+            rows
+            .where(Activity.user_id == user_id, vector.op("@@")(query))
+            .order_by(rank.desc(), Activity.id.desc())
+        )
+    else:
+        match = fts5_query(q)
+        if not match:
+            return []
+        # bm25() is lower for better matches; titles weigh twice as much as notes
+        rank = func.bm25(literal_column("activities_fts"), 2.0, 1.0)
+        stmt = (
+            rows
+            .join(_activities_fts, _activities_fts.c.rowid == Activity.id)
+            .where(Activity.user_id == user_id, text("activities_fts MATCH :match").bindparams(match=match))
+            .order_by(rank.asc(), Activity.id.desc())
+        )
+    return db.session.execute(stmt.limit(limit).offset(offset)).all()
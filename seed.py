@@ -1,19 +1,39 @@
 """Seed the database with sample users, categories, and activities.
 
 Usage:
-  python backend/seed.py
+  python -m backend.seed
+  flask seed --users 10000 --activities-per-user 200 --seed 42
+
+Without --users, creates the two sample accounts below. With --users, bulk
+generates a reproducible synthetic dataset for load testing (see `generate`).
 
 Requires env vars (see backend/.env):
   - DATABASE_URL
   - SECRET_KEY
 """
 
-from datetime import time
+import random
+import time as _time
+from contextlib import nullcontext
+from datetime import date, time, timedelta
 from typing import List
 
-from backend.app import app
-from backend.models import db, User, Activity, ActivityCategory, bcrypt
-from backend.auth import create_access_token
+from flask import has_app_context
+from sqlalchemy import insert
+
+from .models import db, User, Activity, ActivityCategory, ActivityRollup, LeaderboardEntry, bcrypt
+from .auth import create_access_token
+from .etags import bump_data_version
+from .passwords import password_hasher
+from .rollups import RollupDelta
+
+
+def _app_context():
+    """The running app under `flask seed`; the default app when run as a script."""
+    if has_app_context():
+        return nullcontext()
+    from .app import app
+    return app.app_context()
 
 
 def ensure_categories(names: List[str]) -> None:
@@ -52,11 +72,14 @@ def upsert_user(email: str, password: str, first_name: str, last_name: str) -> U
 
 
 def reset_activities_for_user(user: User) -> None:
+    activities = Activity.query.filter_by(user_id=user.id).all()
+    RollupDelta().add_all(activities, -1).apply()
     Activity.query.filter_by(user_id=user.id).delete()
+    bump_data_version(user.id)
     db.session.commit()
 
 
-def add_activity(user: User, title: str, category_name: str, distance: float, duration_hms: str, time_hms: str, notes: str = None, complete: bool = True):
+def add_activity(user: User, title: str, category_name: str, distance: float, duration_hms: str, time_hms: str, notes: str = None, complete: bool = True, day: date = None):
     # parse HH:MM:SS
     def parse_hms(s: str) -> time:
         hh, mm, ss = [int(x) for x in s.split(':')]
@@ -69,17 +92,20 @@ def add_activity(user: User, title: str, category_name: str, distance: float, du
         distance=float(distance),
         duration=parse_hms(duration_hms),
         time=parse_hms(time_hms),
+        date=day or date.today(),
         notes=notes,
         complete=bool(complete),
         user_id=user.id,
     )
     db.session.add(act)
+    RollupDelta().add(act).apply()
+    bump_data_version(user.id)
     db.session.commit()
     return act
 
 
 def main():
-    with app.app_context():
+    with _app_context():
         # Ensure core categories exist
         ensure_categories(["Run", "Bike", "Swim", "Weight Training", "Yoga"]) 
 
@@ -98,8 +124,8 @@ def main():
         add_activity(user2, "Pool Swim", "Swim", 1.2, "00:40:00", "07:00:00", notes="Drills", complete=False)
 
         # Print ready-to-use JWTs for testing in Insomnia
-        token1 = create_access_token(user1.email)
-        token2 = create_access_token(user2.email)
+        token1 = create_access_token(user1)
+        token2 = create_access_token(user2)
         print("Seed complete. Test users and tokens:")
         print(f"- {user1.email} / password123")
         print(f"  Bearer {token1}")
@@ -107,6 +133,153 @@ def main():
         print(f"  Bearer {token2}")
 
 
+# Synthetic data
+
+FIRST_NAMES = ["Ava", "Ben", "Chloe", "Diego", "Emma", "Finn", "Grace", "Hiro", "Isla", "Jonas",
+               "Kira", "Liam", "Maya", "Noah", "Olivia", "Priya", "Quinn", "Ravi", "Sofia", "Tom"]
+LAST_NAMES = ["Adams", "Brown", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Hughes", "Ito",
+              "Jensen", "Kim", "Lopez", "Muller", "Nguyen", "Okafor", "Patel", "Rossi", "Smith"]
+
+# name -> (weight, titles, (distance min, max), (minutes per distance unit min, max) or fixed minutes)
+CATEGORY_PROFILES = {
+    "Run": (40, ["Easy Run", "Tempo Run", "Long Run", "Intervals", "Hill Repeats", "Recovery Jog"], (3, 25), (4.5, 7.0)),
+    "Bike": (25, ["Commute", "Long Ride", "Group Ride", "Hill Climb", "Spin"], (10, 90), (1.8, 3.0)),
+    "Swim": (15, ["Pool Swim", "Open Water", "Drills", "Endurance Swim"], (0.5, 4), (18, 30)),
+    "Weight Training": (12, ["Upper Body", "Lower Body", "Full Body", "Core"], None, (30, 75)),
+    "Yoga": (8, ["Vinyasa Flow", "Yin Yoga", "Morning Stretch", "Power Yoga"], None, (20, 60)),
+}
+NOTES = ["Felt strong", "Windy", "Legs tired", "New route", "With friends", "Rainy", "PR!", "Easy effort"]
+
+
+def _seconds_to_time(seconds: int) -> time:
+    seconds = max(60, min(int(seconds), 86399))
+    return time(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def _random_activity(rng: random.Random, user_id: int, categories: dict, names: list, weights: list) -> dict:
+    name = rng.choices(names, weights)[0]
+    _, titles, distance_range, pace = CATEGORY_PROFILES[name]
+    if distance_range:
+        distance = round(rng.uniform(*distance_range), 2)
+        seconds = distance * rng.uniform(*pace) * 60
+    else:
+        distance = 0.0
+        seconds = rng.uniform(*pace) * 60
+    return {
+        "title": rng.choice(titles),
+        "category_id": categories[name],
+        "distance": distance,
+        "duration": _seconds_to_time(seconds),
+        "time": time(rng.choice((5, 6, 7, 12, 17, 18, 19)), rng.choice((0, 15, 30, 45)), 0),
+        "date": date.today() - timedelta(days=rng.randrange(56)),
+        "notes": rng.choice(NOTES) if rng.random() < 0.3 else None,
+        "complete": rng.random() < 0.85,
+        "user_id": user_id,
+    }
+
+
+def _copy_activities(rows: List[dict]) -> None:
+    """Load rows with COPY on Postgres (psycopg 3), inside the session transaction."""
+    columns = ["title", "category_id", "distance", "duration", "time", "date", "notes", "complete", "user_id"]
+    raw = db.session.connection().connection.driver_connection
+    with raw.cursor() as cur:
+        with cur.copy(f"COPY activities ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row([row[c] for c in columns])
+
+
+def _insert_activities(rows: List[dict], use_copy: bool) -> None:
+    if not rows:
+        return
+    if use_copy:
+        _copy_activities(rows)
+    else:
+        db.session.execute(insert(Activity), rows)
+
+
+def generate(
+    users: int,
+    activities_per_user: int,
+    seed: int = 0,
+    batch_users: int = 1000,
+    password: str = "password123",
+    email_domain: str = "load.example.com",
+    log=print,
+) -> None:
+    """Bulk-generate `users` users with `activities_per_user` activities each.
+
+    Output is deterministic for a given `seed`; emails are
+    `seed<seed>.user<n>@<email_domain>`. All users share one precomputed
+    password hash. Users are inserted with executemany and activities with
+    COPY on Postgres (executemany elsewhere), committing every `batch_users`
+    users. Rollups and leaderboard entries for the new users are written in
+    bulk as well; activities are spread over the last eight weeks.
+    """
+    rng = random.Random(seed)
+    with _app_context():
+        ensure_categories(list(CATEGORY_PROFILES))
+        categories = {
+            name: ActivityCategory.query.filter(ActivityCategory.name.ilike(name)).one().id
+            for name in CATEGORY_PROFILES
+        }
+        names = list(CATEGORY_PROFILES)
+        weights = [CATEGORY_PROFILES[n][0] for n in names]
+
+        prefix = f"seed{seed}.user"
+        if User.query.filter(User.email.like(f"{prefix}%@{email_domain}")).first():
+            raise RuntimeError(f"Users for seed {seed} already exist; pick another --seed")
+
+        pw_hash = password_hasher.hash(password)
+        use_copy = db.session.get_bind().dialect.name == "postgresql"
+        started = _time.perf_counter()
+        total_activities = 0
+
+        for first in range(0, users, batch_users):
+            count = min(batch_users, users - first)
+            user_rows = [
+                {
+                    "email": f"{prefix}{first + i}@{email_domain}",
+                    "password": pw_hash,
+                    "first_name": rng.choice(FIRST_NAMES),
+                    "last_name": rng.choice(LAST_NAMES),
+                    "birthday": date(1960, 1, 1) + timedelta(days=rng.randrange(365 * 45)),
+                    "weight": rng.randint(110, 240),
+                    "gender": rng.choice(("female", "male", "nonbinary", None)),
+                    "benchmarks": None,
+                }
+                for i in range(count)
+            ]
+            user_ids = db.session.scalars(
+                insert(User).returning(User.id, sort_by_parameter_order=True), user_rows
+            ).all()
+
+            rows = [
+                _random_activity(rng, user_id, categories, names, weights)
+                for user_id in user_ids
+                for _ in range(activities_per_user)
+            ]
+            _insert_activities(rows, use_copy)
+            delta = RollupDelta().add_all(rows)
+            rollup_rows = delta.rows()
+            if rollup_rows:
+                db.session.execute(insert(ActivityRollup), rollup_rows)
+            # New users only, so every (category, week, user) key is new too
+            leaderboard_rows = delta.leaderboard.rows()
+            if leaderboard_rows:
+                db.session.execute(insert(LeaderboardEntry), leaderboard_rows)
+            db.session.commit()
+
+            total_activities += len(rows)
+            elapsed = _time.perf_counter() - started
+            log(
+                f"{first + count}/{users} users, {total_activities} activities "
+                f"({total_activities / elapsed:,.0f} activities/s)"
+            )
+
+        log(f"Generated {users} users and {total_activities} activities in {_time.perf_counter() - started:.1f}s")
+        log(f"Sign in as {prefix}0@{email_domain} / {password}")
+
+
 if __name__ == "__main__":
     main()
 
@@ -0,0 +1,633 @@
+"""Incremental Strava activity sync.
+
+Each `ProviderConnection` keeps a high-water mark, `synced_until`: the start
+time (epoch seconds) of the newest activity pulled so far. A sync asks Strava
+for activities after that mark, which Strava returns oldest first, so the
+mark can advance page by page as each page is committed. An interrupted sync
+resumes where the last committed page ended, and pages that overlap a
+previous run are harmless because rows are upserted on
+(user_id, external_source, external_id).
+
+Pages are fetched with asyncio, each request running in a worker thread on
+the stdlib HTTP client. A sync starts with a single request, which is all a
+typical incremental run needs. Only after that first page comes back full
+does it keep up to `concurrency` later pages in flight. Pages are written in
+order as they arrive, while later ones download.
+
+Strava limits requests per application, both per 15-minute window (windows
+start on the quarter hour) and per UTC day. The current usage comes back in
+the X-RateLimit-* and X-ReadRateLimit-* headers of every response.
+`RateLimitBudget` tracks them across every connection synced by a process,
+counting requests still in flight. When the window's budget is spent it
+waits for the next window, up to `max_wait`. Past that, or when the daily
+budget is spent, it raises `StravaRateLimited`; the sync stops with its
+mark intact, so the next run picks up from there.
+"""
+import asyncio
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+
+from .etags import bump_data_version
+from .importer import ImportRowError, RowMapper
+from .models import db, Activity, ProviderConnection
+from .rollups import RollupDelta
+from .webhooks import DELETE, QueuedEvent
+
+
+PROVIDER = "strava"
+MAX_PAGE_SIZE = 200
+# Refresh access tokens this many seconds before they expire
+TOKEN_LEEWAY = 60
+MAX_RETRIES = 3
+
+
+class StravaError(Exception):
+    """A Strava request failed."""
+
+
+class StravaAuthError(StravaError):
+    """Strava rejected the connection's credentials; the user must reconnect."""
+
+
+class StravaNotFound(StravaError):
+    """The object does not exist (any more) or is not visible to the token."""
+
+
+class StravaRateLimited(StravaError):
+    """The application's request budget is spent until `retry_at` (epoch seconds)."""
+
+    def __init__(self, message: str, retry_at: float):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+
+# Rate limits
+
+def _parse_pair(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    try:
+        short, daily = (int(part) for part in value.split(","))
+    except (AttributeError, ValueError):
+        return None
+    return short, daily
+
+
+class RateLimitBudget:
+    """Strava's per-application request budget, read back from response headers.
+
+    `reserve` requests of each window are left for other clients of the same
+    application (e.g. the webhook worker). `window` is the length of the short
+    window in seconds; windows are aligned to multiples of it.
+    """
+
+    def __init__(
+        self,
+        reserve: int = 2,
+        max_wait: float = 900.0,
+        window: float = 900.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.window = window
+        self.clock = clock
+        # (window index, requests left) as of the latest response, per window kind
+        self._short: Optional[Tuple[int, int]] = None
+        self._daily: Optional[Tuple[int, int]] = None
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self.requests = 0
+        # Wall-clock seconds requests were held back for a window reset
+        self.stalled = 0.0
+
+    def _short_index(self, now: float) -> int:
+        return int(now // self.window)
+
+    @staticmethod
+    def _day_index(now: float) -> int:
+        return int(now // 86400)
+
+    def _left(self, state: Optional[Tuple[int, int]], index: int) -> Optional[int]:
+        if state is None or state[0] != index:
+            return None  # no response seen in this window yet
+        return state[1] - self._in_flight
+
+    def _next_window(self, now: float) -> float:
+        return (self._short_index(now) + 1) * self.window
+
+    def _wait(self) -> float:
+        """Seconds to wait before the next request, raising if that is too long."""
+        now = self.clock()
+        daily_left = self._left(self._daily, self._day_index(now))
+        if daily_left is not None and daily_left <= self.reserve:
+            retry_at = (self._day_index(now) + 1) * 86400
+            raise StravaRateLimited("Strava daily request limit reached", retry_at)
+        short_left = self._left(self._short, self._short_index(now))
+        if short_left is not None and short_left <= self.reserve:
+            self._block(now)
+        wait = self._blocked_until - now
+        if wait > self.max_wait:
+            raise StravaRateLimited("Strava 15-minute request limit reached", self._blocked_until)
+        return wait
+
+    async def acquire(self) -> None:
+        """Wait until a request fits in the budget, then count it as in flight."""
+        while True:
+            wait = self._wait()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        self._in_flight += 1
+        self.requests += 1
+
+    def release(self, headers, throttled: bool = False) -> None:
+        """Record a finished request; `headers` may be None if it never got a response."""
+        self._in_flight -= 1
+        now = self.clock()
+        for prefix in ("X-RateLimit", "X-ReadRateLimit"):
+            limit = _parse_pair(headers.get(f"{prefix}-Limit")) if headers else None
+            usage = _parse_pair(headers.get(f"{prefix}-Usage")) if headers else None
+            if not (limit and usage):
+                continue
+            self._short = self._tighter(self._short, self._short_index(now), limit[0] - usage[0])
+            self._daily = self._tighter(self._daily, self._day_index(now), limit[1] - usage[1])
+        if throttled:
+            self._block(now)
+
+    def _block(self, now: float) -> None:
+        until = self._next_window(now)
+        if until > self._blocked_until:
+            self.stalled += until - max(now, self._blocked_until)
+            self._blocked_until = until
+
+    @staticmethod
+    def _tighter(state, index: int, left: int) -> Tuple[int, int]:
+        if state is None or state[0] != index or left < state[1]:
+            return index, left
+        return state
+
+
+# HTTP
+
+class StravaClient:
+    """Minimal Strava API client for one access token."""
+
+    def __init__(self, access_token: str, base_url: str, budget: RateLimitBudget, timeout: float = 30.0):
+        self.access_token = access_token
+        self.base_url = base_url.rstrip("/")
+        self.budget = budget
+        self.timeout = timeout
+
+    def _get(self, path: str, params: Dict[str, object]):
+        url = f"{self.base_url}{path}?{urllib.parse.urlencode(params)}"
+        req = urllib.request.Request(url, headers={
+            "Authorization": f"Bearer {self.access_token}",
+            "Accept": "application/json",
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, resp.headers, resp.read()
+        except urllib.error.HTTPError as exc:
+            with exc:
+                return exc.code, exc.headers, exc.read()
+
+    async def get(self, path: str, **params):
+        """GET `path` within the rate-limit budget; returns the decoded JSON."""
+        for _ in range(MAX_RETRIES + 1):
+            await self.budget.acquire()
+            headers = None
+            try:
+                status, headers, body = await asyncio.to_thread(self._get, path, params)
+            except OSError as exc:
+                raise StravaError(f"GET {path} failed: {exc}") from exc
+            finally:
+                self.budget.release(headers, throttled=headers is not None and status == 429)
+            if status == 429:
+                continue
+            if status == 401:
+                raise StravaAuthError("Strava rejected the access token")
+            if status == 404:
+                raise StravaNotFound(f"GET {path} returned 404")
+            if status != 200:
+                raise StravaError(f"GET {path} returned {status}")
+            return json.loads(body)
+        raise StravaError(f"GET {path} still throttled after {MAX_RETRIES} retries")
+
+    async def activities(self, after: int, page: int, per_page: int) -> List[dict]:
+        return await self.get("/athlete/activities", after=after, page=page, per_page=per_page)
+
+    async def activity(self, activity_id) -> dict:
+        return await self.get(f"/activities/{activity_id}")
+
+    async def athlete(self) -> dict:
+        return await self.get("/athlete")
+
+
+async def iter_activity_pages(client: StravaClient, after: int, per_page: int, concurrency: int):
+    """Yield pages of activities after `after` in order, prefetching later pages.
+
+    The first page is fetched alone; once a page comes back full, up to
+    `concurrency` requests are kept in flight. The first short page ends it.
+    """
+    pending: Dict[int, asyncio.Future] = {}
+    next_page = current = 1
+    width = 1
+    try:
+        while True:
+            while len(pending) < width:
+                pending[next_page] = asyncio.ensure_future(client.activities(after, next_page, per_page))
+                next_page += 1
+            items = await pending.pop(current)
+            current += 1
+            yield items
+            if len(items) < per_page:
+                return
+            width = concurrency
+    finally:
+        for task in pending.values():
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending.values(), return_exceptions=True)
+
+
+# Tokens
+
+def _post_form(url: str, fields: Dict[str, object], timeout: float) -> dict:
+    data = urllib.parse.urlencode(fields).encode("ascii")
+    req = urllib.request.Request(url, data=data, headers={"Accept": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as exc:
+        with exc:
+            if exc.code in (400, 401):
+                raise StravaAuthError("Strava refused to refresh the access token") from exc
+            raise StravaError(f"Token refresh returned {exc.code}") from exc
+    except OSError as exc:
+        raise StravaError(f"Token refresh failed: {exc}") from exc
+
+
+def fetch_athlete_id(access_token: str, budget: Optional[RateLimitBudget] = None) -> str:
+    """The Strava athlete id behind `access_token` (GET /athlete)."""
+    config = current_app.config
+    budget = budget or RateLimitBudget(max_wait=config['STRAVA_RATE_LIMIT_MAX_WAIT'])
+    client = StravaClient(access_token, config['STRAVA_API_URL'], budget, config['STRAVA_TIMEOUT'])
+    return str(asyncio.run(client.athlete())["id"])
+
+
+def ensure_access_token(connection: ProviderConnection) -> str:
+    """Return a usable access token, refreshing (and committing) it if it is about to expire."""
+    if connection.expires_at is None or connection.expires_at > time.time() + TOKEN_LEEWAY:
+        return connection.access_token
+    if not connection.refresh_token:
+        raise StravaAuthError("Access token expired and there is no refresh token")
+    provider = current_app.config['OAUTH2_PROVIDERS'][PROVIDER]
+    payload = _post_form(current_app.config['STRAVA_TOKEN_URL'], {
+        "client_id": provider["client_id"],
+        "client_secret": provider["client_secret"],
+        "grant_type": "refresh_token",
+        "refresh_token": connection.refresh_token,
+    }, current_app.config['STRAVA_TIMEOUT'])
+    connection.access_token = payload["access_token"]
+    connection.refresh_token = payload.get("refresh_token") or connection.refresh_token
+    connection.expires_at = payload.get("expires_at")
+    db.session.commit()
+    return connection.access_token
+
+
+# Writes
+
+_EXISTING_COLUMNS = (
+    Activity.id, Activity.external_id, Activity.user_id, Activity.category_id,
+    Activity.complete, Activity.distance, Activity.duration, Activity.date,
+)
+
+
+def _existing_activities(user_id: int, source: str, external_ids: Iterable[str]) -> Dict[str, object]:
+    """Stored rows for these external ids, locked until commit (FOR UPDATE on Postgres)."""
+    return {
+        row.external_id: row
+        for row in db.session.execute(
+            select(*_EXISTING_COLUMNS).where(
+                Activity.user_id == user_id,
+                Activity.external_source == source,
+                Activity.external_id.in_(list(external_ids)),
+            ).with_for_update()
+        )
+    }
+
+
+def _insert_new(rows: List[dict]) -> set:
+    """Insert rows, skipping any whose external id a concurrent writer stored first.
+
+    Returns the external ids actually inserted.
+    """
+    table = Activity.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        db.session.execute(insert(table), rows)
+        return {row["external_id"] for row in rows}
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = (
+        dialect_insert(table)
+        .on_conflict_do_nothing(index_elements=[table.c.user_id, table.c.external_source, table.c.external_id])
+        .returning(table.c.external_id)
+    )
+    return set(db.session.scalars(stmt, rows))
+
+
+def upsert_external_activities(user_id: int, source: str, rows: Iterable[dict]) -> Tuple[int, int]:
+    """Insert or update provider activities for one user; returns (inserted, updated).
+
+    `rows` are Activity column dicts carrying `external_id`. Existing rows are
+    looked up (and locked) in one query, so rollups get the exact net change.
+    New rows go out as one INSERT ... ON CONFLICT (user_id, external_source,
+    external_id) DO NOTHING. A row another writer (e.g. the webhook worker)
+    inserted meanwhile is then updated like any existing row, rather than
+    overwritten by the upsert with its old values unknown. Does not commit.
+    """
+    by_external_id = {
+        row["external_id"]: dict(row, user_id=user_id, external_source=source) for row in rows
+    }
+    if not by_external_id:
+        return 0, 0
+    existing = _existing_activities(user_id, source, by_external_id)
+    inserts = [row for external_id, row in by_external_id.items() if external_id not in existing]
+    inserted = _insert_new(inserts) if inserts else set()
+    raced = [row["external_id"] for row in inserts if row["external_id"] not in inserted]
+    if raced:
+        existing.update(_existing_activities(user_id, source, raced))
+
+    delta = RollupDelta()
+    updates = []
+    for external_id, row in by_external_id.items():
+        if external_id in inserted:
+            delta.add(row)
+            continue
+        old = existing[external_id]
+        delta.add(old, -1).add(row)
+        updates.append(dict(row, id=old.id))
+    if updates:
+        db.session.execute(update(Activity), updates)
+    delta.apply()
+    bump_data_version(user_id)
+    return len(inserted), len(updates)
+
+
+def delete_external_activities(user_id: int, source: str, external_ids: Iterable[str]) -> int:
+    """Delete provider activities for one user, keeping rollups in step; does not commit."""
+    ids = list(external_ids)
+    if not ids:
+        return 0
+    rows = list(_existing_activities(user_id, source, ids).values())
+    if not rows:
+        return 0
+    RollupDelta().add_all(rows, -1).apply()
+    db.session.execute(delete(Activity).where(Activity.id.in_([row.id for row in rows])))
+    bump_data_version(user_id)
+    return len(rows)
+
+
+# Sync
+
+class SyncResult:
+    """Counters for one connection's sync."""
+
+    def __init__(self):
+        self.pages = 0
+        self.fetched = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+
+def _epoch(value: str) -> int:
+    stamp = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return int(stamp.timestamp())
+
+
+def _write_page(connection: ProviderConnection, mapper: RowMapper, items: List[dict], result: SyncResult) -> None:
+    rows = []
+    mark = connection.synced_until
+    for item in items:
+        if item.get("start_date"):
+            mark = max(mark, _epoch(item["start_date"]))
+        try:
+            rows.append(mapper.from_strava(item))
+        except (ImportRowError, KeyError, TypeError, ValueError):
+            result.skipped += 1
+    inserted, updated = upsert_external_activities(connection.user_id, PROVIDER, rows)
+    connection.synced_until = mark
+    db.session.commit()
+    result.pages += 1
+    result.fetched += len(items)
+    result.inserted += inserted
+    result.updated += updated
+
+
+def sync_connection(
+    connection: ProviderConnection,
+    budget: Optional[RateLimitBudget] = None,
+    concurrency: Optional[int] = None,
+    per_page: Optional[int] = None,
+    default_category: Optional[str] = None,
+    on_page: Optional[Callable[[SyncResult], None]] = None,
+) -> SyncResult:
+    """Pull activities newer than the connection's mark into its user's history.
+
+    Each page is committed with the advanced mark. Settings default to the
+    app's STRAVA_* config. Raises StravaRateLimited, StravaAuthError or
+    StravaError; everything committed before that stays.
+    """
+    config = current_app.config
+    budget = budget or RateLimitBudget(max_wait=config['STRAVA_RATE_LIMIT_MAX_WAIT'])
+    concurrency = max(1, concurrency or config['STRAVA_SYNC_CONCURRENCY'])
+    per_page = max(1, min(MAX_PAGE_SIZE, per_page or config['STRAVA_PAGE_SIZE']))
+    mapper = RowMapper(connection.user_id, default_category or config['STRAVA_DEFAULT_CATEGORY'])
+    client = StravaClient(ensure_access_token(connection), config['STRAVA_API_URL'], budget, config['STRAVA_TIMEOUT'])
+    result = SyncResult()
+
+    async def run():
+        if not connection.athlete_id:
+            # Webhook events are matched to connections by athlete id
+            connection.athlete_id = str((await client.athlete())["id"])
+        pages = iter_activity_pages(client, connection.synced_until, per_page, concurrency)
+        try:
+            async for items in pages:
+                _write_page(connection, mapper, items, result)
+                if on_page:
+                    on_page(result)
+        finally:
+            await pages.aclose()
+
+    try:
+        asyncio.run(run())
+    except Exception:
+        db.session.rollback()
+        raise
+    connection.last_synced_at = db.func.now()
+    db.session.commit()
+    return result
+
+
+def connections(user_ids: Optional[Iterable[int]] = None) -> List[ProviderConnection]:
+    """Strava connections, optionally only those of `user_ids`, oldest sync first."""
+    stmt = select(ProviderConnection).where(ProviderConnection.provider == PROVIDER)
+    if user_ids is not None:
+        stmt = stmt.where(ProviderConnection.user_id.in_(list(user_ids)))
+    stmt = stmt.order_by(ProviderConnection.last_synced_at.is_not(None), ProviderConnection.last_synced_at)
+    return list(db.session.scalars(stmt))
+
+
+# Webhook events
+
+class EventBatchResult:
+    """Outcome of `apply_events`, grouped the way the queue needs it."""
+
+    def __init__(self):
+        self.done: List[QueuedEvent] = []
+        # (events, error) to retry with backoff
+        self.failed: List[Tuple[List[QueuedEvent], str]] = []
+        # Events put back untouched until the rate limit resets at `retry_at`
+        self.deferred: List[QueuedEvent] = []
+        self.retry_at: Optional[float] = None
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+
+    def defer(self, events: List[QueuedEvent], exc: StravaRateLimited) -> None:
+        self.deferred.extend(events)
+        self.retry_at = max(self.retry_at or 0, exc.retry_at)
+
+
+async def _fetch_all(requests: List[Tuple[StravaClient, str]], concurrency: int) -> list:
+    """Fetch activities by id, at most `concurrency` at a time; exceptions are returned in place."""
+    gate = asyncio.Semaphore(concurrency)
+
+    async def fetch(client: StravaClient, activity_id: str):
+        async with gate:
+            return await client.activity(activity_id)
+
+    return await asyncio.gather(*(fetch(c, i) for c, i in requests), return_exceptions=True)
+
+
+def apply_events(
+    events: List[QueuedEvent],
+    budget: RateLimitBudget,
+    concurrency: Optional[int] = None,
+    default_category: Optional[str] = None,
+) -> EventBatchResult:
+    """Apply a batch of Strava webhook events to the connected users' activities.
+
+    Deletions need no API call. Creates and updates fetch the activity, every
+    fetch of the batch running concurrently. Each user's changes are written
+    in bulk and committed separately, so one failing user does not hold
+    back the others. Events of athletes without a connection are dropped; a
+    deauthorization removes the connection and keeps the synced activities.
+    """
+    config = current_app.config
+    concurrency = max(1, concurrency or config['STRAVA_SYNC_CONCURRENCY'])
+    result = EventBatchResult()
+
+    by_owner: Dict[str, List[QueuedEvent]] = {}
+    for event in events:
+        by_owner.setdefault(event.owner_id, []).append(event)
+    owned = {
+        conn.athlete_id: conn
+        for conn in db.session.scalars(
+            select(ProviderConnection).where(
+                ProviderConnection.provider == PROVIDER,
+                ProviderConnection.athlete_id.in_(list(by_owner)),
+            )
+        )
+    }
+
+    # Resolve connections and decide which activities need fetching
+    plans = []  # (connection, activity events)
+    fetches: List[Tuple[StravaClient, str]] = []
+    keys: List[Tuple[ProviderConnection, str]] = []
+    for owner_id, owner_events in by_owner.items():
+        connection = owned.get(owner_id)
+        if connection is None:
+            result.done.extend(owner_events)
+            continue
+        if any(e.object_type == "athlete" and str(e.updates.get("authorized")).lower() == "false"
+               for e in owner_events):
+            db.session.delete(connection)
+            db.session.commit()
+            result.done.extend(owner_events)
+            continue
+        activity_events = [e for e in owner_events if e.object_type == "activity"]
+        result.done.extend(e for e in owner_events if e.object_type != "activity")
+        if not any(e.action != DELETE for e in activity_events):
+            plans.append((connection, activity_events))
+            continue
+        try:
+            client = StravaClient(ensure_access_token(connection), config['STRAVA_API_URL'], budget,
+                                  config['STRAVA_TIMEOUT'])
+        except StravaRateLimited as exc:
+            result.defer(activity_events, exc)
+            continue
+        except StravaError as exc:
+            db.session.rollback()
+            result.failed.append((activity_events, str(exc)))
+            continue
+        plans.append((connection, activity_events))
+        for event in activity_events:
+            if event.action != DELETE:
+                fetches.append((client, event.object_id))
+                keys.append((connection, event.object_id))
+
+    responses = asyncio.run(_fetch_all(fetches, concurrency)) if fetches else []
+    fetched = {(conn.id, activity_id): response for (conn, activity_id), response in zip(keys, responses)}
+
+    for connection, activity_events in plans:
+        mapper = RowMapper(connection.user_id, default_category or config['STRAVA_DEFAULT_CATEGORY'])
+        rows, removed, applied = [], [], []
+        for event in activity_events:
+            if event.action == DELETE:
+                removed.append(event.object_id)
+                applied.append(event)
+                continue
+            item = fetched[(connection.id, event.object_id)]
+            if isinstance(item, StravaNotFound):
+                removed.append(event.object_id)
+            elif isinstance(item, StravaRateLimited):
+                result.defer([event], item)
+                continue
+            elif isinstance(item, BaseException):
+                result.failed.append(([event], str(item) or type(item).__name__))
+                continue
+            else:
+                try:
+                    rows.append(mapper.from_strava(item))
+                except (ImportRowError, KeyError, TypeError, ValueError):
+                    pass  # unmappable (e.g. unknown sport type): nothing to store
+            applied.append(event)
+        try:
+            result.deleted += delete_external_activities(connection.user_id, PROVIDER, removed)
+            inserted, updated = upsert_external_activities(connection.user_id, PROVIDER, rows)
+            db.session.commit()
+        except Exception as exc:
+            db.session.rollback()
+            result.failed.append((applied, str(exc)[:500]))
+            continue
+        result.inserted += inserted
+        result.updated += updated
+        result.done.extend(applied)
+    return result
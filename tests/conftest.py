@@ -0,0 +1,86 @@
+"""Fixtures: a fresh app on a scratch SQLite database per test.
+
+Run from the repository root with `python -m pytest`.
+"""
+import pytest
+from sqlalchemy import insert
+
+from ..app import create_app
+from ..auth import create_access_token, principal_cache, token_generations
+from ..db_routing import REPLICA_BIND, recent_writers
+from ..models import db, ActivityCategory, User
+
+
+CATEGORIES = ("Run", "Bike", "Swim", "Weight Training", "Yoga")
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(
+        "testing",
+        DATABASE_URL=f"sqlite:///{tmp_path / 'test.db'}",
+        SECRET_KEY="test-secret",
+        WEBHOOK_QUEUE_PATH=str(tmp_path / "webhook_queue.db"),
+    )
+    with app.app_context():
+        # Only the default bind: an earlier app may have registered the replica's
+        db.create_all(bind_key=None)
+        db.session.add_all(ActivityCategory(name=name) for name in CATEGORIES)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    _clear_process_caches()
+
+
+def _clear_process_caches():
+    # Process-wide caches are keyed by user id, which every test database reuses
+    principal_cache.clear()
+    token_generations.clear()
+    recent_writers.clear()
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """App whose primary and replica are two SQLite files that do not replicate.
+
+    Both start with the schema and categories; anything written later exists
+    only on the primary unless a test copies it, so reads show which one served them.
+    """
+    app = create_app(
+        "testing",
+        DATABASE_URL=f"sqlite:///{tmp_path / 'primary.db'}",
+        DATABASE_READ_URL=f"sqlite:///{tmp_path / 'replica.db'}",
+        SECRET_KEY="test-secret",
+        WEBHOOK_QUEUE_PATH=str(tmp_path / "webhook_queue.db"),
+    )
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.metadata.create_all(db.engines[REPLICA_BIND])
+        for engine in (db.engine, db.engines[REPLICA_BIND]):
+            with engine.begin() as conn:
+                conn.execute(insert(ActivityCategory), [{"name": name} for name in CATEGORIES])
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    _clear_process_caches()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """make_user(email) -> (user id, Authorization headers)."""
+    def make(email: str = "athlete@example.com", password: str = "password123"):
+        with app.app_context():
+            user = User.signup(email=email, password=password, first_name="Test", last_name="User")
+            db.session.commit()
+            return user.id, {"Authorization": f"Bearer {create_access_token(user)}"}
+
+    return make
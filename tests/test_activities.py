@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+from datetime import date, time
+
+import pytest
+from sqlalchemy import event, func, insert, select
+
+from ..models import db, Activity
+
+
+def _seed(user_id: int, count: int) -> None:
+    db.session.execute(insert(Activity), [
+        {
+            "title": f"Session {i}", "category_id": i % 5 + 1, "distance": 5.0, "duration": time(0, 30),
+            "time": time(7), "date": date(2024, 1, 1 + i % 28), "notes": "Easy", "complete": i % 2 == 0,
+            "user_id": user_id,
+        }
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+@pytest.mark.parametrize("extra", ["", "&cursor="])
+def test_listing_query_count_does_not_grow_with_page_size(app, client, make_user, extra):
+    user_id, headers = make_user()
+    with app.app_context():
+        _seed(user_id, 120)
+        engine = db.engine
+
+    # Warm the connection pool and the cached user so both timed requests start alike
+    assert client.get("/me/activities?limit=1", headers=headers).status_code == 200
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        counts = {}
+        for limit in (1, 100):
+            statements.clear()
+            response = client.get(f"/me/activities?limit={limit}{extra}", headers=headers)
+            assert response.status_code == 200
+            assert response.get_json()["count"] == limit
+            counts[limit] = len(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert counts[1] == counts[100], counts
+
+
+VALID = {"title": "Run", "category": "Run", "distance": 5, "duration": "00:30:00", "time": "07:00:00"}
+
+
+@pytest.mark.parametrize("atomic", ["false", "true", 0, 1, None, []])
+def test_batch_rejects_a_non_boolean_atomic(app, client, make_user, atomic):
+    _, headers = make_user()
+    response = client.post("/me/activities/batch", headers=headers, json={"activities": [VALID], "atomic": atomic})
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "atomic must be a boolean"
+    with app.app_context():
+        assert db.session.scalar(select(func.count()).select_from(Activity)) == 0
+
+
+def test_batch_atomic_rejects_the_whole_batch(client, make_user):
+    _, headers = make_user()
+    body = {"activities": [VALID, {"title": "No category"}], "atomic": True}
+    response = client.post("/me/activities/batch", headers=headers, json=body)
+    assert response.status_code == 400
+    assert [r["status"] for r in response.get_json()["results"]] == ["skipped", "error"]
+    body["atomic"] = False
+    response = client.post("/me/activities/batch", headers=headers, json=body)
+    assert [r["status"] for r in response.get_json()["results"]] == ["created", "error"]
+
+
+def _page_through(client, headers, limit, cursor=""):
+    """Ids on each page, following next_cursor from `cursor` to the end."""
+    pages = []
+    while cursor is not None:
+        body = client.get(f"/me/activities?limit={limit}&cursor={cursor}", headers=headers).get_json()
+        pages.append([a["id"] for a in body["activities"]])
+        cursor = body["next_cursor"]
+    return pages
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "djI6NQ", "djE6YWJj", "djE6"])
+def test_listing_rejects_a_malformed_cursor(client, make_user, cursor):
+    # The last three decode to "v2:5", "v1:abc" and "v1:"
+    _, headers = make_user()
+    response = client.get(f"/me/activities?cursor={cursor}", headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("count, sizes", [(7, [3, 3, 1]), (6, [3, 3]), (0, [0])])
+def test_cursor_pages_end_without_a_next_cursor(app, client, make_user, count, sizes):
+    user_id, headers = make_user()
+    if count:
+        with app.app_context():
+            _seed(user_id, count)
+    pages = _page_through(client, headers, 3)
+    assert [len(page) for page in pages] == sizes
+
+
+def test_cursor_order_is_stable_across_identical_rows(app, client, make_user):
+    user_id, headers = make_user()
+    other_id, _ = make_user("other@example.com")
+    with app.app_context():
+        # Same date, time and category throughout, so only the id orders them
+        db.session.execute(insert(Activity), [
+            {"title": "Same", "category_id": 1, "distance": 5.0, "duration": time(0, 30), "time": time(7),
+             "date": date(2024, 1, 1), "complete": True, "user_id": owner}
+            for owner in [user_id, other_id] * 10
+        ])
+        db.session.commit()
+        expected = db.session.scalars(
+            select(Activity.id).where(Activity.user_id == user_id).order_by(Activity.id.desc())
+        ).all()
+
+    pages = _page_through(client, headers, 4)
+    assert [id_ for page in pages for id_ in page] == expected
+
+    # A row logged mid-way sorts before the cursor, so later pages neither repeat nor skip rows
+    first = client.get("/me/activities?limit=4&cursor=", headers=headers).get_json()
+    assert client.post("/me/activities", headers=headers, json=VALID).status_code == 201
+    rest = _page_through(client, headers, 4, first["next_cursor"])
+    assert [a["id"] for a in first["activities"]] + [id_ for page in rest for id_ in page] == expected
+
+
+
+@pytest.mark.parametrize("fmt, mimetype", [("ndjson", "application/x-ndjson"), ("csv", "text/csv")])
+def test_export_streams_every_partition_of_the_callers_rows(app, client, make_user, fmt, mimetype):
+    user_id, headers = make_user()
+    other_id, _ = make_user("other@example.com")
+    app.config["EXPORT_CHUNK_SIZE"] = 10
+    with app.app_context():
+        _seed(user_id, 25)
+        _seed(other_id, 5)
+
+    response = client.get(f"/me/activities/export?format={fmt}", headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    assert response.headers["Content-Disposition"] == f'attachment; filename="activities.{fmt}"'
+
+    if fmt == "csv":
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    else:
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(rows) == 25
+    assert {int(row["user_id"]) for row in rows} == {user_id}
+    assert [int(row["id"]) for row in rows] == sorted(int(row["id"]) for row in rows)
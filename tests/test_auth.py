@@ -0,0 +1,67 @@
+import jwt
+import pytest
+
+
+def _bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _login(client, password="password123") -> dict:
+    response = client.post("/login", json={"email": "athlete@example.com", "password": password})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def _change_password(client, headers, new="newpassword456"):
+    response = client.patch("/me/password", headers=headers, json={
+        "current_password": "password123", "new_password": new,
+    })
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+@pytest.fixture
+def v1_token(app):
+    return jwt.encode({"email": "athlete@example.com"}, app.config["SECRET_KEY"], algorithm="HS256")
+
+
+def test_password_change_revokes_earlier_tokens(client, make_user, v1_token):
+    _, headers = make_user()
+    tokens = _login(client)
+    assert client.get("/me", headers=_bearer(v1_token)).status_code == 200
+
+    fresh = _change_password(client, headers)
+
+    for token in (headers["Authorization"][7:], tokens["token"], v1_token):
+        assert client.get("/me", headers=_bearer(token)).status_code == 401
+    assert client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    assert client.get("/me", headers=_bearer(fresh["token"])).status_code == 200
+
+
+def test_legacy_tokens_stay_revoked_after_a_cache_reset(app, client, make_user, v1_token):
+    from ..auth import principal_cache, token_generations
+
+    _, headers = make_user()
+    _change_password(client, headers)
+    # A worker that never saw the revocation still reads the user's generation
+    principal_cache.clear()
+    token_generations.clear()
+    assert client.get("/me", headers=_bearer(v1_token)).status_code == 401
+
+
+def test_refresh_rotates_the_token_pair(client, make_user):
+    make_user()
+    tokens = _login(client)
+    response = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    rotated = response.get_json()
+    assert set(rotated) == {"token", "refresh_token"}
+    assert client.get("/me", headers=_bearer(rotated["token"])).status_code == 200
+    assert client.post("/token/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 200
+
+
+def test_token_types_are_not_interchangeable(client, make_user):
+    make_user()
+    tokens = _login(client)
+    assert client.post("/token/refresh", json={"refresh_token": tokens["token"]}).status_code == 401
+    assert client.get("/me", headers=_bearer(tokens["refresh_token"])).status_code == 401
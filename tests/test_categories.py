@@ -0,0 +1,83 @@
+import pytest
+
+from ..models import db, ActivityCategory
+
+
+@pytest.fixture
+def categories(app):
+    with app.app_context():
+        db.session.add_all(ActivityCategory(name=name) for name in ("Trail Run", "Brunch Walk", "Running Drills"))
+        db.session.commit()
+
+
+def _names(client, **params):
+    response = client.get("/activity-categories", query_string=params)
+    assert response.status_code == 200
+    return [c["name"] for c in response.get_json()["categories"]]
+
+
+def test_q_returns_every_substring_match_by_name(client, categories):
+    assert _names(client, q="run") == ["Brunch Walk", "Run", "Running Drills", "Trail Run"]
+    assert _names(client, q="RUN") == _names(client, q="run")
+    assert _names(client, q="xyz") == []
+
+
+def test_q_with_limit_autocompletes(client, categories):
+    assert _names(client, q="run", limit=3) == ["Run", "Running Drills", "Trail Run"]
+    assert _names(client, q="run", limit=10) == ["Run", "Running Drills", "Trail Run", "Brunch Walk"]
+
+
+def test_limit_alone_truncates_the_full_list(client, categories):
+    assert _names(client, limit=2) == ["Bike", "Brunch Walk"]
+
+
+def test_committed_category_reaches_lookups_and_autocomplete(app, client, make_user):
+    from ..category_registry import category_registry
+
+    before = client.get("/activity-categories")
+    with app.app_context():
+        assert category_registry.find("Kayaking") is None
+        assert _names(client, q="kay", limit=5) == []  # builds the autocomplete index
+
+        db.session.add(ActivityCategory(name="Kayaking"))
+        db.session.commit()
+
+        ref = category_registry.find("kayaking")
+        assert ref is not None and ref.name == "Kayaking"
+        assert category_registry.complete("kay") == [ref]
+    assert _names(client, q="kay", limit=5) == ["Kayaking"]
+    assert client.get("/activity-categories").headers["ETag"] != before.headers["ETag"]
+
+    # Write paths resolve the new name too
+    _, headers = make_user()
+    response = client.post("/me/activities", headers=headers, json={
+        "title": "Paddle", "category": "Kayaking", "distance": 4, "duration": "01:00:00", "time": "09:00:00",
+    })
+    assert response.status_code == 201, response.get_json()
+
+
+def test_rolled_back_category_never_appears(app):
+    from ..category_registry import category_registry
+
+    with app.app_context():
+        category_registry.all()
+        db.session.add(ActivityCategory(name="Canoe"))
+        db.session.flush()
+        db.session.rollback()
+        assert category_registry.complete("can") == []
+        assert category_registry.find("Canoe") is None
+
+
+def test_category_added_by_another_process_is_found_after_a_miss(app):
+    from sqlalchemy import insert
+
+    from ..category_registry import category_registry
+
+    with app.app_context():
+        category_registry.all()
+        # Written outside this process's session, so no invalidation event fires
+        with db.engine.begin() as conn:
+            conn.execute(insert(ActivityCategory), [{"name": "Climbing"}])
+        category_registry._loaded_at -= category_registry.miss_refresh_interval
+        assert category_registry.find("climbing").name == "Climbing"
+        assert [ref.name for ref in category_registry.complete("clim")] == ["Climbing"]
@@ -0,0 +1,85 @@
+"""Read/write routing between a primary and a replica on two SQLite files."""
+from datetime import date, time
+
+from flask import g
+from sqlalchemy import func, insert, select
+
+from ..auth import create_access_token
+from ..db_routing import REPLICA_BIND, primary, read_only
+from ..models import db, Activity, User
+
+
+def _activity(user_id: int, title: str) -> dict:
+    return {
+        "title": title, "category_id": 1, "distance": 5.0, "duration": time(0, 30), "time": time(7),
+        "date": date(2024, 3, 4), "complete": True, "user_id": user_id,
+    }
+
+
+def _setup(app):
+    """A user on both databases, with one activity that only each database has."""
+    with app.app_context():
+        user = User.signup(email="athlete@example.com", password="password123", first_name="A", last_name="B")
+        db.session.commit()
+        row = {c.key: getattr(user, c.key) for c in User.__table__.columns}
+        with db.engines[REPLICA_BIND].begin() as conn:
+            conn.execute(insert(User), [row])
+            conn.execute(insert(Activity), [_activity(user.id, "On the replica")])
+        db.session.execute(insert(Activity), [_activity(user.id, "On the primary")])
+        db.session.commit()
+        return user.id, {"Authorization": f"Bearer {create_access_token(user)}"}
+
+
+def _titles(client, headers):
+    response = client.get("/me/activities", headers=headers)
+    assert response.status_code == 200
+    return [a["title"] for a in response.get_json()["activities"]]
+
+
+def _count(engine, user_id: int) -> int:
+    with engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(Activity).where(Activity.user_id == user_id))
+
+
+def test_read_only_gets_use_the_replica(replica_app):
+    _, headers = _setup(replica_app)
+    assert _titles(replica_app.test_client(), headers) == ["On the replica"]
+
+
+def test_writes_go_to_the_primary_and_later_reads_follow(replica_app):
+    user_id, headers = _setup(replica_app)
+    client = replica_app.test_client()
+    response = client.post("/me/activities", headers=headers, json={
+        "title": "New", "category": "Run", "distance": 3, "duration": "00:20:00", "time": "08:00:00",
+    })
+    assert response.status_code == 201
+    with replica_app.app_context():
+        assert (_count(db.engine, user_id), _count(db.engines[REPLICA_BIND], user_id)) == (2, 1)
+    # The writer reads its own write from the primary until the replica can have caught up
+    assert _titles(client, headers) == ["New", "On the primary"]
+
+
+def test_primary_blocks_and_writes_within_a_read_only_request(replica_app):
+    user_id, _ = _setup(replica_app)
+    titles = select(Activity.title).where(Activity.user_id == user_id).order_by(Activity.id)
+
+    @read_only
+    def view():
+        g.current_user = db.session.get(User, user_id)
+        seen = {"replica": db.session.scalars(titles).all()}
+        with primary():
+            seen["primary()"] = db.session.scalars(titles).all()
+        db.session.add(Activity(**_activity(user_id, "Written mid-request")))
+        db.session.commit()
+        seen["after commit"] = db.session.scalars(titles).all()
+        return seen
+
+    with replica_app.test_request_context():
+        seen = view()
+        assert _count(db.engines[REPLICA_BIND], user_id) == 1
+
+    assert seen == {
+        "replica": ["On the replica"],
+        "primary()": ["On the primary"],
+        "after commit": ["On the primary", "Written mid-request"],
+    }
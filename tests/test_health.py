@@ -0,0 +1,35 @@
+from ..health import prober
+from ..models import db
+
+
+def test_first_poll_of_a_fresh_app_is_healthy(client):
+    # No request has run yet: the factory's synchronous probe already answered
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.get_json()["db"] == "ok"
+    assert client.get("/health/ready").status_code == 200
+    assert client.get("/health/live").status_code == 200
+
+
+def test_prober_thread_runs_from_app_creation(app):
+    assert prober._target[0] is app
+    assert prober._thread.is_alive()
+
+
+def test_prober_restarts_in_a_forked_child(app):
+    inherited = prober._thread
+    inherited_stop = prober._stop
+    prober._after_fork()
+    inherited_stop.set()
+    assert prober._thread is not inherited
+    assert prober._thread.is_alive()
+
+
+def test_unreachable_database_is_reported(app, client, tmp_path):
+    with app.app_context():
+        db.engine.dispose()
+    (tmp_path / "test.db").unlink()
+    (tmp_path / "test.db").mkdir()  # a directory cannot be opened as a database
+    response = client.get("/health?deep=1")
+    assert response.status_code == 503
+    assert response.get_json()["db"] == "unavailable"
@@ -0,0 +1,41 @@
+import io
+
+from sqlalchemy import select
+
+from ..models import db, Activity
+
+
+def _track(name: str, *points: str) -> str:
+    return f"<trk><name>{name}</name><type>Run</type><trkseg>{''.join(points)}</trkseg></trk>"
+
+
+def _point(lat="52.0", lon="4.0", time="2024-03-01T07:00:00Z") -> str:
+    attrs = "".join(f' {key}="{value}"' for key, value in (("lat", lat), ("lon", lon)) if value is not None)
+    return f"<trkpt{attrs}><time>{time}</time></trkpt>"
+
+
+def _upload(client, headers, gpx: str):
+    document = f'<?xml version="1.0"?><gpx xmlns="http://www.topografix.com/GPX/1/1">{gpx}</gpx>'
+    return client.post(
+        "/me/activities/import",
+        headers=headers,
+        data={"file": (io.BytesIO(document.encode()), "tracks.gpx")},
+        content_type="multipart/form-data",
+    )
+
+
+def test_gpx_tracks_with_bad_points_are_skipped(app, client, make_user):
+    _, headers = make_user()
+    response = _upload(client, headers, "".join((
+        _track("No longitude", _point(), _point(lon=None, time="2024-03-01T07:10:00Z")),
+        _track("Bad time", _point(time="yesterday")),
+        _track("Good", _point(), _point(lat="52.01", time="2024-03-01T07:05:00Z")),
+    )))
+
+    assert response.status_code == 201, response.get_json()
+    job = response.get_json()["activity_import"]
+    assert (job["status"], job["rows_processed"], job["rows_imported"], job["rows_skipped"]) == (
+        "completed", 3, 1, 2,
+    )
+    with app.app_context():
+        assert db.session.scalars(select(Activity.title)).all() == ["Good"]
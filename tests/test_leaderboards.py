@@ -0,0 +1,152 @@
+import threading
+from datetime import time
+
+from sqlalchemy import insert, select
+
+from ..auth import create_access_token
+from ..leaderboards import Leaderboards, leaderboards, rebuild_leaderboards, week_start
+from ..models import db, Activity, LeaderboardEntry, User
+
+
+def _log(client, headers, distance, day=None, category="Run"):
+    body = {"title": "Run", "category": category, "distance": distance,
+            "duration": "00:30:00", "time": "07:00:00"}
+    if day:
+        body["date"] = day
+    response = client.post("/me/activities", headers=headers, json=body)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()["activity"]
+
+
+def test_ranks_users_by_weekly_distance(client, make_user):
+    first, first_headers = make_user("first@example.com")
+    second, second_headers = make_user("second@example.com")
+    third, third_headers = make_user("third@example.com")
+    _log(client, first_headers, 5)
+    _log(client, second_headers, 7)
+    _log(client, third_headers, 5)
+
+    body = client.get("/leaderboards/1", headers=first_headers).get_json()
+    assert body["week_start"] == week_start().isoformat()
+    assert body["participants"] == 3
+    assert [(e["rank"], e["user_id"]) for e in body["entries"]] == [(1, second), (2, first), (2, third)]
+    assert body["me"]["rank"] == 2
+    # No names or other profile fields of other users
+    assert set(body["entries"][0]) == {"rank", "user_id", "total_distance", "activity_count"}
+
+    me = client.get("/me/leaderboards/1", headers=third_headers).get_json()["me"]
+    assert (me["rank"], me["total_distance"], me["activity_count"]) == (2, 5.0, 1)
+
+
+def test_updates_and_deletes_move_entries(client, make_user):
+    user_id, headers = make_user()
+    activity = _log(client, headers, 5)
+    client.patch(f"/me/activities/{activity['id']}", headers=headers, json={"distance": 8})
+    assert client.get("/me/leaderboards/1", headers=headers).get_json()["me"]["total_distance"] == 8.0
+
+    client.patch(f"/me/activities/{activity['id']}", headers=headers, json={"date": "2024-01-03"})
+    assert client.get("/me/leaderboards/1", headers=headers).get_json()["me"] is None
+    old = client.get("/me/leaderboards/1?week=2024-01-07", headers=headers).get_json()
+    assert old["week_start"] == "2024-01-01" and old["me"]["total_distance"] == 8.0
+
+    client.delete(f"/me/activities/{activity['id']}", headers=headers)
+    assert client.get("/me/leaderboards/1?week=2024-01-01", headers=headers).get_json()["participants"] == 0
+
+
+def test_undated_activities_stay_off_the_boards(app, client, make_user):
+    user_id, headers = make_user()
+    with app.app_context():
+        # As left by the migration: activities logged before dates were recorded
+        activity_id = db.session.scalar(insert(Activity).returning(Activity.id), {
+            "title": "Old run", "category_id": 1, "distance": 12.0, "duration": time(1),
+            "time": time(7), "complete": True, "user_id": user_id,
+        })
+        db.session.commit()
+        assert rebuild_leaderboards() == 0
+
+    response = client.get(f"/me/activities/{activity_id}", headers=headers)
+    assert response.get_json()["activity"]["date"] is None
+    assert client.get("/me/leaderboards/1", headers=headers).get_json()["me"] is None
+
+    # Editing other fields keeps it off; giving it a date puts it on
+    client.patch(f"/me/activities/{activity_id}", headers=headers, json={"distance": 10})
+    assert client.get("/me/leaderboards/1", headers=headers).get_json()["me"] is None
+    client.patch(f"/me/activities/{activity_id}", headers=headers, json={"date": week_start().isoformat()})
+    assert client.get("/me/leaderboards/1", headers=headers).get_json()["me"]["total_distance"] == 10.0
+
+    client.delete(f"/me/activities/{activity_id}", headers=headers)
+    with app.app_context():
+        assert db.session.scalars(select(LeaderboardEntry)).all() == []
+
+
+def test_boards_load_from_the_primary(replica_app):
+    app = replica_app
+    client = app.test_client()
+    with app.app_context():
+        users = [User.signup(email=f"u{i}@example.com", password="password123", first_name="U", last_name=str(i))
+                 for i in range(2)]
+        db.session.commit()
+        writer, reader = ({"Authorization": f"Bearer {create_access_token(u)}"} for u in users)
+
+    _log(client, writer, 5)
+    # The reader has not written, so its read-only request may use the replica
+    body = client.get("/leaderboards/1", headers=reader).get_json()
+    assert body["participants"] == 1
+
+
+def _stall_loads(monkeypatch, category_id):
+    """Make loads of `category_id`'s board wait after querying until released."""
+    loaded, release = threading.Event(), threading.Event()
+    load = Leaderboards._load
+
+    def stalled(self, key):
+        board = load(self, key)
+        if key[0] == category_id:
+            loaded.set()
+            assert release.wait(5)
+        return board
+
+    monkeypatch.setattr(Leaderboards, "_load", stalled)
+    return loaded, release
+
+
+def _load_in_thread(app, category_id):
+    result = {}
+
+    def run():
+        with app.app_context():
+            result["participants"] = leaderboards.top(category_id, week_start())[1]
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+
+def test_a_loading_board_does_not_block_other_boards(app, client, make_user, monkeypatch):
+    _, headers = make_user()
+    _log(client, headers, 5, category="Bike")
+    loaded, release = _stall_loads(monkeypatch, 1)
+    loading, _ = _load_in_thread(app, 1)
+    try:
+        assert loaded.wait(5)
+        reading, result = _load_in_thread(app, 2)
+        reading.join(2)
+        assert result == {"participants": 1}
+    finally:
+        release.set()
+        loading.join(5)
+
+
+def test_a_change_committed_during_a_load_is_not_lost(app, client, make_user, monkeypatch):
+    _, headers = make_user()
+    loaded, release = _stall_loads(monkeypatch, 1)
+    thread, result = _load_in_thread(app, 1)
+    assert loaded.wait(5)
+    # Commits after the load queried, before it publishes its board
+    _log(client, headers, 5)
+    release.set()
+    thread.join(5)
+    assert result["participants"] == 0
+
+    monkeypatch.undo()
+    assert client.get("/leaderboards/1", headers=headers).get_json()["participants"] == 1
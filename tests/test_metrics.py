@@ -0,0 +1,36 @@
+import pytest
+
+from ..app import create_app
+
+
+def _metrics_app(tmp_path, profile, **overrides):
+    return create_app(
+        profile,
+        DATABASE_URL=f"sqlite:///{tmp_path / 'test.db'}",
+        SECRET_KEY="test-secret",
+        WEBHOOK_QUEUE_PATH=str(tmp_path / "webhook_queue.db"),
+        METRICS_ENABLED=True,
+        PASSWORD_POOL_WORKERS=0,
+        **overrides,
+    )
+
+
+def test_production_hides_metrics_without_a_token(tmp_path):
+    client = _metrics_app(tmp_path, "production").test_client()
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+
+
+@pytest.mark.parametrize("profile", ["production", "development"])
+def test_metrics_token_is_required_when_set(tmp_path, profile):
+    client = _metrics_app(tmp_path, profile, METRICS_TOKEN="scrape-me").test_client()
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-me"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+
+
+def test_development_serves_metrics_without_a_token(tmp_path):
+    client = _metrics_app(tmp_path, "development", DEBUG_TOOLBAR=False).test_client()
+    assert client.get("/metrics").status_code == 200
@@ -0,0 +1,58 @@
+import os
+import time
+
+import pytest
+
+from ..passwords import PasswordHasher, PasswordPoolSaturated, password_hasher
+
+
+def _crash(*args):
+    os._exit(1)
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, timeout=30, rounds=4)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_broken_pool_is_replaced(hasher):
+    with pytest.raises(PasswordPoolSaturated):
+        hasher._run(_crash)
+    assert hasher.rejected == 1
+
+    # The next call gets a fresh pool and a free slot
+    assert hasher.check(hasher.hash("password123"), "password123")
+
+
+def test_reconfiguring_keeps_in_flight_slots_apart(hasher):
+    hasher.configure(max_pending=1)
+    hasher.hash("warm up the pool")
+    hasher.timeout = 0.1
+    with pytest.raises(PasswordPoolSaturated):
+        hasher._run(time.sleep, 0.5)
+    old = hasher._slots
+
+    # The timed-out sleep is still running when the hasher is reconfigured
+    hasher.configure(max_pending=1)
+    assert hasher._slots.acquire(blocking=False)
+    deadline = time.monotonic() + 5
+    while not old.acquire(blocking=False):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    # Finishing returned its slot to the old semaphore, not the new one
+    assert not hasher._slots.acquire(blocking=False)
+
+
+def test_broken_pool_answers_503(app, client, make_user, monkeypatch):
+    make_user()
+    monkeypatch.setattr(PasswordHasher, "check", lambda self, *args: self._run(_crash))
+    password_hasher.configure(workers=1)
+    try:
+        response = client.post("/login", json={"email": "athlete@example.com", "password": "password123"})
+    finally:
+        password_hasher.configure(workers=app.config["PASSWORD_POOL_WORKERS"])
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
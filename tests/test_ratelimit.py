@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify
+
+from ..app import create_app
+from ..auth import rate_limit
+from ..models import db
+from ..ratelimit import MemoryBackend, SQLiteBackend, limiter
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / "ratelimit.db"))
+
+
+@pytest.fixture
+def enabled_limiter(tmp_path):
+    limiter.configure(backend="sqlite", sqlite_path=str(tmp_path / "limits.db"))
+    yield limiter
+    limiter.configure(enabled=False)
+
+
+def test_backend_limits_and_refunds(backend):
+    results = [backend.hit("k", 2, 60) for _ in range(3)]
+    assert [r.allowed for r in results] == [True, True, False]
+    assert 0 < results[2].retry_after <= 60
+
+    backend.refund("k", results[1].stamp)
+    assert backend.hit("k", 2, 60).allowed
+    assert backend.hit("other", 2, 60).allowed
+
+
+def test_backend_window_slides():
+    now = [1000.0]
+    backend = MemoryBackend(clock=lambda: now[0])
+    assert backend.hit("k", 1, 60).allowed
+    assert not backend.hit("k", 1, 60).allowed
+    now[0] += 60
+    assert backend.hit("k", 1, 60).allowed
+
+
+def test_counted_outcomes_cannot_overshoot_under_concurrency(enabled_limiter):
+    app = Flask(__name__)
+    started = threading.Barrier(8)
+
+    @app.post("/attempt")
+    @rate_limit("attempt", limit=3, period=60, counts=lambda response: response.status_code == 401)
+    def attempt():
+        time.sleep(0.05)
+        return jsonify(message="nope"), 401
+
+    statuses = []
+
+    def call():
+        started.wait()
+        statuses.append(app.test_client().post("/attempt").status_code)
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(statuses) == [401] * 3 + [429] * 5
+
+
+def test_uncounted_outcomes_are_refunded(enabled_limiter):
+    app = Flask(__name__)
+
+    @app.post("/attempt/<int:status>")
+    @rate_limit("refund", limit=2, period=60, counts=lambda response: response.status_code == 401)
+    def attempt(status):
+        return jsonify(), status
+
+    client = app.test_client()
+    assert [client.post("/attempt/200").status_code for _ in range(5)] == [200] * 5
+    assert [client.post("/attempt/401").status_code for _ in range(3)] == [401, 401, 429]
+
+
+@pytest.fixture
+def limited_app(tmp_path):
+    def make(**overrides):
+        app = create_app(
+            "testing",
+            DATABASE_URL=f"sqlite:///{tmp_path / 'test.db'}",
+            SECRET_KEY="test-secret",
+            WEBHOOK_QUEUE_PATH=str(tmp_path / "webhook_queue.db"),
+            RATELIMIT_ENABLED=True,
+            **overrides,
+        )
+        with app.app_context():
+            db.create_all(bind_key=None)
+        apps.append(app)
+        return app
+
+    apps = []
+    yield make
+    limiter.configure(enabled=False)
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+def _logins(client, address: str, count: int):
+    return [
+        client.post(
+            "/login",
+            json={"email": "nobody@example.com", "password": "password123"},
+            headers={"X-Forwarded-For": address},
+        )
+        for _ in range(count)
+    ]
+
+
+def test_login_limit_answers_429_with_retry_after(limited_app):
+    client = limited_app().test_client()
+    responses = _logins(client, "203.0.113.1", 11)
+    assert [r.status_code for r in responses] == [401] * 10 + [429]
+    assert 1 <= int(responses[-1].headers["Retry-After"]) <= 60
+
+
+def test_limits_key_on_the_forwarded_client_behind_trusted_proxies(limited_app):
+    client = limited_app(TRUSTED_PROXIES=1).test_client()
+    assert _logins(client, "203.0.113.1", 11)[-1].status_code == 429
+    assert _logins(client, "203.0.113.2", 1)[0].status_code == 401
+
+
+def test_forwarded_headers_are_ignored_without_trusted_proxies(limited_app):
+    client = limited_app().test_client()
+    assert _logins(client, "203.0.113.1", 10)[-1].status_code == 401
+    # Spoofing another address does not buy a fresh window
+    assert _logins(client, "203.0.113.2", 1)[0].status_code == 429
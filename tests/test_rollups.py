@@ -0,0 +1,71 @@
+import io
+
+from sqlalchemy import func, select
+
+from ..leaderboards import compute_leaderboards
+from ..models import db, Activity, LeaderboardEntry
+from ..rollups import find_drift
+
+
+RUN = {"title": "Run", "category": "Run", "distance": 5.0, "duration": "00:30:00", "time": "07:00:00",
+       "date": "2024-03-04"}
+
+
+def _assert_consistent(app, client=None, headers=None):
+    """Rollups, leaderboard entries and /me/activities/stats all agree with `activities`."""
+    with app.app_context():
+        assert not find_drift()
+        stored = {
+            (e.category_id, e.week_start, e.user_id): (round(e.total_distance, 6), e.activity_count)
+            for e in db.session.scalars(select(LeaderboardEntry))
+        }
+        expected = {
+            (r["category_id"], r["week_start"], r["user_id"]): (round(r["total_distance"], 6), r["activity_count"])
+            for r in compute_leaderboards().rows()
+        }
+        assert stored == expected
+        count, distance = db.session.execute(
+            select(func.count(Activity.id), func.coalesce(func.sum(Activity.distance), 0.0))
+        ).one()
+    if client is not None:
+        totals = client.get("/me/activities/stats", headers=headers).get_json()["totals"]
+        assert (totals["count"], totals["total_distance"]) == (count, round(distance, 3))
+
+
+def test_writes_keep_stats_consistent(app, client, make_user):
+    _, headers = make_user()
+    first = client.post("/me/activities", headers=headers, json=RUN).get_json()["activity"]["id"]
+    client.post("/me/activities/batch", headers=headers, json={"activities": [
+        {**RUN, "distance": 10.0}, {**RUN, "category": "Bike", "distance": 30.0, "date": "2024-03-12"},
+    ]})
+    _assert_consistent(app, client, headers)
+
+    for change in ({"distance": 7.5}, {"category": "Swim"}, {"date": "2024-03-20"}, {"complete": False}):
+        assert client.patch(f"/me/activities/{first}", headers=headers, json=change).status_code == 200
+        _assert_consistent(app, client, headers)
+
+    assert client.delete(f"/me/activities/{first}", headers=headers).status_code == 204
+    _assert_consistent(app, client, headers)
+
+    csv = (
+        "title,category,distance,duration,time,date\n"
+        "Imported,Run,4.2,00:25:00,06:00:00,2024-03-05\n"
+        "Imported,Bike,20,01:00:00,06:00:00,2024-03-06\n"
+    )
+    response = client.post(
+        "/me/activities/import",
+        headers=headers,
+        data={"file": (io.BytesIO(csv.encode()), "rows.csv")},
+        content_type="multipart/form-data",
+    )
+    assert response.get_json()["activity_import"]["rows_imported"] == 2
+    _assert_consistent(app, client, headers)
+
+
+def test_seed_keeps_stats_consistent(app):
+    runner = app.test_cli_runner()
+    for _ in range(2):
+        assert runner.invoke(args=["seed"]).exit_code == 0
+        _assert_consistent(app)
+    with app.app_context():
+        assert db.session.scalar(select(func.count()).where(Activity.date.is_(None))) == 0
@@ -0,0 +1,77 @@
+from ..schemas import activity_schema, activity_update_schema
+
+
+VALID = {
+    "title": "Morning Run",
+    "category": "Run",
+    "distance": 5.0,
+    "duration": "00:30:00",
+    "time": "07:00:00",
+}
+
+
+def test_valid_activity():
+    data, errors = activity_schema.validate(VALID)
+    assert errors is None
+    assert data.title == "Morning Run"
+    assert data.notes is None
+
+
+def test_string_fields_reject_lists():
+    for field in ("title", "notes"):
+        data, errors = activity_schema.validate({**VALID, field: ["abc", "def"]})
+        assert data is None
+        assert errors == {field: ["Not a valid string."]}
+
+
+def test_string_fields_reject_objects():
+    data, errors = activity_schema.validate({**VALID, "notes": {"a": 1}})
+    assert errors == {"notes": ["Not a valid string."]}
+
+
+def test_string_fields_reject_numbers():
+    data, errors = activity_schema.validate({**VALID, "title": 5})
+    assert errors == {"title": ["Not a valid string."]}
+    data, errors = activity_update_schema.validate({"category": 12})
+    assert errors == {"category": ["Not a valid string."]}
+
+
+def test_null_string_is_missing():
+    data, errors = activity_update_schema.validate({"notes": None})
+    assert errors is None
+    assert data.notes is None and "notes" in data.present
+
+
+def test_post_activity_with_list_title_is_400(client, make_user):
+    _, headers = make_user()
+    response = client.post("/me/activities", headers=headers, json={**VALID, "title": ["abc"]})
+    assert response.status_code == 400
+    assert response.get_json() == {"errors": {"title": ["Not a valid string."]}}
+    response = client.post("/me/activities", headers=headers, json={**VALID, "notes": {"a": 1}})
+    assert response.status_code == 400
+
+
+BENCHMARKS = {"mile": "7:00", "5k": "24:30"}
+
+
+def test_signup_accepts_object_benchmarks(app, client):
+    response = client.post("/signup", json={
+        "email": "new@example.com", "password": "password123", "first_name": "New", "last_name": "User",
+        "benchmarks": BENCHMARKS,
+    })
+    assert response.status_code == 201, response.get_json()
+    assert response.get_json()["user"]["benchmarks"] == BENCHMARKS
+
+
+def test_update_me_accepts_object_and_text_benchmarks(client, make_user):
+    _, headers = make_user()
+    # UserEditForm requires the password on every profile update
+    response = client.patch("/me", headers=headers, json={"benchmarks": BENCHMARKS, "password": "password123"})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["user"]["benchmarks"] == BENCHMARKS
+
+    # Setting the password revoked the old token; use the one issued with the response
+    headers = {"Authorization": f"Bearer {response.get_json()['token']}"}
+    response = client.patch("/me", headers=headers, json={"benchmarks": '{"mile": "6:55"}', "password": "password123"})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["user"]["benchmarks"] == {"mile": "6:55"}
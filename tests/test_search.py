@@ -0,0 +1,87 @@
+"""Activity search on SQLite's FTS5 index (Postgres uses tsvector; see search.py)."""
+import pytest
+
+
+BASE = {"category": "Run", "distance": 5.0, "duration": "00:30:00", "time": "07:00:00"}
+
+
+@pytest.fixture
+def log(client):
+    def log(headers, title, notes=None):
+        response = client.post("/me/activities", headers=headers, json={**BASE, "title": title, "notes": notes})
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()["activity"]["id"]
+
+    return log
+
+
+def _search(client, headers, q, **params):
+    response = client.get("/me/activities/search", headers=headers, query_string={"q": q, **params})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def _titles(client, headers, q, **params):
+    return [a["title"] for a in _search(client, headers, q, **params)["activities"]]
+
+
+def test_title_matches_rank_above_notes(client, make_user, log):
+    _, headers = make_user()
+    log(headers, "Easy spin", notes="Finished with a tempo block")
+    log(headers, "Tempo run", notes="Felt strong")
+    log(headers, "Long ride")
+    assert _titles(client, headers, "tempo") == ["Tempo run", "Easy spin"]
+    # Stemming: "runs" finds "run"
+    assert _titles(client, headers, "runs") == ["Tempo run"]
+
+
+def test_pages_cover_every_match_once(client, make_user, log):
+    _, headers = make_user()
+    for i in range(5):
+        log(headers, f"Hill repeats {i}")
+    log(headers, "Recovery jog")
+
+    seen, offset = [], 0
+    while offset is not None:
+        page = _search(client, headers, "hill", limit=2, offset=offset)
+        assert page["count"] <= 2
+        seen += [a["title"] for a in page["activities"]]
+        offset = page["next_offset"]
+    assert sorted(seen) == [f"Hill repeats {i}" for i in range(5)]
+
+
+def test_users_only_find_their_own_activities(client, make_user, log):
+    _, mine = make_user("me@example.com")
+    _, theirs = make_user("them@example.com")
+    log(mine, "Track intervals")
+    log(theirs, "Track intervals", notes="Private track notes")
+
+    results = _search(client, mine, "track")["activities"]
+    assert [a["notes"] for a in results] == [None]
+    assert _titles(client, theirs, "private") == ["Track intervals"]
+    assert _titles(client, mine, "private") == []
+
+
+def test_index_follows_updates_and_deletes(client, make_user, log):
+    _, headers = make_user()
+    activity_id = log(headers, "Morning swim", notes="Drills")
+
+    response = client.patch(f"/me/activities/{activity_id}", headers=headers, json={"title": "Evening swim"})
+    assert response.status_code == 200
+    assert _titles(client, headers, "morning") == []
+    assert _titles(client, headers, "evening") == ["Evening swim"]
+
+    response = client.patch(f"/me/activities/{activity_id}", headers=headers, json={"notes": "Kick sets"})
+    assert response.status_code == 200
+    assert _titles(client, headers, "drills") == []
+    assert _titles(client, headers, "kick") == ["Evening swim"]
+
+    assert client.delete(f"/me/activities/{activity_id}", headers=headers).status_code == 204
+    assert _titles(client, headers, "evening") == []
+
+
+def test_query_syntax_is_not_interpreted(client, make_user, log):
+    _, headers = make_user()
+    log(headers, "Trail run")
+    assert _titles(client, headers, 'trail OR "unbalanced') == []
+    assert _titles(client, headers, "trail*") == ["Trail run"]
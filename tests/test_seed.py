@@ -0,0 +1,26 @@
+from sqlalchemy import func, select
+
+from ..models import db, Activity, User
+
+
+def _activity_counts():
+    return dict(db.session.execute(
+        select(User.email, func.count(Activity.id)).join(Activity, Activity.user_id == User.id).group_by(User.email)
+    ).all())
+
+
+def test_sample_seed_is_repeatable(app):
+    runner = app.test_cli_runner()
+    for _ in range(2):
+        result = runner.invoke(args=["seed"])
+        assert result.exit_code == 0, result.output
+        assert "Seed complete" in result.output
+    with app.app_context():
+        assert _activity_counts() == {"test.user1@example.com": 2, "john.doe@example.com": 2}
+
+
+def test_synthetic_seed(app):
+    result = app.test_cli_runner().invoke(args=["seed", "--users", "3", "--activities-per-user", "4"])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert sorted(_activity_counts().values()) == [4, 4, 4]
@@ -0,0 +1,150 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import func, select
+
+from ..benchmarks.strava_sync import SPORTS, StubStrava, make_handler
+from ..models import db, Activity, ProviderConnection
+from ..rollups import find_drift
+from ..strava import RateLimitBudget, StravaRateLimited, sync_connection
+
+
+WINDOW = 10**9
+
+
+@pytest.fixture
+def stub(app):
+    """A local Strava stub the app talks to."""
+    # One rate-limit window for the whole test, so none resets mid-test
+    stub = StubStrava(latency=0, limit=10**6, daily_limit=10**6, window=WINDOW)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    app.config.update(STRAVA_API_URL=f"{base}/api/v3", STRAVA_TOKEN_URL=f"{base}/oauth/token")
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+
+def _connect(user_id: int, token: str, athlete_id=None) -> ProviderConnection:
+    connection = ProviderConnection(
+        user_id=user_id, provider="strava", access_token=token, refresh_token="-",
+        expires_at=int(time.time()) + 21600, synced_until=0, athlete_id=athlete_id,
+    )
+    db.session.add(connection)
+    db.session.commit()
+    return connection
+
+
+def _strict_budget() -> RateLimitBudget:
+    """Spends the whole window and gives up instead of waiting for the next one."""
+    return RateLimitBudget(reserve=0, max_wait=0, window=WINDOW)
+
+
+def _importable(count: int) -> int:
+    """Stub activities among the first `count` that map to a category."""
+    return sum(1 for i in range(count) if SPORTS[i % len(SPORTS)] != "Kayaking")
+
+
+def _stored(user_id: int) -> int:
+    return db.session.scalar(select(func.count()).where(Activity.user_id == user_id))
+
+
+def test_sync_stops_at_the_rate_limit_and_resumes(app, stub, make_user):
+    user_id, _ = make_user()
+    token = stub.add_athlete("100", 50)
+    stub.limit = 3
+    with app.app_context():
+        connection = _connect(user_id, token, athlete_id="100")
+        with pytest.raises(StravaRateLimited):
+            sync_connection(connection, budget=_strict_budget(), concurrency=1, per_page=10)
+        # The three pages fetched within the budget are kept, and so is their mark
+        assert _stored(user_id) == _importable(30)
+        assert connection.synced_until == stub.athletes["100"][29]["_epoch"]
+
+        stub.limit = 10**6
+        result = sync_connection(connection, budget=_strict_budget(), per_page=10)
+        assert result.fetched == 20
+        assert _stored(user_id) == _importable(50)
+
+
+def test_sync_stops_on_a_429(app, stub, make_user):
+    user_id, _ = make_user()
+    token = stub.add_athlete("101", 5)
+    stub.limit = 0
+    with app.app_context():
+        connection = _connect(user_id, token, athlete_id="101")
+        with pytest.raises(StravaRateLimited):
+            sync_connection(connection, budget=_strict_budget())
+        assert stub.throttled == 1
+        assert connection.synced_until == 0
+        assert _stored(user_id) == 0
+
+
+def test_incremental_sync_fetches_only_new_activities(app, stub, make_user):
+    user_id, _ = make_user()
+    token = stub.add_athlete("102", 25)
+    with app.app_context():
+        connection = _connect(user_id, token, athlete_id="102")
+        sync_connection(connection, per_page=10)
+        assert connection.synced_until == stub.athletes["102"][-1]["_epoch"]
+
+        stub.add_activities("102", 5)
+        budget = RateLimitBudget()
+        result = sync_connection(connection, budget=budget, per_page=10)
+        assert budget.requests == 1
+        assert (result.fetched, result.inserted) == (5, _importable(30) - _importable(25))
+        assert connection.synced_until == stub.athletes["102"][-1]["_epoch"]
+        assert _stored(user_id) == _importable(30)
+
+
+def test_resync_is_idempotent(app, stub, make_user):
+    user_id, _ = make_user()
+    token = stub.add_athlete("103", 25)
+    with app.app_context():
+        connection = _connect(user_id, token, athlete_id="103")
+        sync_connection(connection, per_page=10)
+
+        repeat = sync_connection(connection, per_page=10)
+        assert (repeat.fetched, repeat.inserted, repeat.updated) == (0, 0, 0)
+
+        # Replaying everything from the start updates in place
+        connection.synced_until = 0
+        db.session.commit()
+        replay = sync_connection(connection, per_page=10)
+        assert (replay.fetched, replay.inserted, replay.updated) == (25, 0, _importable(25))
+        assert _stored(user_id) == _importable(25)
+        assert not find_drift()
+
+
+def test_connect_looks_up_the_athlete_id(app, stub, make_user):
+    make_user()
+    token = stub.add_athlete("1234", 0)
+    result = app.test_cli_runner().invoke(
+        args=["strava", "connect", "--email", "athlete@example.com", "--access-token", token]
+    )
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert db.session.scalars(db.select(ProviderConnection.athlete_id)).one() == "1234"
+
+
+def test_connect_fails_without_a_resolvable_athlete_id(app, stub, make_user):
+    make_user()
+    result = app.test_cli_runner().invoke(
+        args=["strava", "connect", "--email", "athlete@example.com", "--access-token", "unknown"]
+    )
+    assert result.exit_code != 0
+    assert "--athlete-id" in result.output
+    with app.app_context():
+        assert db.session.scalars(db.select(ProviderConnection)).first() is None
+
+
+def test_sync_fills_in_a_missing_athlete_id(app, stub, make_user):
+    user_id, _ = make_user()
+    token = stub.add_athlete("5678", 3)
+    with app.app_context():
+        connection = _connect(user_id, token)
+        sync_connection(connection)
+        assert db.session.get(ProviderConnection, connection.id).athlete_id == "5678"
@@ -0,0 +1,70 @@
+from datetime import date, time
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from .. import strava
+from ..models import db, Activity, ProviderConnection
+from ..rollups import find_drift
+from ..strava import upsert_external_activities
+
+
+def _row(external_id: str, distance: float) -> dict:
+    return {
+        "title": "Strava run", "category_id": 1, "distance": distance, "duration": time(0, 30),
+        "time": time(7), "date": date(2024, 1, 2), "notes": None, "complete": True,
+        "external_id": external_id,
+    }
+
+
+def test_upsert_inserts_then_updates(app, make_user):
+    user_id, _ = make_user()
+    with app.app_context():
+        assert upsert_external_activities(user_id, "strava", [_row("1", 5.0), _row("2", 3.0)]) == (2, 0)
+        db.session.commit()
+        assert upsert_external_activities(user_id, "strava", [_row("1", 6.0), _row("3", 1.0)]) == (1, 1)
+        db.session.commit()
+        stored = dict(db.session.execute(select(Activity.external_id, Activity.distance)).all())
+        assert stored == {"1": 6.0, "2": 3.0, "3": 1.0}
+        assert not find_drift()
+
+
+def test_upsert_updates_rows_inserted_concurrently(app, make_user, monkeypatch):
+    user_id, _ = make_user()
+    with app.app_context():
+        upsert_external_activities(user_id, "strava", [_row("1", 5.0)])
+        db.session.commit()
+
+        # The lookup ran before another writer stored activity 1
+        lookups = iter([{}])
+        real = strava._existing_activities
+        monkeypatch.setattr(strava, "_existing_activities", lambda *args: next(lookups, None) or real(*args))
+        assert upsert_external_activities(user_id, "strava", [_row("1", 8.0)]) == (0, 1)
+        db.session.commit()
+
+        assert db.session.scalars(select(Activity.distance)).all() == [8.0]
+        assert not find_drift()
+
+
+def test_sync_command_survives_database_errors(app, make_user, monkeypatch):
+    failing, _ = make_user("failing@example.com")
+    working, _ = make_user("working@example.com")
+    with app.app_context():
+        for user_id in (failing, working):
+            db.session.add(ProviderConnection(user_id=user_id, provider="strava", access_token="t", synced_until=0))
+        db.session.commit()
+
+    synced = []
+
+    def sync_connection(connection, **kwargs):
+        if connection.user_id == failing:
+            raise IntegrityError("INSERT INTO activities", {}, Exception("UNIQUE constraint failed"))
+        synced.append(connection.user_id)
+        return strava.SyncResult()
+
+    monkeypatch.setattr(strava, "sync_connection", sync_connection)
+    result = app.test_cli_runner().invoke(args=["strava", "sync"])
+    assert synced == [working]
+    assert result.exit_code == 1
+    assert "database error: UNIQUE constraint failed" in result.output
+    assert "1 connections failed" in result.output
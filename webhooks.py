@@ -0,0 +1,216 @@
+"""Durable, coalescing queue for provider webhook events.
+
+The webhook endpoint only records the event, so it answers in constant time
+whatever the backlog. Events go to a local SQLite file (WAL, like the
+rate limiter's shared backend) keyed by (provider, object type, object id),
+so a burst of events for one object collapses into a single entry: the
+latest action wins, where "upsert" covers both create and update. Each
+enqueue bumps the entry's `version`; a worker that claimed an older version
+does not remove the entry when it acks, so a change that arrives
+mid-processing is picked up again.
+
+Workers claim batches under a lease; a leased entry is not handed to another
+worker until it is acked, retried, or the lease expires (a crashed worker).
+Failed entries are retried with backoff until `max_attempts`, then left in
+place (`dead`) for inspection. A new event for an entry clears its backoff.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+class QueuedEvent(NamedTuple):
+    provider: str
+    object_type: str
+    object_id: str
+    owner_id: str
+    action: str  # UPSERT or DELETE
+    updates: dict
+    event_time: int
+    version: int
+    attempts: int
+
+
+class EventQueue:
+    """Coalescing event queue in a local SQLite file shared by all workers on a host."""
+
+    def __init__(self, path: Optional[str] = None, clock: Callable[[], float] = time.time, max_attempts: int = 5):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._clock = clock
+        self._local = threading.local()
+
+    def configure(self, path: str, max_attempts: int = 5) -> None:
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            if not self.path:
+                raise RuntimeError("Webhook queue path is not configured")
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS events (
+                    provider TEXT NOT NULL,
+                    object_type TEXT NOT NULL,
+                    object_id TEXT NOT NULL,
+                    owner_id TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    updates TEXT NOT NULL DEFAULT '{}',
+                    event_time INTEGER NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    enqueued_at REAL NOT NULL,
+                    available_at REAL NOT NULL,
+                    leased_until REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    PRIMARY KEY (provider, object_type, object_id)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_events_available_at ON events (available_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(
+        self,
+        provider: str,
+        object_type: str,
+        object_id,
+        owner_id,
+        action: str,
+        event_time: int,
+        updates: Optional[dict] = None,
+    ) -> None:
+        """Record an event, coalescing it with any pending one for the same object."""
+        now = self._clock()
+        self._connect().execute(
+            """
+            INSERT INTO events (provider, object_type, object_id, owner_id, action, updates,
+                                event_time, enqueued_at, available_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (provider, object_type, object_id) DO UPDATE SET
+                action = CASE WHEN excluded.event_time >= events.event_time
+                              THEN excluded.action ELSE events.action END,
+                updates = CASE WHEN excluded.event_time >= events.event_time
+                               THEN json_patch(events.updates, excluded.updates) ELSE events.updates END,
+                event_time = max(events.event_time, excluded.event_time),
+                owner_id = excluded.owner_id,
+                version = events.version + 1,
+                attempts = 0,
+                available_at = min(events.available_at, excluded.available_at)
+            """,
+            (provider, object_type, str(object_id), str(owner_id), action,
+             json.dumps(updates or {}), int(event_time), now, now),
+        )
+
+    def claim(self, limit: int = 100, lease: float = 60.0) -> List[QueuedEvent]:
+        """Lease up to `limit` due events, oldest first."""
+        now = self._clock()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """
+                SELECT provider, object_type, object_id, owner_id, action, updates,
+                       event_time, version, attempts
+                FROM events
+                WHERE available_at <= ? AND leased_until <= ? AND attempts < ?
+                ORDER BY available_at
+                LIMIT ?
+                """,
+                (now, now, self.max_attempts, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE events SET leased_until = ? WHERE provider = ? AND object_type = ? AND object_id = ?",
+                [(now + lease, r[0], r[1], r[2]) for r in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [
+            QueuedEvent(p, t, i, o, a, json.loads(u), et, v, n)
+            for p, t, i, o, a, u, et, v, n in rows
+        ]
+
+    def ack(self, events: Iterable[QueuedEvent]) -> None:
+        """Remove processed events; entries re-enqueued since the claim become due again."""
+        keys = [(e.provider, e.object_type, e.object_id, e.version) for e in events]
+        if not keys:
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "DELETE FROM events WHERE provider = ? AND object_type = ? AND object_id = ? AND version = ?",
+                keys,
+            )
+            conn.executemany(
+                "UPDATE events SET leased_until = 0 WHERE provider = ? AND object_type = ? AND object_id = ?",
+                [key[:3] for key in keys],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def retry(
+        self,
+        events: Iterable[QueuedEvent],
+        error: str,
+        delay: Optional[float] = None,
+        count_attempt: bool = True,
+    ) -> None:
+        """Make events due again after `delay` (default: exponential backoff).
+
+        Entries re-enqueued since the claim are due at once and keep their
+        attempt count.
+        """
+        now = self._clock()
+        self._connect().executemany(
+            """
+            UPDATE events SET
+                attempts = attempts + CASE WHEN version = ? THEN ? ELSE 0 END,
+                available_at = CASE WHEN version = ? THEN ? ELSE available_at END,
+                last_error = ?,
+                leased_until = 0
+            WHERE provider = ? AND object_type = ? AND object_id = ?
+            """,
+            [
+                (e.version, int(count_attempt), e.version,
+                 now + (delay if delay is not None else min(3600, 10 * 2 ** e.attempts)),
+                 error[:500], e.provider, e.object_type, e.object_id)
+                for e in events
+            ],
+        )
+
+    def stats(self) -> Dict[str, int]:
+        now = self._clock()
+        pending, due, dead = self._connect().execute(
+            """
+            SELECT COUNT(*),
+                   COALESCE(SUM(available_at <= ? AND leased_until <= ? AND attempts < ?), 0),
+                   COALESCE(SUM(attempts >= ?), 0)
+            FROM events
+            """,
+            (now, now, self.max_attempts, self.max_attempts),
+        ).fetchone()
+        return {"pending": pending, "due": due, "dead": dead}
+
+
+webhook_queue = EventQueue()